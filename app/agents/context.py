@@ -0,0 +1,19 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from app.utils.config import get_agent_config
+
+def current_time() -> str:
+    """The current date and time in the agents' timezone, e.g. Monday 19 October 2026, 14:05 (Europe/Dublin)"""
+    timezone = get_agent_config()['timezone']
+    return f"{datetime.now(ZoneInfo(timezone)):%A %d %B %Y, %H:%M} ({timezone})"
+
+def with_dynamic_context(message: str) -> str:
+    """
+    Append the parts of a prompt that change from request to request to the message
+
+    The agents' descriptions, instructions and tool schemas never change, and
+    earlier turns are sent back as they were, so everything before the newest
+    message is a byte-identical prefix that OpenAI serves from its prompt cache.
+    """
+    return f"{message}\n\n<context>\nCurrent date and time: {current_time()}\n</context>"
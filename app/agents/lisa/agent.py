@@ -10,9 +10,9 @@ from app.models.chat_model import AgentResponse
 from app.agents.lisa.behaviour import agent_instructions, agent_description
 # from agno.tools.telegram import TelegramTools
 from app.utils.config import get_agent_config
-
-import datetime
-# from tzlocal import get_localzone_name
+from app.utils.llm_cassette import get_llm_http_client
+from app.utils.metrics import instrument_toolkit
+from app.utils.tracing import trace_model
 
 # Create the agent instance
 def create_agent(chatwoot_conversation_id: str = None):
@@ -20,10 +20,12 @@ def create_agent(chatwoot_conversation_id: str = None):
     config = get_agent_config()
     
     agent = Agent(
-        model=OpenAIChat(
+        model=trace_model(OpenAIChat(
             id="gpt-4o-mini",
             api_key=config['openai_api_key'],  # Add API key from config
-        ),
+            base_url=config['openai_base_url'],
+            http_client=get_llm_http_client(),
+        )),
         add_history_to_messages=True,
         num_history_responses=20,
         # Set the session_id based on the Chatwoot conversation
@@ -43,18 +45,19 @@ def create_agent(chatwoot_conversation_id: str = None):
                 is_prime=True,
                 square_root=True,
             ),
-            GoogleCalendarTools(
-                credentials_path="secrets/client_secret_836000232789-l1ae1n2burh365vr9iiktkoff5lo9kt4.apps.googleusercontent.com.json",
-                token_path="secrets/token.json"  # Specify token path
-            ),
-            GoogleMapTools(key=config['google_maps_api_key'])
+            instrument_toolkit(GoogleCalendarTools(
+                credentials_path=config['google_calendar_credentials_path'],
+                token_path=config['google_calendar_token_path']
+            )),
+            instrument_toolkit(GoogleMapTools(key=config['google_maps_api_key']))
             # TelegramTools(token=config['telegram_bot_token'], chat_id=config['telegram_chat_id'])
             ],
         show_tool_calls=True,
         markdown=True,
-        debug_mode=True,
+        debug_mode=config['debug_mode'],  # agno's prompt and response dumps, off in the production log profile
         stream=True,  # Enable streaming responses
-        add_datetime_to_instructions=True,
+        # No add_datetime_to_instructions: the current time goes at the end of each message
+        # (app/agents/context.py), so the instructions stay a byte-identical, cacheable prefix
     )
     
     return agent
@@ -1,53 +1,54 @@
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
 from app.models.chat_model import AgentResponse
-from app.models.email_model import EmailClassification
+from app.models.email_model import EmailClassification, EmailBatchClassification
 from app.tools.google_maps import GoogleMapTools
 from agno.tools.googlecalendar import GoogleCalendarTools
-from app.agents.zoho.behaviour import agent_instructions, agent_description
+from app.agents.zoho.behaviour import (
+    agent_instructions,
+    agent_description,
+    classification_description,
+    classification_instructions,
+    batch_classification_instructions
+)
 from app.utils.config import get_agent_config
-
-import datetime
-# from tzlocal import get_localzone_name
+from app.utils.llm_cassette import get_llm_http_client
+from app.utils.metrics import instrument_toolkit
+from app.utils.tracing import trace_model
 
 # Create the classification agent instance
 async def create_classification_agent():
     config = get_agent_config()
     
     agent = Agent(
-        model=OpenAIChat(
+        model=trace_model(OpenAIChat(
             id="gpt-4o-mini",
             api_key=config['openai_api_key'],
-        ),
-        description="You classify if emails are related to cleaning services and need a response.",
+            base_url=config['openai_base_url'],
+            http_client=get_llm_http_client(async_client=True),
+        )),
+        description=classification_description,
         response_model=EmailClassification,
         structured_outputs=True,
-        instructions="""
-        Your task is to determine if an email is related to cleaning services and needs a response.
-        
-        Consider an email cleaning-related if it:
-        - Asks about cleaning services or quotes
-        - Discusses booking or scheduling cleaning
-        - Has questions about cleaning methods or products
-        - Mentions specific cleaning needs
-        - Is about an existing cleaning service
-        
-        Mark as NOT cleaning-related if it:
-        - Is spam or promotional content
-        - Is completely unrelated to cleaning services
-        - Is automated system notifications
-        - Is marketing or sales pitches for other services
-        
-        Consider an email as NOT needing response if:
-        - It's just saying "thank you" with no questions
-        - It's confirming they received our message
-        - It's confirming a scheduled call or meeting
-        - It's confirming a booking that's already made
-        - The conversation has reached a natural conclusion
-        - We've already agreed on next steps (e.g. phone call)
-        
-        Always provide clear reasoning for both classifications.
-        """
+        instructions=classification_instructions
+    )
+    return agent
+
+# Create the batch classification agent instance (several emails per request)
+async def create_batch_classification_agent():
+    config = get_agent_config()
+    
+    agent = Agent(
+        model=trace_model(OpenAIChat(
+            id="gpt-4o-mini",
+            api_key=config['openai_api_key'],
+            base_url=config['openai_base_url'],
+            http_client=get_llm_http_client(async_client=True),
+        )),
+        description=classification_description,
+        response_model=EmailBatchClassification,
+        structured_outputs=True,
+        instructions=classification_instructions + batch_classification_instructions
     )
     return agent
 
@@ -56,10 +57,12 @@ async def create_response_agent(chatwoot_conversation_id: str = None):
     config = get_agent_config()
     
     agent = Agent(
-        model=OpenAIChat(
+        model=trace_model(OpenAIChat(
             id="gpt-4o-mini",
             api_key=config['openai_api_key'],  # Add API key from config
-        ),
+            base_url=config['openai_base_url'],
+            http_client=get_llm_http_client(async_client=True),
+        )),
         add_history_to_messages=True,
         num_history_responses=20,
         # Set the session_id based on the Chatwoot conversation
@@ -69,17 +72,18 @@ async def create_response_agent(chatwoot_conversation_id: str = None):
         description=agent_description,
         instructions=agent_instructions,
         tools=[
-            GoogleCalendarTools(
-                credentials_path="secrets/client_secret_836000232789-l1ae1n2burh365vr9iiktkoff5lo9kt4.apps.googleusercontent.com.json",
-                token_path="secrets/token.json"  # Specify token path
-            ),
-            GoogleMapTools(key=config['google_maps_api_key']),
+            instrument_toolkit(GoogleCalendarTools(
+                credentials_path=config['google_calendar_credentials_path'],
+                token_path=config['google_calendar_token_path']
+            )),
+            instrument_toolkit(GoogleMapTools(key=config['google_maps_api_key'])),
             ],
         show_tool_calls=True,
         markdown=False,  # Turn off markdown to prevent double-escaping with HTML
-        debug_mode=True,
+        debug_mode=config['debug_mode'],  # agno's prompt and response dumps, off in the production log profile
         stream=True,  # Enable streaming responses
-        add_datetime_to_instructions=True,
+        # No add_datetime_to_instructions: the current time goes at the end of each message
+        # (app/agents/context.py), so the instructions stay a byte-identical, cacheable prefix
     )
     
     return agent
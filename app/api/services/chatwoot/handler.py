@@ -1,12 +1,25 @@
 from typing import Dict, Optional, Any
 import os
+import time
+import logging
 from app.agents.lisa.agent import create_agent
+from app.agents.context import with_dynamic_context
 from app.api.services.chatwoot.send_message import responder
 from app.utils.logger import log_json
+from app.utils.metrics import get_metrics, record_agent_run
+from app.utils.llm_usage import get_llm_usage, CONVERSATION
+from app.utils.rate_limiter import get_openai_rate_limiter
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
 
 # Cache of bot instances by Chatwoot conversation ID
 conversation_bots = {}
 
+get_metrics().gauge(
+    "live_chat_conversations", "Live-chat conversations with a bot instance in conversation_bots"
+).set_function(lambda: len(conversation_bots))
+
 class ChatwootConversationManager:
     """Manages conversation instances and message processing for Chatwoot"""
     
@@ -16,7 +29,7 @@ class ChatwootConversationManager:
         if conversation_id not in conversation_bots:
             # Create new bot instance specifically for this Chatwoot conversation
             conversation_bots[conversation_id] = create_agent(chatwoot_conversation_id=conversation_id)
-            print(f"Created new bot instance for Chatwoot conversation {conversation_id}")
+            logger.debug("Created new bot instance for Chatwoot conversation %s", conversation_id)
         
         return conversation_bots[conversation_id]
     
@@ -82,7 +95,19 @@ class ChatwootConversationManager:
                 )
             
             # Process the message with this conversation's bot
-            response = bot.run(user_message)
+            response = None
+            started = time.perf_counter()
+            with span("agent lisa", agent="lisa", conversation_id=conversation_id, new_conversation=is_new_conversation):
+                try:
+                    response = bot.run(with_dynamic_context(user_message))
+                finally:
+                    seconds = time.perf_counter() - started
+                    record_agent_run("lisa", seconds, response)
+                    if response is not None:
+                        usage = get_llm_usage().record("lisa", response, seconds, CONVERSATION, {conversation_id: 1})
+                        # Customers are never kept waiting, but the email agents wait for the quota Lisa used
+                        get_openai_rate_limiter().record(usage["prompt_tokens"] + usage["completion_tokens"],
+                                                         usage["requests"])
             
             # Extract the final message from the structured response
             full_response = ""
@@ -111,7 +136,7 @@ class ChatwootConversationManager:
             return {"status": "success", "response": full_response}
             
         except Exception as e:
-            print(f"Error processing message: {str(e)}")
+            logger.error("Error processing message: %s", e)
             return {"status": "error", "message": str(e)}
 
 # Create a singleton instance
@@ -1,6 +1,13 @@
+import time
 import requests
 from typing import Optional, Dict, Any
 from app.utils.config import get_chatwoot_config
+from app.utils.metrics import get_metrics
+from app.utils.tracing import span
+
+SEND_SECONDS = get_metrics().histogram(
+    "chatwoot_send_seconds", "Duration of replies posted to Chatwoot by HTTP status", ["status"]
+)
 
 class ChatwootResponder:
     """A class to handle responses to Chatwoot conversations"""
@@ -35,7 +42,15 @@ class ChatwootResponder:
         if echo_id:
             payload["echo_id"] = echo_id
             
-        response = requests.post(url, headers=self.headers, json=payload)
+        started, status = time.perf_counter(), "error"
+        with span("chatwoot send_message", conversation_id=conversation_id) as current:
+            try:
+                response = requests.post(url, headers=self.headers, json=payload)
+                status = response.status_code
+            finally:
+                SEND_SECONDS.observe(time.perf_counter() - started, status=status)
+                if current is not None:
+                    current.set(status=status)
         
         try:
             return response.json()
@@ -1,8 +1,11 @@
+import logging
 import os
 import time
 import requests
 from typing import Dict, Optional
 
+logger = logging.getLogger(__name__)
+
 class ZohoAuthManager:
     def __init__(self):
         # Get credentials from environment variables
@@ -10,6 +13,7 @@ class ZohoAuthManager:
         self.client_secret = os.environ.get("ZOHO_CLIENT_SECRET")
         self.refresh_token = os.environ.get("ZOHO_REFRESH_TOKEN")
         self.domain = os.environ.get("ZOHO_DOMAIN", "zoho.eu")
+        self.accounts_url = os.environ.get("ZOHO_ACCOUNTS_BASE_URL", f"https://accounts.{self.domain}").rstrip("/")
         
         # In-memory storage only
         self.access_token = None
@@ -37,10 +41,10 @@ class ZohoAuthManager:
             bool: True if successful, False otherwise
         """
         if not all([self.client_id, self.client_secret, self.refresh_token]):
-            print("Missing credentials for token refresh")
+            logger.warning("Missing credentials for token refresh")
             return False
         
-        url = f"https://accounts.{self.domain}/oauth/v2/token"
+        url = f"{self.accounts_url}/oauth/v2/token"
         data = {
             "refresh_token": self.refresh_token,
             "client_id": self.client_id,
@@ -58,10 +62,10 @@ class ZohoAuthManager:
                 self.token_expires_at = time.time() + expires_in
                 return True
             else:
-                print(f"Token refresh failed: {response.text}")
+                logger.error("Token refresh failed: %s", response.text)
                 return False
         except Exception as e:
-            print(f"Error refreshing token: {str(e)}")
+            logger.error("Error refreshing token: %s", e)
             return False
     
     def get_auth_headers(self) -> Dict[str, str]:
@@ -1,12 +1,33 @@
+import logging
 import os
 import requests
+import asyncio
 import aiohttp  # For async HTTP requests
+import time
+from collections import Counter
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 from .ZohoAuthManager import get_auth_manager
+from .content_stream import read_email_content_stream
+from .records import EmailRecord
+from app.utils.config import get_zoho_pipeline_config
+from app.utils.logger import LazyJson
+from app.utils.memory_cache import MemoryCache
+from app.utils.metrics import get_metrics
+from app.utils.tracing import span
 import html
 import re
 import json
 
+logger = logging.getLogger(__name__)
+
+# Read size for streamed email content responses
+CONTENT_CHUNK_BYTES = 65536
+
+REQUEST_SECONDS = get_metrics().histogram(
+    "zoho_api_request_seconds", "Duration of Zoho Mail API requests by endpoint and HTTP status", ["endpoint", "status"]
+)
+
 class ZohoEmailHandler:
     """
     Simple handler for Zoho Mail API operations
@@ -15,10 +36,41 @@ class ZohoEmailHandler:
         self.auth_manager = get_auth_manager()
         self.account_id = os.environ.get("ZOHO_ACCOUNT_ID")
         self.domain = os.environ.get("ZOHO_DOMAIN", "zoho.eu")
+        # Overridable to point the handler at a local stand-in such as benchmarks/fake_zoho.py
+        self.base_url = os.environ.get("ZOHO_MAIL_BASE_URL", f"https://mail.{self.domain}").rstrip("/")
+        # Number of API requests made, keyed by endpoint name
+        self.api_calls = Counter()
+        # Recent drafts created by this process, keyed by idempotency key
+        pipeline_config = get_zoho_pipeline_config()
+        self.created_drafts = MemoryCache(pipeline_config["draft_cache_size"], pipeline_config["draft_cache_ttl_seconds"])
+        # Lock and number of callers per idempotency key, dropped when the last caller is done
+        self._draft_locks: Dict[str, list] = {}
         
         if not self.account_id:
             raise ValueError("ZOHO_ACCOUNT_ID environment variable is not set")
     
+    def get_api_call_counts(self) -> Dict[str, int]:
+        """Return a snapshot of the API request counters"""
+        return dict(self.api_calls)
+    
+    @contextmanager
+    def _track_request(self, endpoint: str):
+        """
+        Count one API request, time it into zoho_api_request_seconds and trace it
+        The caller sets request["status"] once a response arrived; requests that
+        failed without one are recorded with status "error".
+        """
+        self.api_calls[endpoint] += 1
+        request = {"status": "error"}
+        started = time.perf_counter()
+        with span(f"zoho {endpoint}", endpoint=endpoint) as current:
+            try:
+                yield request
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=request["status"])
+                if current is not None:
+                    current.set(status=request["status"])
+    
     async def list_emails(self, limit: int = 20, **kwargs) -> Dict[str, Any]:
         """
         List emails with optional filtering parameters
@@ -28,7 +80,7 @@ class ZohoEmailHandler:
             **kwargs: Additional filtering parameters (e.g., threadId, before, after)
             
         Returns:
-            Dict with email data or error
+            Dict with the emails under "data" as EmailRecord objects, or error
         """
         # Get authentication headers
         headers = self.auth_manager.get_auth_headers()
@@ -36,7 +88,7 @@ class ZohoEmailHandler:
             return {"error": "Failed to get authentication headers"}
         
         # Build API URL
-        url = f"https://mail.{self.domain}/api/accounts/{self.account_id}/messages/view"
+        url = f"{self.base_url}/api/accounts/{self.account_id}/messages/view"
         
         # Prepare parameters - limit, sortBy, and sortorder are required
         params = {
@@ -49,16 +101,22 @@ class ZohoEmailHandler:
         params.update(kwargs)
         
         # Make the request asynchronously
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        text = await response.text()
-                        return {"error": f"API error: {text}"}
-        except Exception as e:
-            return {"error": f"Request failed: {str(e)}"}
+        with self._track_request("list_thread" if "threadId" in kwargs else "list_emails") as request:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url, headers=headers, params=params) as response:
+                        request["status"] = response.status
+                        if response.status == 200:
+                            result = await response.json()
+                            # Parse the listing once here; the pipeline only works with records
+                            if isinstance(result.get("data"), list):
+                                result["data"] = [EmailRecord.from_api(message) for message in result["data"]]
+                            return result
+                        else:
+                            text = await response.text()
+                            return {"error": f"API error: {text}"}
+            except Exception as e:
+                return {"error": f"Request failed: {str(e)}"}
     
     async def get_email(self, message_id: str) -> Dict[str, Any]:
         """
@@ -76,19 +134,21 @@ class ZohoEmailHandler:
             return {"error": "Failed to get authentication headers"}
         
         # Build API URL
-        url = f"https://mail.{self.domain}/api/accounts/{self.account_id}/messages/{message_id}"
+        url = f"{self.base_url}/api/accounts/{self.account_id}/messages/{message_id}"
         
         # Make the request asynchronously
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        text = await response.text()
-                        return {"error": f"API error: {text}"}
-        except Exception as e:
-            return {"error": f"Request failed: {str(e)}"}
+        with self._track_request("get_email") as request:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url, headers=headers) as response:
+                        request["status"] = response.status
+                        if response.status == 200:
+                            return await response.json()
+                        else:
+                            text = await response.text()
+                            return {"error": f"API error: {text}"}
+            except Exception as e:
+                return {"error": f"Request failed: {str(e)}"}
     
     def send_email(
         self, 
@@ -119,7 +179,7 @@ class ZohoEmailHandler:
             return {"error": "Failed to get authentication headers"}
         
         # Build API URL
-        url = f"https://mail.{self.domain}/api/accounts/{self.account_id}/messages"
+        url = f"{self.base_url}/api/accounts/{self.account_id}/messages"
         
         # Prepare data
         data = {
@@ -138,16 +198,18 @@ class ZohoEmailHandler:
             data["mailFormat"] = "html"
         
         # Make the request
-        try:
-            response = requests.post(url, headers=headers, data=data)
-            
-            if response.status_code in (200, 201):
-                return response.json()
-            else:
-                return {"error": f"API error: {response.text}"}
+        with self._track_request("send_email") as request:
+            try:
+                response = requests.post(url, headers=headers, data=data)
+                request["status"] = response.status_code
                 
-        except Exception as e:
-            return {"error": f"Request failed: {str(e)}"}
+                if response.status_code in (200, 201):
+                    return response.json()
+                else:
+                    return {"error": f"API error: {response.text}"}
+                    
+            except Exception as e:
+                return {"error": f"Request failed: {str(e)}"}
     
     async def create_draft(
         self,
@@ -157,11 +219,18 @@ class ZohoEmailHandler:
         thread_id: Optional[str] = None,
         cc: Optional[List[str]] = None,
         bcc: Optional[List[str]] = None,
-        is_html: bool = True
+        is_html: bool = True,
+        idempotency_key: Optional[str] = None,
+        max_retries: int = 2
     ) -> Dict[str, Any]:
         """
         Create a draft email
         
+        Requests are only retried when Zoho cannot have created the draft (rate
+        limited, or the connection was never established), and a draft already
+        created for the same idempotency key is returned instead of posting again,
+        so retries never produce a second draft.
+        
         Args:
             to: List of recipient email addresses
             subject: Email subject
@@ -170,10 +239,34 @@ class ZohoEmailHandler:
             cc: Optional list of CC recipients
             bcc: Optional list of BCC recipients
             is_html: Whether the body is HTML (default: True)
+            idempotency_key: Optional key identifying this draft (e.g. the message being answered)
+            max_retries: Maximum number of retries for requests that were not accepted
             
         Returns:
             Dict with created draft data or error
         """
+        if not idempotency_key:
+            return await self._create_draft(to, subject, body, thread_id, cc, bcc, is_html, max_retries)
+        
+        entry = self._draft_locks.setdefault(idempotency_key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                created = self.created_drafts.get(idempotency_key)
+                if created is not None:
+                    logger.debug("Draft for %s already created, not posting again", idempotency_key)
+                    return created
+                result = await self._create_draft(to, subject, body, thread_id, cc, bcc, is_html, max_retries)
+                if "error" not in result:
+                    self.created_drafts.put(idempotency_key, result)
+                return result
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._draft_locks[idempotency_key]
+    
+    async def _create_draft(self, to, subject, body, thread_id, cc, bcc, is_html, max_retries) -> Dict[str, Any]:
+        """Post a draft to Zoho, retrying only requests Zoho did not accept"""
         # Get authentication headers
         headers = self.auth_manager.get_auth_headers()
         headers["Content-Type"] = "application/json"  # Set content type to JSON
@@ -182,7 +275,7 @@ class ZohoEmailHandler:
             return {"error": "Failed to get authentication headers"}
         
         # Build API URL - using the endpoint from the documentation
-        url = f"https://mail.{self.domain}/api/accounts/{self.account_id}/messages"
+        url = f"{self.base_url}/api/accounts/{self.account_id}/messages"
         
         # Get default sender from environment variable or use a fallback
         default_sender = os.environ.get("ZOHO_DEFAULT_SENDER", "info@deepcleaning.ie")
@@ -217,7 +310,7 @@ class ZohoEmailHandler:
                 if cleaned:
                     clean_cc.append(cleaned)
             if clean_cc:
-                print(f"Cleaned CC addresses: {clean_cc}")
+                logger.debug("Cleaned CC addresses: %s", clean_cc)
         
         clean_bcc = []
         if bcc:
@@ -269,27 +362,51 @@ class ZohoEmailHandler:
         # Add CC only if present
         if clean_cc:
             data["ccAddress"] = ",".join(clean_cc)
+        
+        # Attach the draft to its thread so it shows up as a reply
+        if use_thread_id:
+            data["threadId"] = use_thread_id
             
         # Print request data for debugging
-        print(f"Sending draft request with data: {json.dumps(data, indent=2)}")
+        logger.debug("Sending draft request with data: %s", LazyJson(data))
         
         # Make the request
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    response_text = await response.text()
-                    if response.status in (200, 201):
-                        try:
-                            return await response.json()
-                        except:
-                            return {"data": {"message": "Draft created", "raw": response_text}}
-                    else:
-                        print(f"Draft creation error: Status {response.status}, Response: {response_text}")
-                        return {"error": f"API error ({response.status}): {response_text}"}
-        except Exception as e:
-            error_message = str(e)
-            print(f"Exception during draft creation: {error_message}")
-            return {"error": f"Request failed: {error_message}"}
+        for attempt in range(max_retries + 1):
+            if attempt:
+                await asyncio.sleep(retry_delay)
+            with self._track_request("create_draft") as request:
+                try:
+                    async with aiohttp.ClientSession() as session:
+                        async with session.post(url, headers=headers, json=data) as response:
+                            request["status"] = response.status
+                            response_text = await response.text()
+                            if response.status in (200, 201):
+                                try:
+                                    return json.loads(response_text)
+                                except ValueError:
+                                    return {"data": {"message": "Draft created", "raw": response_text}}
+                            
+                            logger.error("Draft creation error: Status %s, Response: %s", response.status, response_text)
+                            if response.status != 429:
+                                # The request may have been processed, so it is not safe to repeat
+                                return {"error": f"API error ({response.status}): {response_text}"}
+                            error_message = f"API error ({response.status}): {response_text}"
+                            try:
+                                retry_delay = float(response.headers.get("Retry-After", ""))
+                            except ValueError:
+                                retry_delay = 2 ** attempt
+                except aiohttp.ClientConnectorError as e:
+                    # The connection was never established, so nothing reached Zoho
+                    error_message = f"Request failed: {str(e)}"
+                    logger.error("Connection error during draft creation: %s", error_message)
+                    retry_delay = 2 ** attempt
+                except Exception as e:
+                    # Timeouts and dropped connections are ambiguous, never retry them
+                    error_message = str(e)
+                    logger.error("Exception during draft creation: %s", error_message)
+                    return {"error": f"Request failed: {error_message}"}
+        
+        return {"error": error_message}
     
     async def get_email_content(self, message_id: str, folder_id: str) -> Dict[str, Any]:
         """
@@ -308,24 +425,32 @@ class ZohoEmailHandler:
             return {"error": "Failed to get authentication headers"}
         
         # Build API URL - using folder path required by Zoho API
-        url = f"https://mail.{self.domain}/api/accounts/{self.account_id}/folders/{folder_id}/messages/{message_id}/content"
+        url = f"{self.base_url}/api/accounts/{self.account_id}/folders/{folder_id}/messages/{message_id}/content"
         
         # Add parameter to include block content
         params = {
             "includeBlockContent": "true"
         }
         
+        max_chars = get_zoho_pipeline_config()["content_max_chars"]
+        
         # Make the request asynchronously
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        text = await response.text()
-                        return {"error": f"API error: {text}"}
-        except Exception as e:
-            return {"error": f"Request failed: {str(e)}"}
+        with self._track_request("get_email_content") as request:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url, headers=headers, params=params) as response:
+                        request["status"] = response.status
+                        if response.status == 200:
+                            # Stream the body so inline images are dropped and huge bodies cut off
+                            # without holding the whole response in memory
+                            return await read_email_content_stream(
+                                response.content.iter_chunked(CONTENT_CHUNK_BYTES), max_chars
+                            )
+                        else:
+                            text = await response.text()
+                            return {"error": f"API error: {text}"}
+            except Exception as e:
+                return {"error": f"Request failed: {str(e)}"}
 
 # Singleton instance
 _email_handler = None
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Any, Optional
+
+# Cleaned content is small compared to the raw HTML, 50 MB holds a very long history
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+class EmailContentCache:
+    """
+    Persistent cache of cleaned email content keyed by Zoho message ID.
+
+    Zoho message content never changes once received, so a message only has to be
+    fetched and cleaned once. Entries are evicted least recently used first when
+    the stored content exceeds max_bytes.
+    """
+    def __init__(self, db_path: str = None, max_bytes: int = None):
+        self.db_path = db_path or os.path.join("data", "email_content_cache.db")
+        self.max_bytes = max_bytes or int(os.environ.get("ZOHO_CONTENT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_content (
+                message_id TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_email_content_accessed ON email_content (accessed_at)")
+        self.conn.commit()
+
+        self.entries, self.total_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM email_content"
+        ).fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, message_id: str) -> Optional[str]:
+        """Return the cached cleaned content for a message, or None if not cached"""
+        row = self.conn.execute(
+            "SELECT content FROM email_content WHERE message_id = ?", (message_id,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE email_content SET accessed_at = ? WHERE message_id = ?", (time.time(), message_id)
+        )
+        self.conn.commit()
+        return row[0]
+
+    def put(self, message_id: str, content: str):
+        """Store the cleaned content for a message and evict old entries if over size"""
+        size = len(content.encode("utf-8"))
+        previous = self.conn.execute(
+            "SELECT size FROM email_content WHERE message_id = ?", (message_id,)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO email_content (message_id, content, size, accessed_at) VALUES (?, ?, ?, ?)",
+            (message_id, content, size, time.time())
+        )
+        if previous:
+            self.total_bytes += size - previous[0]
+        else:
+            self.entries += 1
+            self.total_bytes += size
+
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is back under 90% of max_bytes"""
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute(
+            "SELECT message_id, size FROM email_content ORDER BY accessed_at"
+        )
+        to_delete = []
+        for message_id, size in rows:
+            if self.total_bytes <= target:
+                break
+            to_delete.append((message_id,))
+            self.total_bytes -= size
+
+        self.conn.executemany("DELETE FROM email_content WHERE message_id = ?", to_delete)
+        self.entries -= len(to_delete)
+        self.evictions += len(to_delete)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit-rate and size statistics for the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self.entries,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+# Singleton instance
+_content_cache = None
+
+def get_content_cache():
+    global _content_cache
+    if _content_cache is None:
+        _content_cache = EmailContentCache()
+    return _content_cache
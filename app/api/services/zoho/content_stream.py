@@ -0,0 +1,131 @@
+"""
+Streaming reader for Zoho email content responses.
+
+The content endpoint returns the whole HTML body inside a JSON document. Bodies
+with embedded images (data: URIs) or huge signatures can be several megabytes,
+almost all of which is thrown away by clean_html. The reader decodes the
+response chunk by chunk, drops base64 data: URI payloads as they stream past,
+and stops reading once the remaining text exceeds a size limit, closing the
+body with a truncation marker.
+"""
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List
+
+# Appended to bodies cut at the size limit; plain text, so it survives clean_html
+TRUNCATION_MARKER = " [Email content truncated]"
+
+# Start of a base64 data: URI, e.g. data:image/png;base64, (inside a JSON string)
+DATA_URI_RE = re.compile(r'data:[\w.+-]+\\?/[\w.+-]+(?:;[\w.+-]+=[\w.+-]+)*;base64,', re.IGNORECASE)
+# Base64 characters as they appear in a JSON string, including escaped slashes and line breaks
+BASE64_PAYLOAD_RE = re.compile(r'(?:[A-Za-z0-9+/=]+|\\/|\\[rn]|\\u000[aAdD]|\\u003[dD])*')
+# The longest text that may be the start of a data: URI or of an escape in the payload
+CARRY_CHARS = 200
+
+CONTENT_FIELD_RE = re.compile(r'"content"\s*:\s*"')
+# A JSON escape cut off at the end of the text
+PARTIAL_ESCAPE_RE = re.compile(r'(?<!\\)(?:\\\\)*(\\(?:u[0-9a-fA-F]{0,3})?)$')
+UNCLOSED_TAG_RE = re.compile(r'<[^<>]*$')
+
+class DataUriStripper:
+    """Incrementally removes the payload of base64 data: URIs from streamed text"""
+
+    def __init__(self):
+        self.pending = ""
+        self.in_payload = False
+        self.stripped_chars = 0
+        self.stripped_uris = 0
+
+    def feed(self, text: str, final: bool = False) -> str:
+        """Return the filtered text that is safe to emit; a short tail is held back unless final"""
+        buffer = self.pending + text
+        output: List[str] = []
+        position = 0
+        while True:
+            if self.in_payload:
+                end = BASE64_PAYLOAD_RE.match(buffer, position).end()
+                self.stripped_chars += end - position
+                # Near the end of the buffer the payload may continue in the next chunk,
+                # and what stopped the match may be the first half of an escape
+                if len(buffer) - end < 6 and not final:
+                    self.pending = buffer[end:]
+                    return "".join(output)
+                position = end
+                self.in_payload = False
+                continue
+
+            match = DATA_URI_RE.search(buffer, position)
+            if match is None:
+                safe_end = len(buffer) if final else max(position, len(buffer) - CARRY_CHARS)
+                output.append(buffer[position:safe_end])
+                self.pending = buffer[safe_end:]
+                return "".join(output)
+
+            output.append(buffer[position:match.end()])
+            position = match.end()
+            self.in_payload = True
+            self.stripped_uris += 1
+
+def _extract_truncated_content(text: str):
+    """
+    Recover the content field from a response cut off at the size limit
+    Returns (content, cut) where cut says whether the content itself was cut, or None
+    """
+    match = CONTENT_FIELD_RE.search(text)
+    if match is None:
+        return None
+    try:
+        # The content string may have closed before the limit was reached
+        content, _ = json.decoder.scanstring(text, match.end(), False)
+        return content, False
+    except json.JSONDecodeError:
+        pass
+    fragment = text[match.end():]
+    partial = PARTIAL_ESCAPE_RE.search(fragment)
+    if partial is not None:
+        fragment = fragment[:partial.start(1)]
+    content = json.loads('"' + fragment + '"', strict=False)
+    if content and '\ud800' <= content[-1] <= '\udbff':
+        # The low half of a surrogate pair was cut off
+        content = content[:-1]
+    # Drop a tag that was cut in half, so clean_html does not keep it as text
+    return UNCLOSED_TAG_RE.sub("", content), True
+
+async def read_email_content_stream(chunks: AsyncIterator[bytes], max_chars: int) -> Dict[str, Any]:
+    """
+    Read a Zoho content response from a stream of byte chunks
+
+    Returns the parsed response with data URIs emptied; when the filtered response is
+    longer than max_chars, reading stops and data.content holds the body read so far
+    followed by TRUNCATION_MARKER, with "truncated" set on the result.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    stripper = DataUriStripper()
+    parts: List[str] = []
+    length = 0
+    truncated = False
+
+    async for chunk in chunks:
+        filtered = stripper.feed(decoder.decode(chunk))
+        parts.append(filtered)
+        length += len(filtered)
+        if length > max_chars:
+            truncated = True
+            break
+
+    if not truncated:
+        parts.append(stripper.feed(decoder.decode(b"", final=True), final=True))
+        result = json.loads("".join(parts))
+    else:
+        extracted = _extract_truncated_content("".join(parts))
+        if extracted is None:
+            return {"error": f"Email content exceeded {max_chars} characters before the body started"}
+        content, cut = extracted
+        result = {"data": {"content": content + TRUNCATION_MARKER if cut else content}}
+
+    if isinstance(result, dict):
+        result["truncated"] = truncated
+        result["stripped_data_uris"] = stripper.stripped_uris
+        result["stripped_chars"] = stripper.stripped_chars
+    return result
@@ -1,10 +1,29 @@
-import os
-import json
 import re
-from typing import List, Dict, Any, Set
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
 
 from app.api.services.zoho.api import get_email_handler
-from app.agents.zoho.agent import create_response_agent, create_classification_agent
+from app.api.services.zoho.content_cache import get_content_cache
+from app.api.services.zoho.state_store import get_state_store, RESPONDED, SPAM
+from app.api.services.zoho.preclassifier import get_preclassifier
+from app.api.services.zoho.records import EmailRecord
+from app.api.services.zoho.pipeline import process_emails_streaming, STEP_SECONDS
+from app.utils.config import get_zoho_pipeline_config
+from app.utils.logger import get_log_colors, log_step
+from app.utils.rate_limiter import get_openai_rate_limiter
+from app.utils.memory_cache import MemoryCache
+from app.utils.metrics import get_metrics, record_agent_run
+from app.utils.llm_usage import get_llm_usage, THREAD
+from app.utils.tracing import span
+from app.agents.context import with_dynamic_context
+from app.agents.zoho.agent import (
+    create_response_agent,
+    create_classification_agent,
+    create_batch_classification_agent
+)
 from app.api.services.zoho.steps import (
     fetch_recent_emails,
     organize_emails_by_thread,
@@ -15,32 +34,69 @@ from app.api.services.zoho.steps import (
     create_drafts
 )
 
-# Color constants for terminal output
-RED = "\033[91m"
-GREEN = "\033[92m"
-YELLOW = "\033[93m"
-BLUE = "\033[94m"
-MAGENTA = "\033[95m"
-CYAN = "\033[96m"
-WHITE = "\033[97m"
-RESET = "\033[0m"
+logger = logging.getLogger(__name__)
 
-# Create a colors dictionary for passing to step modules
-COLORS = {
-    "RED": RED,
-    "GREEN": GREEN,
-    "YELLOW": YELLOW,
-    "BLUE": BLUE,
-    "MAGENTA": MAGENTA,
-    "CYAN": CYAN,
-    "WHITE": WHITE,
-    "RESET": RESET
-}
+# Create a colors dictionary for passing to step modules (blank in the production log profile)
+COLORS = get_log_colors()
+RED, GREEN, YELLOW, BLUE, CYAN, RESET = (
+    COLORS["RED"], COLORS["GREEN"], COLORS["YELLOW"], COLORS["BLUE"], COLORS["CYAN"], COLORS["RESET"]
+)
 
 # Company email addresses that we use to respond
 COMPANY_EMAIL_ADDRESSES = ["customers@deepcleaning.ie", "info@deepcleaning.ie"]
 NUMBER_OF_EMAILS_TO_FETCH = 30
 
+# Estimated prompt tokens added by each agent's instructions, schemas and output,
+# on top of the email text, when reserving OpenAI quota
+CLASSIFICATION_OVERHEAD_TOKENS = 600
+RESPONSE_OVERHEAD_TOKENS = 4000
+
+RUN_SECONDS = get_metrics().histogram(
+    "zoho_process_emails_seconds", "Duration of process_emails runs, without waiting for a run in progress", ["mode"]
+)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting requests (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+def usage_thread_id(email: EmailRecord) -> str:
+    """The thread an email's LLM usage is attributed to, keyed as in step 2 of the pipeline"""
+    return email.thread_id or f"standalone_{email.message_id}"
+
+def plan_classification_batches(prompts: List[str], token_budget: int, max_batch_size: int) -> Tuple[List[List[int]], List[int]]:
+    """
+    Group email prompts into batches that fit the token budget
+    
+    Args:
+        prompts: Formatted classification prompt for each email
+        token_budget: Maximum estimated prompt tokens per batch
+        max_batch_size: Maximum number of emails per batch
+        
+    Returns:
+        Tuple of (batches of prompt indexes, indexes too large for any batch)
+    """
+    batches = []
+    oversized = []
+    current = []
+    current_tokens = 0
+    
+    for index, prompt in enumerate(prompts):
+        tokens = estimate_tokens(prompt)
+        if tokens > token_budget:
+            oversized.append(index)
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+    
+    if current:
+        batches.append(current)
+    
+    return batches, oversized
+
 class ZohoMailHandler:
     """
     Handler for managing Zoho Mail workflows:
@@ -53,53 +109,28 @@ class ZohoMailHandler:
     def __init__(self):
         """Initialize the handler with email API access and tracking storage"""
         self.email_handler = get_email_handler()
-        # Store data file in the /data folder
-        self.data_dir = "data"
-        self.responded_emails_file = os.path.join(self.data_dir, "responded_emails.json")
-        self.spam_emails_file = os.path.join(self.data_dir, "spam_emails.json")
-        self.responded_emails = self._load_responded_emails()
-        self.spam_emails = self._load_spam_emails()
+        self.content_cache = get_content_cache()
+        # Responded and spam message IDs, stored in data/email_state.db
+        self.state_store = get_state_store()
+        self.responded_emails = self.state_store.view(RESPONDED)
+        self.spam_emails = self.state_store.view(SPAM)
         self.company_email_addresses = COMPANY_EMAIL_ADDRESSES
-    
-    def _load_responded_emails(self) -> Set[str]:
-        """Load the set of message IDs that have already been responded to"""
-        if os.path.exists(self.responded_emails_file):
-            try:
-                with open(self.responded_emails_file, 'r') as f:
-                    return set(json.load(f))
-            except Exception as e:
-                print(f"Error loading responded emails: {str(e)}")
-        return set()
-    
-    def _save_responded_emails(self):
-        """Save the set of message IDs that have been responded to"""
-        try:
-            # Ensure the data directory exists
-            os.makedirs(self.data_dir, exist_ok=True)
-            
-            with open(self.responded_emails_file, 'w') as f:
-                json.dump(list(self.responded_emails), f)
-        except Exception as e:
-            print(f"Error saving responded emails: {str(e)}")
-    
-    def _load_spam_emails(self) -> Set[str]:
-        """Load the set of message IDs that have been marked as spam"""
-        if os.path.exists(self.spam_emails_file):
-            try:
-                with open(self.spam_emails_file, 'r') as f:
-                    return set(json.load(f))
-            except Exception as e:
-                print(f"Error loading spam emails: {str(e)}")
-        return set()
-    
-    def _save_spam_emails(self):
-        """Save the set of message IDs that have been marked as spam"""
-        try:
-            os.makedirs(self.data_dir, exist_ok=True)
-            with open(self.spam_emails_file, 'w') as f:
-                json.dump(list(self.spam_emails), f)
-        except Exception as e:
-            print(f"Error saving spam emails: {str(e)}")
+        self.pipeline_config = get_zoho_pipeline_config()
+        # LLM calls and token usage per agent type
+        self.llm_usage: Dict[str, Counter] = {}
+        self.preclassifier = get_preclassifier() if self.pipeline_config["preclassifier_enabled"] else None
+        self.rate_limiter = get_openai_rate_limiter()
+        # Caches kept between runs: thread listings (dropped when a thread gets a new
+        # email or a draft) and LLM classifications by message ID (message content never changes)
+        self.thread_cache = MemoryCache(
+            self.pipeline_config["thread_cache_size"], self.pipeline_config["thread_cache_ttl_seconds"]
+        )
+        self.classification_cache = MemoryCache(
+            self.pipeline_config["classification_cache_size"], self.pipeline_config["classification_cache_ttl_seconds"]
+        )
+        # One process_emails run at a time, so overlapping webhooks never draft the same thread twice
+        self._run_lock = asyncio.Lock()
+        self.runs = 0
     
     def mark_email_as_spam(self, message_id: str, thread_id: str = None):
         """Mark an email as spam by adding its message ID and thread ID to tracking"""
@@ -107,8 +138,7 @@ class ZohoMailHandler:
             self.spam_emails.add(message_id)
             if thread_id:
                 self.spam_emails.add(f"thread_{thread_id}")
-            self._save_spam_emails()
-            print(f"{RED}Marked message {message_id} as spam{RESET}")
+            logger.debug("%sMarked message %s as spam%s", RED, message_id, RESET)
     
     def mark_email_as_responded(self, message_id: str):
         """Mark an email as responded by adding its message ID to tracking"""
@@ -116,43 +146,212 @@ class ZohoMailHandler:
             return
             
         self.responded_emails.add(message_id)
-        self._save_responded_emails()
-        print(f"{YELLOW}Marked message {message_id} as responded{RESET}")
+        logger.debug("%sMarked message %s as responded%s", YELLOW, message_id, RESET)
     
-    async def classify_email(self, email: Dict[str, Any], content: str) -> Dict[str, bool]:
+    def _record_llm_usage(self, agent_type: str, response) -> Tuple[int, int]:
+        """
+        Add the token usage reported by an agent run to the per-agent counters
+        Returns (total tokens, model requests) for the run
+        """
+        usage = self.llm_usage.setdefault(agent_type, Counter())
+        usage["calls"] += 1
+        metrics = getattr(response, "metrics", None) or {}
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            value = metrics.get(key, 0)
+            usage[key] += sum(value) if isinstance(value, list) else (value or 0)
+        # Agno reports one entry per model request (tool calls add requests)
+        total_tokens = metrics.get("total_tokens", 0)
+        requests = len(total_tokens) if isinstance(total_tokens, list) else 1
+        total = sum(total_tokens) if isinstance(total_tokens, list) else (total_tokens or 0)
+        return total, max(1, requests)
+    
+    async def _run_agent(self, agent_type: str, agent, prompt: str, overhead_tokens: int, threads: Dict[str, float]):
+        """
+        Run an agent under the shared OpenAI rate limiter and record its token usage
+        The usage is attributed to the thread IDs in threads, split by their weights
+        """
+        estimated_tokens = estimate_tokens(prompt) + overhead_tokens
+        await self.rate_limiter.acquire(estimated_tokens)
+        response = None
+        started = time.perf_counter()
+        with span(f"agent {agent_type}", agent=agent_type, estimated_tokens=estimated_tokens) as current:
+            try:
+                response = await agent.arun(prompt)
+                return response
+            finally:
+                seconds = time.perf_counter() - started
+                record_agent_run(agent_type, seconds, response)
+                if response is not None:
+                    usage = get_llm_usage().record(agent_type, response, seconds, THREAD, threads)
+                    tokens, requests = self._record_llm_usage(agent_type, response)
+                    self.llm_usage[agent_type]["cached_tokens"] += usage["cached_tokens"]
+                    self.rate_limiter.settle(estimated_tokens, tokens or estimated_tokens, requests)
+                    if current is not None:
+                        current.set(tokens=tokens, model_requests=requests, cost_usd=usage["cost_usd"])
+    
+    def _format_email_for_classification(self, email: EmailRecord, content: str) -> str:
+        """Format a single email for the classification agent"""
+        return f"""
+            From: {email.from_address} ({email.from_name})
+            Subject: {email.subject}
+            Content: {content}
+            """
+    
+    def _print_classification(self, result):
+        """Print a colored summary of a classification result"""
+        if result.is_cleaning_related:
+            if result.needs_response:
+                logger.debug("%sClassification: RELEVANT & NEEDS RESPONSE - %s%s", GREEN, result.reason, RESET)
+            else:
+                logger.debug("%sClassification: RELEVANT but NO RESPONSE NEEDED - %s%s", YELLOW, result.reason, RESET)
+        else:
+            logger.debug("%sClassification: NOT RELEVANT (SPAM) - %s%s", RED, result.reason, RESET)
+    
+    async def classify_email(self, email: EmailRecord, content: str) -> Dict[str, bool]:
         """
         Use the classification agent to determine if an email is cleaning related and needs response
         Returns dict with classification results
         """
+        message_id = email.message_id
+        cached = self.classification_cache.get(message_id) if message_id else None
+        if cached is not None:
+            logger.debug("%sUsing cached classification for message %s%s", CYAN, message_id, RESET)
+            return dict(cached)
+        
         try:
-            formatted = f"""
-            From: {email.get('fromAddress')} ({email.get('fromName', '')})
-            Subject: {email.get('subject')}
-            Content: {content}
-            """
+            formatted = self._format_email_for_classification(email, content)
             agent = await create_classification_agent()
-            response = await agent.arun(formatted)
+            response = await self._run_agent("classification", agent, formatted, CLASSIFICATION_OVERHEAD_TOKENS,
+                                             {usage_thread_id(email): 1})
             result = response.content
-            if result.is_cleaning_related:
-                if result.needs_response:
-                    print(f"{GREEN}Classification: RELEVANT & NEEDS RESPONSE - {result.reason}{RESET}")
-                else:
-                    print(f"{YELLOW}Classification: RELEVANT but NO RESPONSE NEEDED - {result.reason}{RESET}")
-            else:
-                print(f"{RED}Classification: NOT RELEVANT (SPAM) - {result.reason}{RESET}")
-                
-            return {
+            self._print_classification(result)
+            
+            classification = {
                 "is_cleaning_related": result.is_cleaning_related,
                 "needs_response": result.needs_response
             }
+            if self.preclassifier is not None:
+                self.preclassifier.record_label(email, content, classification)
+            if message_id:
+                self.classification_cache.put(message_id, dict(classification))
+            return classification
         except Exception as e:
-            print(f"{RED}Error classifying: {str(e)}{RESET}")
+            logger.error("%sError classifying: %s%s", RED, e, RESET)
             # If classification fails, assume it's relevant and needs response
             return {"is_cleaning_related": True, "needs_response": True}
     
+    async def _classify_batch(self, message_ids: List[str], prompts: List[str],
+                              emails: List[Tuple[EmailRecord, str]]) -> Dict[str, Dict[str, bool]]:
+        """
+        Classify several emails with one agent request
+        Returns classifications keyed by message ID (missing IDs were not classified)
+        """
+        batch_prompt = "\n".join(
+            f"=== EMAIL message_id={message_id} ===\n{prompt}"
+            for message_id, prompt in zip(message_ids, prompts)
+        )
+        try:
+            agent = await create_batch_classification_agent()
+            # Each email's thread pays for its share of the prompt
+            threads = Counter()
+            for (email, _), prompt in zip(emails, prompts):
+                threads[usage_thread_id(email)] += estimate_tokens(prompt)
+            response = await self._run_agent("batch_classification", agent, batch_prompt, CLASSIFICATION_OVERHEAD_TOKENS,
+                                             threads)
+            classifications = {}
+            for result in response.content.classifications:
+                if result.message_id in message_ids:
+                    self._print_classification(result)
+                    classifications[result.message_id] = {
+                        "is_cleaning_related": result.is_cleaning_related,
+                        "needs_response": result.needs_response
+                    }
+            for message_id, (email, content) in zip(message_ids, emails):
+                if message_id not in classifications:
+                    continue
+                if self.preclassifier is not None:
+                    self.preclassifier.record_label(email, content, classifications[message_id])
+                if email.message_id:
+                    self.classification_cache.put(email.message_id, dict(classifications[message_id]))
+            return classifications
+        except Exception as e:
+            logger.error("%sError classifying batch of %s emails: %s%s", RED, len(message_ids), e, RESET)
+            return {}
+    
+    async def classify_emails_batch(self, emails: List[Tuple[EmailRecord, str]]) -> List[Dict[str, bool]]:
+        """
+        Classify several emails, packing them into as few agent requests as the token budget allows
+        Emails too large for a batch, or missing from a batch response, are classified one by one
+        
+        Args:
+            emails: List of (email, content) tuples
+            
+        Returns:
+            List of classification dicts in the same order as emails
+        """
+        token_budget = self.pipeline_config["classification_batch_token_budget"]
+        max_batch_size = self.pipeline_config["classification_batch_size"]
+        semaphore = asyncio.Semaphore(max(1, self.pipeline_config["classification_concurrency"]))
+        
+        # Message IDs key the batch response, so they must be present and unique
+        message_ids = [
+            email.message_id or f"email_{index}"
+            for index, (email, _) in enumerate(emails)
+        ]
+        if len(set(message_ids)) != len(message_ids):
+            message_ids = [f"email_{index}" for index in range(len(emails))]
+        prompts = [self._format_email_for_classification(email, content) for email, content in emails]
+        
+        results: List[Dict[str, bool]] = [None] * len(emails)
+        
+        # Emails classified in an earlier run are answered from the cache
+        uncached = []
+        for index, (email, _) in enumerate(emails):
+            cached = self.classification_cache.get(email.message_id) if email.message_id else None
+            if cached is not None:
+                results[index] = dict(cached)
+            else:
+                uncached.append(index)
+        
+        planned, planned_oversized = plan_classification_batches(
+            [prompts[index] for index in uncached], token_budget, max_batch_size
+        )
+        batches = [[uncached[position] for position in batch] for batch in planned]
+        oversized = [uncached[position] for position in planned_oversized]
+        logger.info("%sClassifying %s emails in %s batches and %s single requests (%s cached)%s",
+                    CYAN, len(emails), len(batches), len(oversized), len(emails) - len(uncached), RESET)
+        
+        async def classify_single(index):
+            async with semaphore:
+                email, content = emails[index]
+                results[index] = await self.classify_email(email, content)
+        
+        async def classify_batch(indexes):
+            async with semaphore:
+                classifications = await self._classify_batch(
+                    [message_ids[i] for i in indexes],
+                    [prompts[i] for i in indexes],
+                    [emails[i] for i in indexes]
+                )
+            missing = []
+            for index in indexes:
+                if message_ids[index] in classifications:
+                    results[index] = classifications[message_ids[index]]
+                else:
+                    missing.append(index)
+            if missing:
+                logger.warning("%sBatch response missed %s emails, classifying them individually%s", YELLOW, len(missing), RESET)
+                await asyncio.gather(*(classify_single(index) for index in missing))
+        
+        await asyncio.gather(
+            *(classify_batch(indexes) for indexes in batches),
+            *(classify_single(index) for index in oversized)
+        )
+        return results
+    
     async def create_draft_response(self, 
-        latest_email: Dict[str, Any], 
-        thread: List[Dict[str, Any]], 
+        latest_email: EmailRecord, 
+        thread: List[EmailRecord], 
         thread_id: str,
         create_draft: bool = True
     ) -> Dict[str, Any]:
@@ -173,14 +372,15 @@ class ZohoMailHandler:
             formatted_emails = self._format_emails_for_agent(thread, latest_email)
             
             # Generate response with agent
-            print(f"{BLUE}Generating response with AI agent...{RESET}")
+            logger.debug("%sGenerating response with AI agent...%s", BLUE, RESET)
             agent = await create_response_agent()
             
             # Extract the response from the agent
             response = ""
             try:
                 # Try the normal way first
-                response_obj = await agent.arun(formatted_emails)
+                response_obj = await self._run_agent("response", agent, with_dynamic_context(formatted_emails),
+                                                     RESPONSE_OVERHEAD_TOKENS, {thread_id: 1})
                 
                 # Check various response formats
                 if hasattr(response_obj, 'content') and hasattr(response_obj.content, 'final_message'):
@@ -211,16 +411,16 @@ class ZohoMailHandler:
             if not response:
                 return {"error": "Failed to generate response - empty response returned"}
                 
-            print(f"{GREEN}Generated response ({len(response)} chars){RESET}")
+            logger.debug("%sGenerated response (%s chars)%s", GREEN, len(response), RESET)
             
             # Extract recipient information
-            to_address = latest_email.get("fromAddress", "")
-            subject = latest_email.get("subject", "")
+            to_address = latest_email.from_address
+            subject = latest_email.subject
             if subject and not subject.lower().startswith("re:"):
                 subject = f"Re: {subject}"
                 
             # Extract and filter CC addresses
-            cc_address = latest_email.get("ccAddress", "")
+            cc_address = latest_email.cc_address or ""
             cc_list = []
             if cc_address:
                 # Split and clean each CC address individually
@@ -231,9 +431,9 @@ class ZohoMailHandler:
             
             if create_draft:
                 # Create draft in Zoho Mail
-                print(f"{BLUE}Creating draft to: {to_address}{RESET}")
+                logger.debug("%sCreating draft to: %s%s", BLUE, to_address, RESET)
                 if cc_list:
-                    print(f"{BLUE}CC: {', '.join(cc_list)}{RESET}")
+                    logger.debug("%sCC: %s%s", BLUE, ', '.join(cc_list), RESET)
                     
                 # Ensure response is properly formatted as HTML if it contains HTML tags
                 is_html = bool(re.search(r'<[^>]+>', response))
@@ -248,17 +448,18 @@ class ZohoMailHandler:
                     body=response,
                     thread_id=thread_id if not thread_id.startswith("standalone_") else None,
                     cc=cc_list,
-                    is_html=is_html
+                    is_html=is_html,
+                    idempotency_key=f"draft:{latest_email.message_id or thread_id}"
                 )
                 
                 if "error" in result:
-                    print(f"{RED}Error creating draft: {result['error']}{RESET}")
+                    logger.error("%sError creating draft: %s%s", RED, result['error'], RESET)
                     return {
                         "response": response,
                         "error": result['error']
                     }
                 else:
-                    print(f"{GREEN}Draft created successfully{RESET}")
+                    logger.debug("%sDraft created successfully%s", GREEN, RESET)
                     return {
                         "response": response,
                         "draft_id": result.get("data", {}).get("draftId")
@@ -271,12 +472,10 @@ class ZohoMailHandler:
                 }
         except Exception as e:
             error_msg = f"AI agent error: {str(e)}"
-            print(f"{RED}{error_msg}{RESET}")
-            import traceback
-            print(f"{RED}Stack trace: {traceback.format_exc()}{RESET}")
+            logger.exception("%s%s%s", RED, error_msg, RESET)
             return {"error": error_msg}
     
-    def _format_emails_for_agent(self, thread: List[Dict[str, Any]], latest_email: Dict[str, Any]) -> str:
+    def _format_emails_for_agent(self, thread: List[EmailRecord], latest_email: EmailRecord) -> str:
         """Format the email thread for the agent to process"""
         formatted_content = "--- EMAIL THREAD HISTORY (OLDEST TO NEWEST) ---\n\n"
         
@@ -284,20 +483,20 @@ class ZohoMailHandler:
         for i, email in enumerate(thread, 1):
             # Include all emails in the thread, including our responses
             formatted_content += f"EMAIL #{i}"
-            if email.get("messageId") == latest_email.get("messageId"):
+            if email.message_id == latest_email.message_id:
                 formatted_content += " (NEEDS RESPONSE)"
             # Add a label for our company emails to make it clear
-            if email.get("fromAddress", "").lower() in [addr.lower() for addr in self.company_email_addresses]:
+            if email.from_address.lower() in [addr.lower() for addr in self.company_email_addresses]:
                 formatted_content += " (OUR PREVIOUS RESPONSE)"
             formatted_content += "\n"
-            formatted_content += f"From: {email.get('fromAddress')} ({email.get('fromName', '')})\n"
-            formatted_content += f"To: {email.get('toAddress')}\n"
-            formatted_content += f"CC: {email.get('ccAddress', 'Not Provided')}\n"
-            formatted_content += f"Subject: {email.get('subject')}\n"
-            formatted_content += f"Date: {email.get('receivedTime')}\n"
+            formatted_content += f"From: {email.from_address} ({email.from_name})\n"
+            formatted_content += f"To: {email.to_address}\n"
+            formatted_content += f"CC: {email.cc_address if email.cc_address is not None else 'Not Provided'}\n"
+            formatted_content += f"Subject: {email.subject}\n"
+            formatted_content += f"Date: {email.received_time}\n"
             
             # Extract and clean content
-            content = email.get("content", "No content")
+            content = email.content if email.content is not None else "No content"
             formatted_content += f"Content:\n{content}\n\n"
             formatted_content += "-" * 50 + "\n\n"
             
@@ -307,6 +506,31 @@ class ZohoMailHandler:
         
         return formatted_content
 
+    def _api_calls_since(self, snapshot: Dict[str, int]) -> Dict[str, int]:
+        """Return the Zoho API requests made since the given counter snapshot"""
+        current = self.email_handler.get_api_call_counts()
+        calls = {name: count - snapshot.get(name, 0) for name, count in current.items()}
+        return {name: count for name, count in calls.items() if count}
+
+    def _content_cache_since(self, snapshot: Tuple[int, int]) -> Dict[str, Any]:
+        """Return the content cache stats with the hits and misses since the given (hits, misses) snapshot"""
+        stats = self.content_cache.stats()
+        stats["hits"] -= snapshot[0]
+        stats["misses"] -= snapshot[1]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _preclassifier_since(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the pre-classifier counters since the given stats() snapshot"""
+        stats = self.preclassifier.stats()
+        for name in ("checked", "llm_calls_avoided", "sent_to_llm"):
+            stats[name] -= snapshot[name]
+        for name in ("rule_hits", "model_hits"):
+            hits = {key: count - snapshot[name].get(key, 0) for key, count in stats[name].items()}
+            stats[name] = {key: count for key, count in hits.items() if count}
+        return stats
+
     async def process_emails(self, limit: int = NUMBER_OF_EMAILS_TO_FETCH, enable_draft_creation: bool = True) -> Dict[str, Any]:
         """
         Main workflow - processes multiple emails/threads in a logical order:
@@ -318,6 +542,10 @@ class ZohoMailHandler:
         6. Generate AI responses for threads that need them
         7. Create drafts in Zoho Mail
         
+        In "streaming" mode (ZOHO_PIPELINE_MODE, the default) each thread flows through
+        steps 2-7 independently; in "barrier" mode every step finishes for all threads
+        before the next one starts.
+        
         Args:
             limit: Maximum number of recent emails to fetch (smaller values are faster for webhook triggers)
             enable_draft_creation: Whether to create actual drafts or just generate responses
@@ -325,37 +553,87 @@ class ZohoMailHandler:
         Returns:
             Dict with processing results and statistics
         """
-        try:
-            # Step 1: Fetch basic email list
+        if self._run_lock.locked():
+            logger.info("%sWaiting for the email processing run in progress to finish%s", YELLOW, RESET)
+        
+        async with self._run_lock:
+            try:
+                self.runs += 1
+                api_calls_snapshot = self.email_handler.get_api_call_counts()
+                content_cache_snapshot = (self.content_cache.hits, self.content_cache.misses)
+                preclassifier_snapshot = self.preclassifier.stats() if self.preclassifier is not None else None
+                mode = self.pipeline_config["pipeline_mode"]
+                
+                started = time.perf_counter()
+                with span("process_emails", mode=mode, limit=limit):
+                    if mode == "streaming":
+                        run = await process_emails_streaming(self, limit, enable_draft_creation, COLORS)
+                    else:
+                        run = await self._process_emails_barrier(limit, enable_draft_creation)
+                        # Streaming stages observe each thread themselves
+                        for step, seconds in (run.get("stage_seconds") or {}).items():
+                            STEP_SECONDS.observe(seconds, step=step, mode=mode)
+                RUN_SECONDS.observe(time.perf_counter() - started, mode=mode)
+                
+                if "error" in run:
+                    return run
+                
+                return self._finish_run(run, mode, enable_draft_creation, api_calls_snapshot, content_cache_snapshot,
+                                        preclassifier_snapshot)
+            except Exception as e:
+                logger.exception("%sUnexpected error in process_emails: %s%s", RED, e, RESET)
+                return {"error": f"Unexpected error: {str(e)}"}
+            finally:
+                # Commit this run's responded / spam marks in one transaction
+                self.state_store.flush()
+    
+    async def _process_emails_barrier(self, limit: int, enable_draft_creation: bool) -> Dict[str, Any]:
+        """
+        Run steps 1-7 with each step finishing for every thread before the next step starts
+        Returns the run counters and results, or a dict with an error
+        """
+        started = time.perf_counter()
+        
+        # Step 1: Fetch basic email list
+        with STEP_SECONDS.time(step="list_emails", mode="barrier"), span("step list_emails"):
             recent_emails = await fetch_recent_emails(
                 email_handler=self.email_handler, 
                 limit=limit, 
                 colors=COLORS
             )
-            
-            if "error" in recent_emails:
-                return {"error": recent_emails["error"]}
-            
-            total_emails = len(recent_emails.get("data", []))
-            
-            # Step 2: Organize emails by thread ID and fetch full thread info
+        
+        if "error" in recent_emails:
+            return {"error": recent_emails["error"]}
+        
+        run = {
+            "total_emails": len(recent_emails.get("data", [])),
+            "total_threads": 0,
+            "customer_last_emails": 0,
+            "results": [],
+            # Wall time of each step, named like the streaming pipeline stages
+            "stage_seconds": {}
+        }
+        stage_seconds = run["stage_seconds"]
+        
+        # Step 2: Organize emails by thread ID and fetch full thread info
+        stage_started = time.perf_counter()
+        with span("step list_thread"):
             full_threads = await organize_emails_by_thread(
                 recent_emails=recent_emails,
                 email_handler=self.email_handler,
                 spam_emails=self.spam_emails,
-                colors=COLORS
+                colors=COLORS,
+                thread_cache=self.thread_cache
             )
-            
-            if not full_threads:
-                return {
-                    "total_emails": total_emails,
-                    "total_threads": 0,
-                    "customer_last_emails": 0,
-                    "threads_processed": 0,
-                    "results": []
-                }
-            
-            # Step 3: Filter threads based on sender
+        run["total_threads"] = len(full_threads)
+        stage_seconds["list_thread"] = round(time.perf_counter() - stage_started, 3)
+        
+        if not full_threads:
+            return run
+        
+        # Step 3: Filter threads based on sender
+        stage_started = time.perf_counter()
+        with span("step filter"):
             customer_last_threads = filter_threads(
                 full_threads=full_threads,
                 company_email_addresses=self.company_email_addresses,
@@ -363,108 +641,187 @@ class ZohoMailHandler:
                 spam_emails=self.spam_emails,
                 colors=COLORS
             )
-            
-            if not customer_last_threads:
-                return {
-                    "total_emails": total_emails,
-                    "total_threads": len(full_threads),
-                    "customer_last_emails": 0,
-                    "threads_processed": 0,
-                    "results": []
-                }
-            
-            # Step 4: Fetch full content for all filtered threads
+        run["customer_last_emails"] = len(customer_last_threads)
+        stage_seconds["filter"] = round(time.perf_counter() - stage_started, 3)
+        
+        if not customer_last_threads:
+            return run
+        
+        # Step 4: Fetch full content for all filtered threads
+        stage_started = time.perf_counter()
+        with span("step fetch_content"):
             threads_with_content = await fetch_all_content(
                 customer_last_threads=customer_last_threads,
                 email_handler=self.email_handler,
                 company_email_addresses=self.company_email_addresses,
-                colors=COLORS
+                colors=COLORS,
+                content_cache=self.content_cache
             )
-            
-            # Step 5: Classify emails to determine which need responses
+        
+        stage_seconds["fetch_content"] = round(time.perf_counter() - stage_started, 3)
+        
+        # Step 5: Classify emails to determine which need responses
+        stage_started = time.perf_counter()
+        with span("step classify"):
             threads_for_response = await classify_emails(
                 threads_with_content=threads_with_content,
                 classify_email_func=self.classify_email,
                 mark_as_spam=self.mark_email_as_spam,
                 mark_as_responded=self.mark_email_as_responded,
-                colors=COLORS
+                colors=COLORS,
+                concurrency=self.pipeline_config["classification_concurrency"],
+                classify_batch_func=self.classify_emails_batch if self.pipeline_config["classification_batch_size"] > 1 else None,
+                preclassify_func=self.preclassifier.classify if self.preclassifier is not None else None
             )
-            
-            # Step 6: Generate AI responses for threads that need them
-            try:
+        
+        stage_seconds["classify"] = round(time.perf_counter() - stage_started, 3)
+        
+        # Step 6: Generate AI responses for threads that need them
+        stage_started = time.perf_counter()
+        try:
+            with span("step generate"):
                 generated_responses = await generate_responses(
                     threads_for_response=threads_for_response,
                     create_draft_response_func=self.create_draft_response,
-                    colors=COLORS
+                    colors=COLORS,
+                    concurrency=self.pipeline_config["response_concurrency"]
                 )
-            except Exception as e:
-                print(f"{RED}Error in generate_responses: {str(e)}{RESET}")
-                import traceback
-                print(f"{RED}Stack trace: {traceback.format_exc()}{RESET}")
-                return {
-                    "total_emails": total_emails,
-                    "total_threads": len(full_threads),
-                    "customer_last_emails": len(customer_last_threads),
-                    "threads_processed": 0,
-                    "error": f"Error generating responses: {str(e)}"
-                }
-            
-            # Step 7: Create drafts in Zoho Mail
-            try:
+        except Exception as e:
+            logger.exception("%sError in generate_responses: %s%s", RED, e, RESET)
+            return dict(run, threads_processed=0, error=f"Error generating responses: {str(e)}")
+        stage_seconds["generate"] = round(time.perf_counter() - stage_started, 3)
+        
+        # Step 7: Create drafts in Zoho Mail
+        try:
+            drafts_started = time.perf_counter()
+            with span("step create_draft"):
                 results = await create_drafts(
-                    responses_from_step6=generated_responses,
+                    threads_from_step6=generated_responses,
                     email_handler=self.email_handler,
                     company_email_addresses=self.company_email_addresses,
                     colors=COLORS,
-                    enable_draft_creation=enable_draft_creation
+                    enable_draft_creation=enable_draft_creation,
+                    concurrency=self.pipeline_config["draft_concurrency"]
                 )
-            except Exception as e:
-                print(f"{RED}Error in create_drafts: {str(e)}{RESET}")
-                import traceback
-                print(f"{RED}Stack trace: {traceback.format_exc()}{RESET}")
-                return {
-                    "total_emails": total_emails,
-                    "total_threads": len(full_threads),
-                    "customer_last_emails": len(customer_last_threads),
-                    "responses_generated": len(generated_responses),
-                    "threads_processed": 0,
-                    "error": f"Error creating drafts: {str(e)}"
-                }
-            
-            # Mark processed emails as responded
-            for result in results:
-                message_id = result.get("message_id")
-                if message_id:
-                    self.mark_email_as_responded(message_id)
-            
-            # Final summary with color
-            print(f"\n{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-            print(f"{GREEN}▶▶▶ RESULTS SUMMARY ◀◀◀{RESET}")
-            print(f"{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-            print(f"{GREEN}- Total emails fetched: {total_emails}{RESET}")
-            print(f"{GREEN}- Total threads: {len(full_threads)}{RESET}")
-            print(f"{GREEN}- Customer last emails: {len(customer_last_threads)}{RESET}")
-            print(f"{GREEN}- Threads processed: {len(results)}{RESET}")
-            
-            if enable_draft_creation:
-                print(f"{GREEN}- Drafts created: {len(results)}{RESET}")
-            else:
-                print(f"{YELLOW}Running in TEST MODE - no drafts were actually created{RESET}")
-            
-            # Output results
-            return {
-                "total_emails": total_emails,
-                "total_threads": len(full_threads),
-                "customer_last_emails": len(customer_last_threads),
-                "threads_processed": len(results),
-                "results": results
-            }
+            run["draft_seconds"] = round(time.perf_counter() - drafts_started, 3)
+            stage_seconds["create_draft"] = run["draft_seconds"]
         except Exception as e:
-            print(f"{RED}Unexpected error in process_emails: {str(e)}{RESET}")
-            import traceback
-            print(f"{RED}Stack trace: {traceback.format_exc()}{RESET}")
-            return {"error": f"Unexpected error: {str(e)}"}
+            logger.exception("%sError in create_drafts: %s%s", RED, e, RESET)
+            return dict(run, responses_generated=len(generated_responses), threads_processed=0,
+                        error=f"Error creating drafts: {str(e)}")
+        
+        # Mark processed emails as responded
+        for result in results:
+            message_id = result.get("message_id")
+            if message_id:
+                self.mark_email_as_responded(message_id)
+        
+        # Drafts are created concurrently, so the first one finishes after the shortest duration
+        draft_durations = [r["duration_seconds"] for r in results if "duration_seconds" in r and "error" not in r["result"]]
+        if not enable_draft_creation and results:
+            draft_durations = [0.0]
+        if draft_durations:
+            run["first_draft_seconds"] = round(drafts_started - started + min(draft_durations), 3)
+        run["results"] = results
+        run["total_seconds"] = round(time.perf_counter() - started, 3)
+        return run
+    
+    def _finish_run(self, run: Dict[str, Any], mode: str, enable_draft_creation: bool,
+                    api_calls_snapshot: Dict[str, int], content_cache_snapshot: Tuple[int, int],
+                    preclassifier_snapshot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Retrain the pre-classifier, print the run summary and build the process_emails result"""
+        results = run["results"]
+        
+        # A drafted thread has changed in Zoho, so its listing is fetched again next run
+        for result in results:
+            self.thread_cache.invalidate(result["thread_id"])
+        
+        # Fold this run's LLM labels into the local model
+        if self.preclassifier is not None and self.preclassifier.maybe_retrain():
+            logger.info("%sRetrained local pre-classifier%s", GREEN, RESET)
+        
+        # Final summary with color
+        log_step(logger, f"RESULTS SUMMARY ({mode.upper()})", GREEN, RESET)
+        logger.info("%s- Total emails fetched: %s%s", GREEN, run['total_emails'], RESET)
+        logger.info("%s- Total threads: %s%s", GREEN, run['total_threads'], RESET)
+        logger.info("%s- Customer last emails: %s%s", GREEN, run['customer_last_emails'], RESET)
+        logger.info("%s- Threads processed: %s%s", GREEN, len(results), RESET)
+        
+        api_calls = self._api_calls_since(api_calls_snapshot)
+        logger.info("%s- Zoho API calls: %s %s%s", GREEN, sum(api_calls.values()), api_calls, RESET)
+        content_cache_stats = self._content_cache_since(content_cache_snapshot)
+        preclassifier_stats = None
+        if self.preclassifier is not None:
+            preclassifier_stats = self._preclassifier_since(preclassifier_snapshot)
+            logger.info("%s- LLM classifications avoided: %s of %s checked%s", GREEN,
+                        preclassifier_stats['llm_calls_avoided'], preclassifier_stats['checked'], RESET)
+        logger.info("%s- OpenAI rate limiter: %s%s", GREEN, self.rate_limiter.stats(), RESET)
+        logger.info("%s- Content cache hit rate: %.0f%% (%s hits, %s misses)%s", GREEN, content_cache_stats['hit_rate'] * 100,
+                    content_cache_stats['hits'], content_cache_stats['misses'], RESET)
+        logger.info("%s- Time to first draft: %ss, total run time: %ss%s", GREEN, run.get('first_draft_seconds'),
+                    run.get('total_seconds'), RESET)
+        
+        if enable_draft_creation:
+            drafts_created = sum(1 for r in results if r.get("result", {}).get("draft_created"))
+            logger.info("%s- Drafts created: %s of %s%s", GREEN, drafts_created, len(results), RESET)
+            if run.get("draft_seconds") is not None:
+                logger.info("%s- Draft creation time: %ss (concurrency %s)%s", GREEN, run['draft_seconds'],
+                            self.pipeline_config['draft_concurrency'], RESET)
+        else:
+            logger.info("%sRunning in TEST MODE - no drafts were actually created%s", YELLOW, RESET)
+        
+        # Output results
+        return {
+            "total_emails": run["total_emails"],
+            "total_threads": run["total_threads"],
+            "customer_last_emails": run["customer_last_emails"],
+            "threads_processed": len(results),
+            "pipeline_mode": mode,
+            "first_draft_seconds": run.get("first_draft_seconds"),
+            "total_seconds": run.get("total_seconds"),
+            "draft_seconds": run.get("draft_seconds"),
+            "stage_seconds": run.get("stage_seconds"),
+            "api_calls": api_calls,
+            "content_cache": content_cache_stats,
+            "preclassifier": preclassifier_stats,
+            "results": results
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache sizes, hit rates and usage counters of this long-lived handler"""
+        return {
+            "runs": self.runs,
+            "run_in_progress": self._run_lock.locked(),
+            "thread_cache": self.thread_cache.stats(),
+            "classification_cache": self.classification_cache.stats(),
+            "content_cache": self.content_cache.stats(),
+            "state_store": self.state_store.stats(),
+            "preclassifier": self.preclassifier.stats() if self.preclassifier is not None else None,
+            "rate_limiter": self.rate_limiter.stats(),
+            "api_calls": self.email_handler.get_api_call_counts(),
+            "llm_usage": {agent_type: dict(usage) for agent_type, usage in self.llm_usage.items()},
+            "llm_usage_store": get_llm_usage().stats()
+        }
+    
+    def close(self):
+        """Persist pending state and drop the in-memory caches"""
+        self.state_store.flush()
+        self.thread_cache.clear()
+        self.classification_cache.clear()
+
+# Singleton instance
+_mail_handler = None
 
 def get_mail_handler():
-    """Get or create a mail handler instance"""
-    return ZohoMailHandler()
\ No newline at end of file
+    """Get or create the process-wide mail handler instance"""
+    global _mail_handler
+    if _mail_handler is None:
+        _mail_handler = ZohoMailHandler()
+    return _mail_handler
+
+def close_mail_handler():
+    """Close the process-wide mail handler, if it was created (called on app shutdown)"""
+    global _mail_handler
+    if _mail_handler is not None:
+        _mail_handler.close()
+        _mail_handler = None
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""
+Streaming Zoho Email Pipeline
+Runs every thread through the processing steps independently instead of waiting
+for all threads to finish a step before the next step starts.
+
+Stages are connected by bounded queues, and each stage runs a fixed number of
+workers, so a thread can already have its draft created while slower threads are
+still being fetched or classified:
+
+    list thread → filter → fetch content → classify → generate → create draft
+"""
+import logging
+import asyncio
+import time
+from typing import Dict, Any, List, Callable, Awaitable, Iterable, Optional
+
+from app.api.services.zoho.steps import (
+    fetch_recent_emails,
+    group_emails_by_thread,
+    fetch_thread_emails,
+    filter_thread,
+    fetch_thread_content,
+    classify_thread,
+    apply_classification,
+    generate_thread_response,
+    create_thread_draft
+)
+from app.utils.metrics import get_metrics
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the items flowing through a channel
+END = object()
+
+STEP_SECONDS = get_metrics().histogram(
+    "zoho_pipeline_step_seconds",
+    "Duration of the process_emails steps: per thread in streaming mode, per run over all threads in barrier mode",
+    ["step", "mode"]
+)
+CHANNEL_DEPTH = get_metrics().gauge(
+    "zoho_pipeline_channel_depth", "Threads waiting in front of each stage of the running streaming pipeline", ["stage"]
+)
+
+# Input channel of each stage of the pipeline being run, read when /metrics is scraped
+_channels: Dict[str, asyncio.Queue] = {}
+CHANNEL_DEPTH.set_function(lambda: {(name,): channel.qsize() for name, channel in _channels.items()})
+
+def _thread_id(item: Any) -> str:
+    """Thread ID of a pipeline item: a thread, or a tuple starting with its ID"""
+    thread_id = getattr(item, "thread_id", None)
+    if thread_id is None and isinstance(item, tuple) and item:
+        thread_id = item[0]
+    return str(thread_id)
+
+class Stage:
+    """A pipeline stage: an async function applied to each item by `concurrency` workers"""
+
+    def __init__(self, name: str, func: Callable[[Any], Awaitable[Optional[Any]]], concurrency: int = 1):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.durations: List[float] = []
+
+    async def run(self, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]):
+        """Process items from inbox until END; results other than None go to outbox"""
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is END:
+                    # Leave END in the channel for the other workers of this stage
+                    await inbox.put(END)
+                    return
+                started = time.perf_counter()
+                with span(f"stage {self.name}", thread_id=_thread_id(item)):
+                    try:
+                        result = await self.func(item)
+                    except Exception as e:
+                        logger.error("Error in pipeline stage %s: %s", self.name, e)
+                        result = None
+                duration = time.perf_counter() - started
+                self.durations.append(duration)
+                STEP_SECONDS.observe(duration, step=self.name, mode="streaming")
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        if outbox is not None:
+            await outbox.put(END)
+
+async def run_pipeline(items: Iterable[Any], stages: List[Stage], channel_size: int = 10):
+    """Feed items through the stages, connected by channels holding at most channel_size items"""
+    channels = [asyncio.Queue(maxsize=max(1, channel_size)) for _ in stages]
+    _channels.clear()
+    _channels.update((stage.name, channel) for stage, channel in zip(stages, channels))
+
+    async def feed():
+        for item in items:
+            await channels[0].put(item)
+        await channels[0].put(END)
+
+    try:
+        await asyncio.gather(
+            feed(),
+            *(
+                stage.run(channels[index], channels[index + 1] if index + 1 < len(stages) else None)
+                for index, stage in enumerate(stages)
+            )
+        )
+    finally:
+        _channels.clear()
+
+async def process_emails_streaming(mail_handler, limit: int, enable_draft_creation: bool, colors) -> Dict[str, Any]:
+    """
+    Process recent emails with one independent flow per thread
+    Uses the same step functions, tracking and caches as the barrier version in
+    ZohoMailHandler._process_emails_barrier. Classification batching is not used here, since
+    threads reach the classifier one at a time.
+
+    Returns:
+        Dict with the run counters, results in thread order, and timing information
+    """
+    RED, RESET = colors["RED"], colors["RESET"]
+    config = mail_handler.pipeline_config
+    started = time.perf_counter()
+    timing = {"first_draft_seconds": None}
+    counts = {"threads": 0, "customer_last": 0}
+    results = []
+
+    with STEP_SECONDS.time(step="list_emails", mode="streaming"), span("step list_emails"):
+        recent_emails = await fetch_recent_emails(
+            email_handler=mail_handler.email_handler,
+            limit=limit,
+            colors=colors
+        )
+    if "error" in recent_emails:
+        return {"error": recent_emails["error"]}
+    if "data" not in recent_emails:
+        logger.info("%sNo emails to organize%s", RED, RESET)
+        return {"total_emails": 0, "total_threads": 0, "customer_last_emails": 0, "results": []}
+
+    threads = group_emails_by_thread(recent_emails, colors)
+    thread_order = {thread_id: index for index, thread_id in enumerate(threads)}
+    company_emails_lower = [email.lower() for email in mail_handler.company_email_addresses]
+    preclassify_func = mail_handler.preclassifier.classify if mail_handler.preclassifier is not None else None
+
+    async def list_thread(item):
+        thread_id, latest_email = item
+        if thread_id.startswith("standalone_"):
+            thread_emails = [latest_email]
+        else:
+            thread_emails = await fetch_thread_emails(
+                thread_id, mail_handler.email_handler, mail_handler.spam_emails, colors,
+                thread_cache=mail_handler.thread_cache, latest_message_id=latest_email.message_id
+            )
+        if not thread_emails:
+            return None
+        counts["threads"] += 1
+        return thread_id, thread_emails
+
+    async def filter_listing(item):
+        thread_id, thread_emails = item
+        thread = filter_thread(
+            thread_id, thread_emails, company_emails_lower,
+            mail_handler.responded_emails, mail_handler.spam_emails, colors
+        )
+        if thread is None:
+            return None
+        counts["customer_last"] += 1
+        return thread
+
+    async def fetch_content(thread):
+        return await fetch_thread_content(
+            thread, mail_handler.email_handler, mail_handler.company_email_addresses,
+            colors, mail_handler.content_cache
+        )
+
+    async def classify(thread):
+        result = await classify_thread(thread, mail_handler.classify_email, colors, preclassify_func)
+        if not result:
+            return None
+        apply_classification(result, mail_handler.mark_email_as_spam, mail_handler.mark_email_as_responded, colors)
+        return result["thread"] if result["needs_response"] else None
+
+    async def generate(thread):
+        return await generate_thread_response(thread, mail_handler.create_draft_response, colors)
+
+    async def create_draft(thread):
+        if enable_draft_creation:
+            result = await create_thread_draft(
+                thread, mail_handler.email_handler, mail_handler.company_email_addresses, colors
+            )
+        else:
+            result = {
+                "thread_id": thread.thread_id,
+                "message_id": thread.latest_email.message_id,
+                "subject": thread.latest_email.subject,
+                "result": {
+                    "response": thread.response or "",
+                    "draft_created": False,
+                    "test_mode": True
+                }
+            }
+        if timing["first_draft_seconds"] is None and "error" not in result["result"]:
+            timing["first_draft_seconds"] = round(time.perf_counter() - started, 3)
+        if result.get("message_id"):
+            mail_handler.mark_email_as_responded(result["message_id"])
+        results.append(result)
+        return None
+
+    stages = [
+        Stage("list_thread", list_thread, config["thread_fetch_concurrency"]),
+        Stage("filter", filter_listing, 1),
+        Stage("fetch_content", fetch_content, config["thread_fetch_concurrency"]),
+        Stage("classify", classify, config["classification_concurrency"]),
+        Stage("generate", generate, config["response_concurrency"]),
+        Stage("create_draft", create_draft, config["draft_concurrency"]),
+    ]
+    await run_pipeline(threads.items(), stages, config["pipeline_channel_size"])
+
+    results.sort(key=lambda result: thread_order.get(result["thread_id"], len(thread_order)))
+    return {
+        "total_emails": len(recent_emails.get("data", [])),
+        "total_threads": counts["threads"],
+        "customer_last_emails": counts["customer_last"],
+        "results": results,
+        "first_draft_seconds": timing["first_draft_seconds"],
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "stage_seconds": {stage.name: round(sum(stage.durations), 3) for stage in stages}
+    }
@@ -0,0 +1,388 @@
+"""
+Local Email Pre-Classifier
+Decides obvious cases (spam, newsletters, automated notifications, thank-you and
+confirmation replies) without calling the OpenAI classifier.
+
+Two stages run in order:
+1. Compiled rule sets with very high precision
+2. A multinomial Naive Bayes model over hashed word features, trained from the
+   classifications the OpenAI agent made on our own mail
+
+Only "spam" and "no response needed" decisions are taken locally, and only when
+the model is confident. Everything else is sent to the OpenAI classifier, whose
+answer is stored as a new training label. A local spam decision marks only the
+email, not its thread (step 5), and contact form threads are never decided locally.
+
+Run as a module to import history, retrain and print a precision/recall report:
+    python -m app.api.services.zoho.preclassifier --import-history
+"""
+import logging
+import os
+import re
+import json
+import sqlite3
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.api.services.zoho.records import EmailRecord
+from app.utils.config import get_zoho_pipeline_config
+
+logger = logging.getLogger(__name__)
+
+LABEL_SPAM = "spam"
+LABEL_NO_RESPONSE = "no_response"
+LABEL_NEEDS_RESPONSE = "needs_response"
+LABELS = [LABEL_SPAM, LABEL_NO_RESPONSE, LABEL_NEEDS_RESPONSE]
+
+# Only these labels are ever decided locally
+SHORT_CIRCUIT_LABELS = {LABEL_SPAM, LABEL_NO_RESPONSE}
+
+CLASSIFICATIONS = {
+    LABEL_SPAM: {"is_cleaning_related": False, "needs_response": False},
+    LABEL_NO_RESPONSE: {"is_cleaning_related": True, "needs_response": False},
+    LABEL_NEEDS_RESPONSE: {"is_cleaning_related": True, "needs_response": True},
+}
+
+# Number of hash buckets for word features
+N_FEATURES = 2 ** 15
+# Every document gets this feature so no document is empty
+BIAS_FEATURE = "__bias__"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Rule sets: (rule name, label, field, compiled pattern)
+RULES = [
+    ("automated_sender", LABEL_SPAM, "from",
+     re.compile(r"^(no-?reply|do-?not-?reply|mailer-daemon|postmaster|notifications?|newsletters?|marketing|news)@", re.IGNORECASE)),
+    ("newsletter", LABEL_SPAM, "content",
+     re.compile(r"\bunsubscribe\b|view (this email )?in (your )?browser|manage (your )?(email |subscription )?preferences|"
+                r"you are receiving this (email|message)|you received this (email|message) because", re.IGNORECASE)),
+    ("automated_notification", LABEL_SPAM, "content",
+     re.compile(r"this is an automated (message|email|notification)|please do not reply to this (email|message)|"
+                r"this (mailbox|email address) is not monitored", re.IGNORECASE)),
+]
+
+CONFIRMATION_CONTENT = re.compile(r"\b(thanks?|thank you|confirm(ed|ing)?|perfect|sounds good|see you then)\b", re.IGNORECASE)
+CONFIRMATION_SUBJECT = re.compile(r"cleaning|service|booking", re.IGNORECASE)
+# Confirmations are short; longer replies usually carry new questions
+CONFIRMATION_MAX_LENGTH = 200
+
+def label_for(classification: Dict[str, Any]) -> str:
+    """Map an is_cleaning_related / needs_response classification to a label"""
+    if not classification["is_cleaning_related"]:
+        return LABEL_SPAM
+    return LABEL_NEEDS_RESPONSE if classification["needs_response"] else LABEL_NO_RESPONSE
+
+def sender_address(email: EmailRecord) -> str:
+    """Lowercase sender address without display name or angle brackets"""
+    address = email.from_address.lower().strip()
+    match = re.search(r"[\w.+-]+@[\w.-]+", address)
+    return match.group(0) if match else address
+
+def apply_rules(email: EmailRecord, content: str) -> Optional[Tuple[str, str]]:
+    """
+    Run the rule sets against an email
+    Returns (rule name, label) for the first matching rule, or None
+    """
+    fields = {"from": sender_address(email), "content": content}
+    for name, label, field, pattern in RULES:
+        if pattern.search(fields[field]):
+            return name, label
+
+    subject = email.subject
+    if (len(content) < CONFIRMATION_MAX_LENGTH and "?" not in content
+            and CONFIRMATION_CONTENT.search(content) and CONFIRMATION_SUBJECT.search(subject)):
+        return "confirmation", LABEL_NO_RESPONSE
+
+    return None
+
+def email_features(subject: str, sender: str, content: str) -> np.ndarray:
+    """Hash the words of an email into feature bucket indexes"""
+    tokens = [BIAS_FEATURE]
+    tokens.extend("s_" + token for token in TOKEN_PATTERN.findall(subject.lower()))
+    tokens.extend(TOKEN_PATTERN.findall(content.lower()))
+    if "@" in sender:
+        tokens.append("from_" + sender.rsplit("@", 1)[1])
+    if "?" in content:
+        tokens.append("__question__")
+    tokens.append(f"__length_{min(len(content) // 100, 20)}__")
+    return np.fromiter(
+        (zlib.crc32(token.encode("utf-8")) % N_FEATURES for token in tokens),
+        dtype=np.int64,
+        count=len(tokens)
+    )
+
+class NaiveBayesModel:
+    """Multinomial Naive Bayes over hashed word counts"""
+
+    def __init__(self, class_log_prior: np.ndarray, feature_log_prob: np.ndarray):
+        self.class_log_prior = class_log_prior
+        self.feature_log_prob = feature_log_prob
+
+    @classmethod
+    def fit(cls, documents: List[np.ndarray], labels: np.ndarray, alpha: float = 1.0) -> "NaiveBayesModel":
+        """Fit the model from per-document bucket indexes and integer labels"""
+        n_classes = len(LABELS)
+        feature_counts = np.zeros((n_classes, N_FEATURES), dtype=np.float64)
+        for class_index in range(n_classes):
+            class_documents = [doc for doc, label in zip(documents, labels) if label == class_index]
+            if class_documents:
+                feature_counts[class_index] = np.bincount(np.concatenate(class_documents), minlength=N_FEATURES)
+
+        class_counts = np.bincount(labels, minlength=n_classes).astype(np.float64)
+        class_log_prior = np.log((class_counts + 1.0) / (class_counts.sum() + n_classes))
+        smoothed = feature_counts + alpha
+        feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        return cls(class_log_prior, feature_log_prob)
+
+    def predict_proba(self, documents: List[np.ndarray]) -> np.ndarray:
+        """Return class probabilities with shape (documents, classes)"""
+        if not documents:
+            return np.zeros((0, len(LABELS)))
+        lengths = np.fromiter((len(doc) for doc in documents), dtype=np.int64, count=len(documents))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        token_log_prob = self.feature_log_prob[:, np.concatenate(documents)]
+        joint = np.add.reduceat(token_log_prob, offsets, axis=1).T + self.class_log_prior
+        joint -= joint.max(axis=1, keepdims=True)
+        probabilities = np.exp(joint)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def save(self, path: str):
+        np.savez_compressed(path, class_log_prior=self.class_log_prior, feature_log_prob=self.feature_log_prob)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesModel":
+        data = np.load(path)
+        return cls(data["class_log_prior"], data["feature_log_prob"])
+
+def precision_recall(actual: List[str], predicted: List[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Precision and recall of each locally decided label, where a None prediction
+    means the email was sent to the LLM
+    """
+    report = {}
+    for label in LABELS:
+        if label not in SHORT_CIRCUIT_LABELS:
+            continue
+        true_positive = sum(1 for a, p in zip(actual, predicted) if p == label and a == label)
+        predicted_count = sum(1 for p in predicted if p == label)
+        actual_count = sum(1 for a in actual if a == label)
+        report[label] = {
+            "precision": round(true_positive / predicted_count, 3) if predicted_count else None,
+            "recall": round(true_positive / actual_count, 3) if actual_count else None,
+            "predicted": predicted_count,
+            "actual": actual_count
+        }
+    return report
+
+class EmailPreClassifier:
+    """
+    Rule + Naive Bayes pre-classifier with a persistent store of labelled emails
+    """
+    def __init__(self, data_dir: str = "data", threshold: float = 0.97, min_examples: int = 100,
+                 retrain_every: int = 25):
+        self.data_dir = data_dir
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.retrain_every = retrain_every
+        self.model_file = os.path.join(data_dir, "preclassifier_model.npz")
+        os.makedirs(data_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(data_dir, "preclassifier.db"), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS labelled_emails (
+                message_id TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                content TEXT NOT NULL,
+                label TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self.model: Optional[NaiveBayesModel] = None
+        if os.path.exists(self.model_file):
+            try:
+                self.model = NaiveBayesModel.load(self.model_file)
+            except Exception as e:
+                logger.warning("Error loading pre-classifier model: %s", e)
+        self.labels_since_training = 0
+
+        self.checked = 0
+        self.rule_hits = Counter()
+        self.model_hits = Counter()
+        self.sent_to_llm = 0
+
+    @property
+    def llm_calls_avoided(self) -> int:
+        return sum(self.rule_hits.values()) + sum(self.model_hits.values())
+
+    def classify(self, email: EmailRecord, content: str) -> Optional[Dict[str, Any]]:
+        """
+        Classify an email locally
+        Returns a classification dict (with a 'source' key) or None when the LLM should decide
+        """
+        self.checked += 1
+
+        rule = apply_rules(email, content)
+        if rule:
+            name, label = rule
+            self.rule_hits[name] += 1
+            return dict(CLASSIFICATIONS[label], source=f"rule:{name}")
+
+        if self.model is not None:
+            features = email_features(email.subject, sender_address(email), content)
+            probabilities = self.model.predict_proba([features])[0]
+            best = int(probabilities.argmax())
+            label = LABELS[best]
+            if label in SHORT_CIRCUIT_LABELS and probabilities[best] >= self.threshold:
+                self.model_hits[label] += 1
+                return dict(CLASSIFICATIONS[label], source=f"model:{probabilities[best]:.3f}")
+
+        self.sent_to_llm += 1
+        return None
+
+    def record_label(self, email: EmailRecord, content: str, classification: Dict[str, Any]):
+        """Store an LLM classification as a training example"""
+        message_id = email.message_id
+        if not message_id or not content:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO labelled_emails (message_id, subject, sender, content, label, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (message_id, email.subject, sender_address(email), content, label_for(classification), time.time())
+        )
+        self.conn.commit()
+        self.labels_since_training += 1
+
+    def import_history(self, spam_ids, content_cache) -> int:
+        """
+        Add previously marked spam messages whose cleaned content is still cached
+        Responded messages are not imported: they mix drafted replies and
+        "no response needed" decisions, so their label is unknown
+        """
+        imported = 0
+        for message_id in spam_ids:
+            if message_id.startswith("thread_"):
+                continue
+            content = content_cache.get(message_id)
+            if not content:
+                continue
+            self.conn.execute(
+                "INSERT OR IGNORE INTO labelled_emails (message_id, subject, sender, content, label, created_at) VALUES (?, '', '', ?, ?, ?)",
+                (message_id, content, LABEL_SPAM, time.time())
+            )
+            imported += 1
+        self.conn.commit()
+        return imported
+
+    def _load_examples(self) -> Tuple[List[str], List[np.ndarray], np.ndarray]:
+        rows = self.conn.execute(
+            "SELECT message_id, subject, sender, content, label FROM labelled_emails ORDER BY message_id"
+        ).fetchall()
+        message_ids = [row[0] for row in rows]
+        documents = [email_features(row[1], row[2], row[3]) for row in rows]
+        labels = np.array([LABELS.index(row[4]) for row in rows], dtype=np.int64)
+        return message_ids, documents, labels
+
+    def train(self) -> bool:
+        """Fit the model on every stored label; returns False if there is not enough data yet"""
+        _, documents, labels = self._load_examples()
+        self.labels_since_training = 0
+        if len(documents) < self.min_examples:
+            return False
+        self.model = NaiveBayesModel.fit(documents, labels)
+        self.model.save(self.model_file)
+        return True
+
+    def maybe_retrain(self) -> bool:
+        """Retrain once enough new labels have been recorded"""
+        if self.labels_since_training >= self.retrain_every:
+            return self.train()
+        return False
+
+    def evaluate(self) -> Dict[str, Any]:
+        """
+        Precision/recall of the local decisions on a held-out fifth of the stored labels
+        (the model is fitted on the remaining examples for this report only)
+        """
+        message_ids, documents, labels = self._load_examples()
+        rows = self.conn.execute("SELECT subject, sender, content FROM labelled_emails ORDER BY message_id").fetchall()
+        test = np.array([zlib.crc32(message_id.encode("utf-8")) % 5 == 0 for message_id in message_ids], dtype=bool)
+        train_indexes = np.flatnonzero(~test)
+        test_indexes = np.flatnonzero(test)
+
+        actual = [LABELS[labels[i]] for i in test_indexes]
+        predicted = []
+        model = None
+        if len(train_indexes) >= self.min_examples:
+            model = NaiveBayesModel.fit([documents[i] for i in train_indexes], labels[train_indexes])
+            probabilities = model.predict_proba([documents[i] for i in test_indexes])
+
+        for position, index in enumerate(test_indexes):
+            subject, sender, content = rows[index]
+            email = EmailRecord(message_id=message_ids[index], subject=subject or "", from_address=sender or "")
+            rule = apply_rules(email, content)
+            if rule:
+                predicted.append(rule[1])
+                continue
+            if model is not None:
+                best = int(probabilities[position].argmax())
+                if LABELS[best] in SHORT_CIRCUIT_LABELS and probabilities[position][best] >= self.threshold:
+                    predicted.append(LABELS[best])
+                    continue
+            predicted.append(None)
+
+        return {
+            "examples": len(message_ids),
+            "test_examples": len(test_indexes),
+            "threshold": self.threshold,
+            "decided_locally": sum(1 for p in predicted if p is not None),
+            "labels": precision_recall(actual, predicted)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return usage counters for the current process"""
+        return {
+            "checked": self.checked,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "sent_to_llm": self.sent_to_llm,
+            "rule_hits": dict(self.rule_hits),
+            "model_hits": dict(self.model_hits),
+            "model_loaded": self.model is not None
+        }
+
+# Singleton instance
+_preclassifier = None
+
+def get_preclassifier():
+    global _preclassifier
+    if _preclassifier is None:
+        config = get_zoho_pipeline_config()
+        _preclassifier = EmailPreClassifier(
+            threshold=config["preclassifier_threshold"],
+            min_examples=config["preclassifier_min_examples"]
+        )
+    return _preclassifier
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Train and evaluate the local email pre-classifier")
+    parser.add_argument("--import-history", action="store_true",
+                        help="import spam-marked messages whose content is in the content cache")
+    args = parser.parse_args()
+
+    preclassifier = get_preclassifier()
+    if args.import_history:
+        from app.api.services.zoho.content_cache import get_content_cache
+        from app.api.services.zoho.state_store import get_state_store, SPAM
+        spam_ids = get_state_store().keys(SPAM)
+        print(f"Imported {preclassifier.import_history(spam_ids, get_content_cache())} spam examples")
+
+    trained = preclassifier.train()
+    print("Model trained" if trained else f"Not enough labelled emails to train (need {preclassifier.min_examples})")
+    print(json.dumps(preclassifier.evaluate(), indent=2))
@@ -0,0 +1,91 @@
+import sys
+from typing import Any, Dict, List, Optional
+
+def _parse_time(value) -> int:
+    """Zoho sends epoch milliseconds as strings; unparseable times sort as 0"""
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+def _shared(value) -> str:
+    """Intern values repeated across many messages (addresses, folder and thread IDs)"""
+    return sys.intern(value) if value else ""
+
+class EmailRecord:
+    """
+    One Zoho message, with only the fields the pipeline uses
+
+    Built once from the API listing by from_api() and then passed around by
+    reference: the thread cache, the step results and the final thread all hold
+    the same object. content is filled in by step 4.
+    """
+    __slots__ = (
+        "message_id", "thread_id", "folder_id", "received_time",
+        "from_address", "from_name", "sender", "to_address", "cc_address",
+        "subject", "content"
+    )
+
+    def __init__(self, message_id: str, thread_id: str = "", folder_id: str = "", received_time: int = 0,
+                 from_address: str = "", from_name: str = "", sender: str = "", to_address: str = "",
+                 cc_address: Optional[str] = None, subject: str = "", content: Optional[str] = None):
+        self.message_id = message_id
+        self.thread_id = thread_id
+        self.folder_id = folder_id
+        self.received_time = received_time
+        self.from_address = from_address
+        self.from_name = from_name
+        self.sender = sender
+        self.to_address = to_address
+        # None when Zoho did not send the field
+        self.cc_address = cc_address
+        self.subject = subject
+        self.content = content
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "EmailRecord":
+        """Parse one message of a Zoho messages/view listing"""
+        cc_address = data.get("ccAddress")
+        return cls(
+            message_id=data.get("messageId") or "",
+            thread_id=_shared(data.get("threadId")),
+            folder_id=_shared(data.get("folderId")),
+            received_time=_parse_time(data.get("receivedTime")),
+            from_address=_shared(data.get("fromAddress")),
+            from_name=_shared(data.get("fromName")),
+            sender=_shared(data.get("sender")),
+            to_address=_shared(data.get("toAddress")),
+            cc_address=_shared(cc_address) if cc_address is not None else None,
+            subject=_shared(data.get("subject")),
+            content=data.get("content")
+        )
+
+    def __repr__(self) -> str:
+        return f"EmailRecord(message_id={self.message_id!r}, thread_id={self.thread_id!r}, from_address={self.from_address!r})"
+
+class ThreadRecord:
+    """
+    A thread moving through steps 3-7
+
+    emails is the thread listing from step 2, newest first. Step 4 sets history,
+    the same records oldest first with their content, and step 6 sets response
+    or error.
+    """
+    __slots__ = ("thread_id", "emails", "latest_email", "is_contact_form", "history", "response", "error")
+
+    def __init__(self, thread_id: str, emails: List[EmailRecord], is_contact_form: bool = False):
+        self.thread_id = thread_id
+        self.emails = emails
+        self.latest_email = emails[0]
+        self.is_contact_form = is_contact_form
+        self.history: Optional[List[EmailRecord]] = None
+        self.response: Optional[str] = None
+        self.error: Optional[str] = None
+
+    @property
+    def standalone(self) -> bool:
+        """Emails without a thread ID are keyed as standalone_<messageId>"""
+        return self.thread_id.startswith("standalone_")
+
+    def __repr__(self) -> str:
+        return f"ThreadRecord(thread_id={self.thread_id!r}, emails={len(self.emails)})"
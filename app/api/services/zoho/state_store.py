@@ -0,0 +1,186 @@
+import logging
+import os
+import json
+import sqlite3
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+from app.utils.config import get_zoho_pipeline_config
+
+logger = logging.getLogger(__name__)
+
+# Tracking kinds stored by the mail handler
+RESPONDED = "responded"
+SPAM = "spam"
+
+# Pending marks are committed once this many have accumulated, even mid-run
+FLUSH_THRESHOLD = 100
+
+class EmailStateStore:
+    """
+    Persistent record of the message IDs (and spam thread markers) the mail handler
+    has already dealt with, replacing responded_emails.json and spam_emails.json.
+
+    Marks are kept in memory until flush() commits them in one transaction, so a run
+    costs a single write. The database runs in WAL mode with a busy timeout, and
+    inserts are idempotent, so several worker processes can share it; lookups go to
+    the database so marks committed by other processes are seen straight away.
+    """
+    def __init__(self, db_path: str = None, retention_days: Optional[float] = None):
+        self.db_path = db_path or os.path.join("data", "email_state.db")
+        self.retention_days = retention_days
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_state (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                marked_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_email_state_marked ON email_state (marked_at)")
+        self.conn.commit()
+
+        # Marks not yet committed, and keys known to be marked (marks are never undone
+        # except by retention, so positive lookups can be remembered)
+        self.pending: Dict[tuple, float] = {}
+        self.known = set()
+        self.commits = 0
+        self.pruned_at = 0.0
+
+        if self.retention_days:
+            self.prune(self.retention_days)
+
+    def mark(self, kind: str, key: str):
+        """Record a key; it is committed on the next flush()"""
+        if (kind, key) in self.known:
+            return
+        self.pending[(kind, key)] = time.time()
+        self.known.add((kind, key))
+        if len(self.pending) >= FLUSH_THRESHOLD:
+            self.flush()
+
+    def contains(self, kind: str, key: str) -> bool:
+        """Whether a key has been marked, by this process or any other"""
+        if (kind, key) in self.known:
+            return True
+        row = self.conn.execute(
+            "SELECT 1 FROM email_state WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is not None:
+            self.known.add((kind, key))
+            return True
+        return False
+
+    def flush(self):
+        """Commit all pending marks in a single transaction"""
+        if not self.pending:
+            return
+        rows = [(kind, key, marked_at) for (kind, key), marked_at in self.pending.items()]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO email_state (kind, key, marked_at) VALUES (?, ?, ?)", rows
+            )
+        self.pending.clear()
+        self.commits += 1
+
+        # Long-running processes apply retention at most once a day
+        if self.retention_days and time.time() - self.pruned_at > 86400:
+            self.prune(self.retention_days)
+
+    def keys(self, kind: str) -> List[str]:
+        """All committed and pending keys of a kind"""
+        rows = self.conn.execute("SELECT key FROM email_state WHERE kind = ?", (kind,))
+        keys = [row[0] for row in rows]
+        keys.extend(key for pending_kind, key in self.pending if pending_kind == kind)
+        return keys
+
+    def count(self, kind: str) -> int:
+        committed = self.conn.execute("SELECT COUNT(*) FROM email_state WHERE kind = ?", (kind,)).fetchone()[0]
+        return committed + sum(1 for pending_kind, _ in self.pending if pending_kind == kind)
+
+    def prune(self, retention_days: float) -> int:
+        """Delete marks older than retention_days; returns the number removed"""
+        cutoff = time.time() - retention_days * 86400
+        with self.conn:
+            removed = self.conn.execute("DELETE FROM email_state WHERE marked_at < ?", (cutoff,)).rowcount
+        self.known.clear()
+        self.pruned_at = time.time()
+        return removed
+
+    def migrate_json(self, kind: str, json_path: str) -> int:
+        """
+        Import a legacy JSON list of keys once, then rename the file to *.migrated
+        Safe to run from several processes at once: duplicate inserts are ignored
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                keys = json.load(f)
+            marked_at = os.path.getmtime(json_path)
+        except (OSError, ValueError) as e:
+            logger.error("Error reading %s for migration: %s", json_path, e)
+            return 0
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO email_state (kind, key, marked_at) VALUES (?, ?, ?)",
+                [(kind, key, marked_at) for key in keys]
+            )
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError:
+            # Another process finished the same migration first
+            pass
+        logger.info("Migrated %s %s entries from %s", len(keys), kind, json_path)
+        return len(keys)
+
+    def view(self, kind: str) -> "StateSet":
+        return StateSet(self, kind)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            RESPONDED: self.count(RESPONDED),
+            SPAM: self.count(SPAM),
+            "pending": len(self.pending),
+            "commits": self.commits
+        }
+
+class StateSet:
+    """Set-like view of one kind of mark, so the step modules can keep using `in` and add()"""
+
+    def __init__(self, store: EmailStateStore, kind: str):
+        self.store = store
+        self.kind = kind
+
+    def __contains__(self, key) -> bool:
+        return bool(key) and self.store.contains(self.kind, key)
+
+    def add(self, key: str):
+        self.store.mark(self.kind, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.keys(self.kind))
+
+    def __len__(self) -> int:
+        return self.store.count(self.kind)
+
+# Singleton instance
+_state_store = None
+
+def get_state_store():
+    global _state_store
+    if _state_store is None:
+        _state_store = EmailStateStore(retention_days=get_zoho_pipeline_config()["state_retention_days"])
+        # One-time import of the JSON files used before the state store existed
+        _state_store.migrate_json(RESPONDED, os.path.join("data", "responded_emails.json"))
+        _state_store.migrate_json(SPAM, os.path.join("data", "spam_emails.json"))
+    return _state_store
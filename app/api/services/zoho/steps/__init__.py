@@ -1,25 +1,37 @@
 """
 Zoho Email Processing Steps
 This package contains the individual steps for processing Zoho emails.
+Each step exposes a batch function used by the barrier pipeline and, where
+needed, the per-thread function used by the streaming pipeline.
 """
 
 from app.api.services.zoho.steps.step1_fetch_emails import fetch_recent_emails
-from app.api.services.zoho.steps.step2_organize_threads import organize_emails_by_thread
-from app.api.services.zoho.steps.step3_filter_threads import filter_threads, clean_email_address
-from app.api.services.zoho.steps.step4_fetch_content import fetch_all_content, clean_html, remove_quoted_content
-from app.api.services.zoho.steps.step5_classify_emails import classify_emails
-from app.api.services.zoho.steps.step6_generate_responses import generate_responses
-from app.api.services.zoho.steps.step7_create_drafts import create_drafts
+from app.api.services.zoho.steps.step2_organize_threads import organize_emails_by_thread, group_emails_by_thread, fetch_thread_emails
+from app.api.services.zoho.steps.step3_filter_threads import filter_threads, filter_thread, clean_email_address
+from app.api.services.zoho.steps.step4_fetch_content import fetch_all_content, fetch_thread_content, clean_html, remove_quoted_content, clean_email_body, clean_email_content
+from app.api.services.zoho.steps.step5_classify_emails import classify_emails, classify_thread, apply_classification
+from app.api.services.zoho.steps.step6_generate_responses import generate_responses, generate_thread_response
+from app.api.services.zoho.steps.step7_create_drafts import create_drafts, create_thread_draft
 
 __all__ = [
     'fetch_recent_emails',
     'organize_emails_by_thread',
+    'group_emails_by_thread',
+    'fetch_thread_emails',
     'filter_threads',
+    'filter_thread',
     'clean_email_address',
     'fetch_all_content',
+    'fetch_thread_content',
     'clean_html',
     'remove_quoted_content',
+    'clean_email_body',
+    'clean_email_content',
     'classify_emails',
+    'classify_thread',
+    'apply_classification',
     'generate_responses',
-    'create_drafts'
+    'generate_thread_response',
+    'create_drafts',
+    'create_thread_draft'
 ] 
\ No newline at end of file
@@ -2,8 +2,12 @@
 Step 1: Fetch Basic Email List
 This module handles fetching recent emails from Zoho.
 """
+import logging
 import json
 from typing import Dict, Any
+from app.utils.logger import log_step
+
+logger = logging.getLogger(__name__)
 
 async def fetch_recent_emails(email_handler, limit: int, colors) -> Dict[str, Any]:
     """
@@ -12,24 +16,22 @@ async def fetch_recent_emails(email_handler, limit: int, colors) -> Dict[str, An
     """
     BLUE, GREEN, RED, RESET = colors["BLUE"], colors["GREEN"], colors["RED"], colors["RESET"]
     
-    print(f"\n{BLUE}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{BLUE}▶▶▶ STEP 1: FETCHING BASIC EMAIL LIST ◀◀◀{RESET}")
-    print(f"{BLUE}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"\n{BLUE}=== Step 1: Fetching {limit} Recent Emails ==={RESET}")
+    log_step(logger, "STEP 1: FETCHING BASIC EMAIL LIST", BLUE, RESET)
+    logger.debug("\n%s=== Step 1: Fetching %s Recent Emails ===%s", BLUE, limit, RESET)
     
     # Make the API request
     result = await email_handler.list_emails(limit=limit)
     
     if "data" in result:
-        print(f"{GREEN}Successfully fetched {len(result['data'])} emails{RESET}")
+        logger.info("%sSuccessfully fetched %s emails%s", GREEN, len(result['data']), RESET)
     else:
-        print(f"{RED}Error fetching emails: {result.get('error', 'Unknown error')}{RESET}")
+        logger.error("%sError fetching emails: %s%s", RED, result.get('error', 'Unknown error'), RESET)
     
     # Raw data dump
     # print(f"{colors['WHITE']}RAW_EMAILS:{RESET}")
     # print(json.dumps(result, indent=2, default=str))
     
     total_emails = len(result.get("data", []))
-    print(f"{BLUE}Fetched {total_emails} recent emails{RESET}")
+    logger.info("%sFetched %s recent emails%s", BLUE, total_emails, RESET)
     
     return result 
\ No newline at end of file
@@ -2,24 +2,25 @@
 Step 2: Organize Emails by Thread ID
 This module handles organizing emails by thread ID and fetching full thread information.
 """
-from typing import Dict, Any
+import logging
+from operator import attrgetter
+from typing import Dict, Any, List, Optional
 
-async def organize_emails_by_thread(recent_emails: Dict[str, Any], email_handler, 
-                                  spam_emails: set, colors) -> Dict[str, Dict[str, Any]]:
+from app.api.services.zoho.records import EmailRecord
+from app.utils.logger import log_step
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of messages listed per thread. Step 4 reuses this listing,
+# so it is the only place a thread is listed during a run.
+THREAD_EMAILS_LIMIT = 100
+
+def group_emails_by_thread(recent_emails: Dict[str, Any], colors) -> Dict[str, EmailRecord]:
     """
-    Step 2: Organize emails by thread ID and fetch full thread information
-    Returns a dictionary with thread IDs as keys and thread data as values
+    Group the recent emails by thread ID, keeping the newest email of each thread
+    Emails without a thread ID are keyed as standalone_<messageId>
     """
-    GREEN, RED, RESET = colors["GREEN"], colors["RED"], colors["RESET"]
-    
-    print(f"\n{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{GREEN}▶▶▶ STEP 2: FETCHING EMAILS BY THREAD ID ◀◀◀{RESET}")
-    print(f"{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"\n{GREEN}=== Step 2: Organizing Emails by Thread ID ==={RESET}")
-    
-    if "data" not in recent_emails:
-        print(f"{RED}No emails to organize{RESET}")
-        return {}
+    GREEN, RESET = colors["GREEN"], colors["RESET"]
     
     # First organize by thread ID
     threads = {}
@@ -27,62 +28,100 @@ async def organize_emails_by_thread(recent_emails: Dict[str, Any], email_handler
     
     # Group emails by thread ID
     for email in recent_emails["data"]:
-        thread_id = email.get("threadId")
+        thread_id = email.thread_id
         if thread_id:
-            # Parse received time as integer for accurate comparison
-            try:
-                current_time = int(threads.get(thread_id, {}).get("receivedTime", 0))
-                new_time = int(email.get("receivedTime", 0))
-            except (ValueError, TypeError):
-                # Fallback if time is not a valid integer
-                current_time = 0
-                new_time = 1
+            new_time = email.received_time
             
             # If thread already exists, check if this email is newer
             if thread_id in threads:
-                if new_time > current_time:
+                if new_time > threads[thread_id].received_time:
                     threads[thread_id] = email
-                    print(f"Updated thread {thread_id} with newer email, time: {new_time}")
+                    logger.debug("Updated thread %s with newer email, time: %s", thread_id, new_time)
             else:
                 threads[thread_id] = email
-                print(f"Added new thread {thread_id}, time: {new_time}")
+                logger.debug("Added new thread %s, time: %s", thread_id, new_time)
         else:
             standalone_emails.append(email)
     
     # Add standalone emails to the result with their message ID as key
     for email in standalone_emails:
-        message_id = email.get("messageId", "standalone_" + str(len(threads)))
+        message_id = email.message_id or "standalone_" + str(len(threads))
         threads[f"standalone_{message_id}"] = email
     
-    print(f"{GREEN}Organized emails into {len(threads)} threads{RESET}")
+    logger.info("%sOrganized emails into %s threads%s", GREEN, len(threads), RESET)
+    
+    return threads
+
+async def fetch_thread_emails(thread_id: str, email_handler, spam_emails: set, colors,
+                              thread_cache=None, latest_message_id: str = None) -> Optional[List[EmailRecord]]:
+    """
+    Fetch the email listing of a single thread, sorted newest first
+    Returns None if the thread is marked as spam or has no emails
+    
+    With a thread_cache, a listing from an earlier run is reused as long as it already
+    contains latest_message_id, the newest email of the thread in this run's inbox
+    listing; a thread that received a new email is listed again.
+    """
+    RED, RESET = colors["RED"], colors["RESET"]
+    
+    logger.debug("Fetching emails for thread: %s", thread_id)
+    # Skip if thread is already marked as spam
+    if f"thread_{thread_id}" in spam_emails:
+        logger.debug("%sSkipping thread %s - previously marked as spam%s", RED, thread_id, RESET)
+        return None
+    
+    if thread_cache is not None:
+        cached = thread_cache.get(thread_id)
+        if cached is not None:
+            if latest_message_id and any(email.message_id == latest_message_id for email in cached):
+                logger.debug("Using cached listing for thread %s (%s emails)", thread_id, len(cached))
+                # The records are shared with earlier runs: step 4 only fills in
+                # their content, which never changes for a message
+                return cached
+            thread_cache.invalidate(thread_id)
+    
+    thread_result = await email_handler.list_emails(threadId=thread_id, limit=THREAD_EMAILS_LIMIT)
+    if "data" in thread_result and thread_result["data"]:
+        # Sort emails in thread by receivedTime
+        thread_emails = sorted(
+            thread_result["data"],
+            key=attrgetter("received_time"),
+            reverse=True  # newest first
+        )
+        logger.debug("Found %s emails in thread %s", len(thread_emails), thread_id)
+        if thread_cache is not None:
+            thread_cache.put(thread_id, thread_emails)
+        return thread_emails
+    return None
+
+async def organize_emails_by_thread(recent_emails: Dict[str, Any], email_handler, 
+                                  spam_emails: set, colors, thread_cache=None) -> Dict[str, List[EmailRecord]]:
+    """
+    Step 2: Organize emails by thread ID and fetch full thread information
+    Returns a dictionary with thread IDs as keys and thread data as values
+    """
+    GREEN, RED, RESET = colors["GREEN"], colors["RED"], colors["RESET"]
+    
+    log_step(logger, "STEP 2: FETCHING EMAILS BY THREAD ID", GREEN, RESET)
+    logger.debug("\n%s=== Step 2: Organizing Emails by Thread ID ===%s", GREEN, RESET)
+    
+    if "data" not in recent_emails:
+        logger.info("%sNo emails to organize%s", RED, RESET)
+        return {}
+    
+    threads = group_emails_by_thread(recent_emails, colors)
     
     # Now fetch full thread information for each thread ID
-    thread_ids = []
     full_threads = {}
-    
-    # Find all the thread IDs from the emails
     for thread_id in threads.keys():
-        if not thread_id.startswith("standalone_"):
-            thread_ids.append(thread_id)
-    
-    # Fetch all thread emails for each thread ID
-    for thread_id in thread_ids:
-        print(f"Fetching emails for thread: {thread_id}")
-        # Skip if thread is already marked as spam
-        if f"thread_{thread_id}" in spam_emails:
-            print(f"{RED}Skipping thread {thread_id} - previously marked as spam{RESET}")
+        if thread_id.startswith("standalone_"):
             continue
-        
-        thread_result = await email_handler.list_emails(threadId=thread_id)
-        if "data" in thread_result and thread_result["data"]:
-            # Sort emails in thread by receivedTime
-            thread_emails = sorted(
-                thread_result["data"],
-                key=lambda x: int(x.get("receivedTime", 0)),
-                reverse=True  # newest first
-            )
+        thread_emails = await fetch_thread_emails(
+            thread_id, email_handler, spam_emails, colors,
+            thread_cache=thread_cache, latest_message_id=threads[thread_id].message_id
+        )
+        if thread_emails:
             full_threads[thread_id] = thread_emails
-            print(f"Found {len(thread_emails)} emails in thread {thread_id}")
     
     # Add standalone emails to the result with their message ID as key
     for thread_id, email in threads.items():
@@ -93,6 +132,6 @@ async def organize_emails_by_thread(recent_emails: Dict[str, Any], email_handler
     # print(f"{colors['WHITE']}RAW_FULL_THREADS:{RESET}")
     # print(json.dumps(full_threads, indent=2, default=str))
     
-    print(f"{GREEN}Organized {len(full_threads)} threads with full email lists{RESET}")
+    logger.info("%sOrganized %s threads with full email lists%s", GREEN, len(full_threads), RESET)
     
-    return full_threads 
\ No newline at end of file
+    return full_threads
\ No newline at end of file
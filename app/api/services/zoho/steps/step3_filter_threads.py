@@ -2,9 +2,15 @@
 Step 3: Filter Threads Based on Last Email Sender
 This module handles filtering threads to identify relevant customer emails.
 """
+import logging
 import json
 import html
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from app.api.services.zoho.records import EmailRecord, ThreadRecord
+from app.utils.logger import log_step
+
+logger = logging.getLogger(__name__)
 
 def clean_email_address(raw_address):
     """Clean an email address by unescaping HTML entities and removing angle brackets"""
@@ -23,86 +29,90 @@ def get_clean_email_addresses(raw_addresses):
     addresses = [clean_email_address(addr) for addr in raw_addresses.split(',')]
     return [addr for addr in addresses if addr]  # Filter out empty addresses
 
-def filter_threads(full_threads: Dict[str, List[Dict[str, Any]]], 
+def filter_thread(thread_id: str, thread_emails: List[EmailRecord],
+                  company_emails_lower: List[str],
+                  responded_emails: set,
+                  spam_emails: set,
+                  colors) -> Optional[ThreadRecord]:
+    """
+    Decide whether a single thread needs processing
+    Returns the thread if the last email is from a customer (or is a contact form), else None
+    """
+    YELLOW, RED, GREEN, RESET = colors["YELLOW"], colors["RED"], colors["GREEN"], colors["RESET"]
+    
+    if not thread_emails:
+        return None
+    
+    # Get the latest email in the thread
+    latest_email = thread_emails[0]  # Already sorted newest first
+    
+    # Skip if message is already marked as spam
+    message_id = latest_email.message_id
+    if message_id in spam_emails:
+        logger.debug("%sSkipping message %s - previously marked as spam%s", RED, message_id, RESET)
+        return None
+    
+    # Skip if we've already responded
+    if message_id and message_id in responded_emails:
+        logger.debug("%sSkipping %s - already responded - %s%s", RED, thread_id, message_id, RESET)
+        return None
+    
+    # Get raw data
+    raw_from_address = latest_email.from_address
+    raw_to_address = latest_email.to_address
+    
+    # Clean and process email addresses
+    from_address = clean_email_address(raw_from_address)
+    to_addresses = get_clean_email_addresses(raw_to_address)
+    
+    # Special case: Contact form submissions
+    # A contact form is when the company emails itself with form data
+    is_from_company = from_address in company_emails_lower
+    has_company_recipient = any(addr in company_emails_lower for addr in to_addresses)
+    
+    is_contact_form = is_from_company and has_company_recipient
+    
+    if is_contact_form:
+        logger.debug("%sThread %s - Including contact form submission%s", YELLOW, thread_id, RESET)
+        logger.debug("%sRAW FROM: %s%s", YELLOW, raw_from_address, RESET)
+        logger.debug("%sRAW TO: %s%s", YELLOW, raw_to_address, RESET)
+        return ThreadRecord(thread_id, thread_emails, is_contact_form=True)
+    
+    # Regular case: Check if sender is a company email
+    if is_from_company:
+        logger.debug("%sThread %s - SKIPPING: Last email from company (%s)%s", RED, thread_id, from_address, RESET)
+        return None
+    
+    # Only keep threads where the last email is from a customer
+    logger.debug("%sThread %s - FROM: %s - SUBJECT: %s%s", GREEN, thread_id, from_address, latest_email.subject, RESET)
+    return ThreadRecord(thread_id, thread_emails, is_contact_form=False)
+
+def filter_threads(full_threads: Dict[str, List[EmailRecord]], 
                   company_email_addresses: List[str],
                   responded_emails: set,
                   spam_emails: set,
-                  colors) -> Dict[str, Dict[str, Any]]:
+                  colors) -> Dict[str, ThreadRecord]:
     """
     Step 3: Filter out threads where the last email was sent by the company
     Returns a dictionary of threads that need processing
     """
-    YELLOW, RED, GREEN, RESET = colors["YELLOW"], colors["RED"], colors["GREEN"], colors["RESET"]
+    YELLOW, RESET = colors["YELLOW"], colors["RESET"]
     
-    print(f"\n{YELLOW}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{YELLOW}▶▶▶ STEP 3: FILTERING THREADS BASED ON LAST EMAIL SENDER ◀◀◀{RESET}")
-    print(f"{YELLOW}═════════════════════════════════════════════════════════════{RESET}")
+    log_step(logger, "STEP 3: FILTERING THREADS BASED ON LAST EMAIL SENDER", YELLOW, RESET)
     
     # Convert company emails to lowercase for case-insensitive comparison
     company_emails_lower = [email.lower() for email in company_email_addresses]
     customer_last_threads = {}
     
     for thread_id, thread_emails in full_threads.items():
-        if not thread_emails:
-            continue
-        
-        # Get the latest email in the thread
-        latest_email = thread_emails[0]  # Already sorted newest first
-        
-        # Skip if message is already marked as spam
-        message_id = latest_email.get("messageId")
-        if message_id in spam_emails:
-            print(f"{RED}Skipping message {message_id} - previously marked as spam{RESET}")
-            continue
-        
-        # Skip if we've already responded
-        if message_id and message_id in responded_emails:
-            print(f"{RED}Skipping {thread_id} - already responded - {message_id}{RESET}")
-            continue
-        
-        # Get raw data
-        raw_from_address = latest_email.get("fromAddress", "")
-        raw_to_address = latest_email.get("toAddress", "")
-        
-        # Clean and process email addresses
-        from_address = clean_email_address(raw_from_address)
-        to_addresses = get_clean_email_addresses(raw_to_address)
-        
-        # Special case: Contact form submissions
-        # A contact form is when the company emails itself with form data
-        is_from_company = from_address in company_emails_lower
-        has_company_recipient = any(addr in company_emails_lower for addr in to_addresses)
-        
-        is_contact_form = is_from_company and has_company_recipient
-        
-        if is_contact_form:
-            print(f"{YELLOW}Thread {thread_id} - Including contact form submission{RESET}")
-            print(f"{YELLOW}RAW FROM: {raw_from_address}{RESET}")
-            print(f"{YELLOW}RAW TO: {raw_to_address}{RESET}")
-            customer_last_threads[thread_id] = {
-                "latest_email": latest_email,
-                "thread_emails": thread_emails,
-                "is_contact_form": True
-            }
-            continue
-        
-        # Regular case: Check if sender is a company email
-        if is_from_company:
-            print(f"{RED}Thread {thread_id} - SKIPPING: Last email from company ({from_address}){RESET}")
-            continue
-        
-        # Only keep threads where the last email is from a customer
-        print(f"{GREEN}Thread {thread_id} - FROM: {from_address} - SUBJECT: {latest_email.get('subject')}{RESET}")
-        customer_last_threads[thread_id] = {
-            "latest_email": latest_email,
-            "thread_emails": thread_emails,
-            "is_contact_form": False
-        }
+        thread = filter_thread(thread_id, thread_emails, company_emails_lower, responded_emails, spam_emails, colors)
+        if thread:
+            customer_last_threads[thread_id] = thread
     
     # Raw data dump
     # print(f"{colors['WHITE']}RAW_CUSTOMER_THREADS:{RESET}")
     # print(json.dumps(customer_last_threads, indent=2, default=str))
     
-    print(f"{YELLOW}Found {len(customer_last_threads)} threads with customer's last email{RESET}")
+    logger.info("%sFound %s threads with customer's last email%s", YELLOW, len(customer_last_threads), RESET)
     
-    return customer_last_threads 
\ No newline at end of file
+    return customer_last_threads
\ No newline at end of file
@@ -2,105 +2,189 @@
 Step 4: Fetch Full Content for Threads
 This module handles fetching the full content for email threads.
 """
+import logging
 import json
 import asyncio
 import html
 import re
-from typing import Dict, Any, List
+from concurrent.futures.process import BrokenProcessPool
+from operator import attrgetter
+from typing import Dict, Any, List, Optional
+from app.api.services.zoho.records import ThreadRecord
 from app.api.services.zoho.steps.step3_filter_threads import clean_email_address
+from app.utils.config import get_zoho_pipeline_config
+from app.utils.process_pool import run_in_process_pool
+from app.utils.logger import log_json, log_step
+
+logger = logging.getLogger(__name__)
+
+# Patterns used by clean_html, compiled once
+HEAD_RE = re.compile(r'<head.*?>.*?</head>', re.DOTALL)
+STYLE_RE = re.compile(r'<style.*?>.*?</style>', re.DOTALL)
+SCRIPT_RE = re.compile(r'<script.*?>.*?</script>', re.DOTALL)
+BR_RE = re.compile(r'<br\s*/?>')
+PARAGRAPH_BREAK_RE = re.compile(r'</p>\s*<p[^>]*>')
+DIV_OPEN_RE = re.compile(r'<div[^>]*>')
+TAG_RE = re.compile(r'<[^>]*>')
 
 def clean_html(html_content):
-    """Clean HTML content to plain text without line breaks"""
+    """
+    Clean HTML content to plain text without line breaks
+    Each pass is skipped when the text cannot contain what it replaces
+    """
     # Remove HTML tags
-    text = re.sub(r'<head.*?>.*?</head>', '', html_content, flags=re.DOTALL)
-    text = re.sub(r'<style.*?>.*?</style>', '', text, flags=re.DOTALL)
-    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
+    text = html_content
+    if '<head' in text:
+        text = HEAD_RE.sub('', text)
+    if '<style' in text:
+        text = STYLE_RE.sub('', text)
+    if '<script' in text:
+        text = SCRIPT_RE.sub('', text)
     
     # Replace common HTML entities
-    text = html.unescape(text)
+    if '&' in text:
+        text = html.unescape(text)
     
-    # Replace <br>, <p>, <div> tags with spaces instead of newlines
-    text = re.sub(r'<br\s*/?>', ' ', text)
-    text = re.sub(r'</p>\s*<p[^>]*>', ' ', text)
-    text = re.sub(r'<div[^>]*>', ' ', text)
-    text = re.sub(r'</div>', '', text)
-    
-    # Remove all remaining HTML tags
-    text = re.sub(r'<[^>]*>', '', text)
+    if '<' in text:
+        # Replace <br>, <p>, <div> tags with spaces instead of newlines
+        if '<br' in text:
+            text = BR_RE.sub(' ', text)
+        if '</p>' in text:
+            text = PARAGRAPH_BREAK_RE.sub(' ', text)
+        if '<div' in text:
+            text = DIV_OPEN_RE.sub(' ', text)
+        text = text.replace('</div>', '')
+        
+        # Remove all remaining HTML tags
+        text = TAG_RE.sub('', text)
     
-    # Clean up whitespace - remove newlines completely
-    text = re.sub(r'\n', ' ', text)
-    text = re.sub(r'[ \t]+', ' ', text)  # Reduce multiple spaces to single space
+    # Clean up whitespace - remove newlines completely and reduce runs of spaces to
+    # one space (splitting on ' ' only, so other whitespace such as \r is kept)
+    text = text.replace('\n', ' ').replace('\t', ' ')
+    text = ' '.join(part for part in text.split(' ') if part)
     
     return text.strip()
 
+# Quote boundaries, in the order they are applied. Each one is a chain of markers
+# that must appear in this order with anything in between, and the quote runs from
+# the first marker to the end of the text; e.g. "From: ... Sent: ... To: ...".
+# Whitespace markers use a single \s, the shortest form of the original \s+, which
+# leaves the most room for the markers after it.
+QUOTE_BOUNDARIES = [
+    # ---- On [date] [name] [email] wrote ----
+    [r'(?<![-_])[-_]{2,}\s?On', r'wrote\s?[-_]{2}'],
+    # From: [sender] Sent: [date] To: [recipient]
+    [r'From:', r'Sent:', r'To:'],
+    # On [date], [name] <[email]> wrote:
+    [r'On\s', r',\s', r'\swrote:'],
+    # On [date] at [time], [name] <[email]> wrote:
+    [r'On\s', r'\sat\s', r',\s', r'\swrote:'],
+    # -------- Original message -------- (mobile email format)
+    [r'(?<!-)-{4,}\s*Original message\s*-{4}'],
+    # Sent from my [device] followed by original message marker
+    [r'Sent from my', r'-{4}'],
+    # From: [sender] Date: [date] To: [recipient] (another email client format)
+    [r'From:', r'Date:', r'To:'],
+    # From: [sender] Date: [date], at [time] To: [recipient] Subject: [subject]
+    [r'From:', r'Date:', r'at', r'To:', r'Subject:'],
+]
+QUOTE_BOUNDARIES = [
+    [re.compile(marker, re.IGNORECASE) for marker in markers]
+    for markers in QUOTE_BOUNDARIES
+]
+QUOTE_LINE_RE = re.compile(r'(?m)^>.*$')
+SIGNATURE_RE = re.compile(r'--\s*$.*', re.DOTALL)
+
+def find_quote_boundary(text, markers):
+    """
+    Return where the earliest quote described by markers starts in text, or None
+    
+    Only the first occurrence of the first marker needs checking: a later start
+    leaves less text for the remaining markers. Each marker is then searched once
+    after the previous one, so the scan is linear in the length of the text.
+    """
+    first = markers[0].search(text)
+    if first is None:
+        return None
+    position = first.end()
+    for marker in markers[1:]:
+        match = marker.search(text, position)
+        if match is None:
+            return None
+        position = match.end()
+    return first.start()
+
 def remove_quoted_content(text):
     """Remove quoted email content from email body"""
-    # Common email citation patterns
-    patterns = [
-        # Pattern: ---- On [date] [name] [email] wrote ----
-        r'[-_]{2,}(\s)?On.*?wrote(\s)?[-_]{2,}.*',
-        # Pattern: From: [sender] Sent: [date] To: [recipient]
-        r'From:.*?Sent:.*?To:.*',
-        # Pattern: On [date], [name] <[email]> wrote:
-        r'On\s+.*?,\s+.*?\s+wrote:.*',
-        # Pattern: On [date] at [time], [name] <[email]> wrote:
-        r'On\s+.*?\s+at\s+.*?,\s+.*?\s+wrote:.*',
-        # Pattern: -------- Original message -------- (mobile email format)
-        r'[-]{4,}\s*Original message\s*[-]{4,}.*',
-        # Pattern: Sent from my [device] followed by original message marker
-        r'Sent from my.*?[-]{4,}.*',
-        # Pattern: From: [sender] Date: [date] To: [recipient] (another email client format)
-        r'From:.*?Date:.*?To:.*',
-        # Pattern: From: [sender] Date: [date], at [time] To: [recipient] Subject: [subject]
-        r'From:.*?Date:.*?at.*?To:.*?Subject:.*',
-    ]
-    
-    # Apply each pattern
-    for pattern in patterns:
-        # First attempt - keep only the content before the pattern
-        split_text = re.split(pattern, text, flags=re.IGNORECASE | re.DOTALL)
-        if len(split_text) > 1:
-            # Found a pattern match, keep only the content before it
-            text = split_text[0].strip()
+    # Keep only the content before each quote boundary, applying them one after another
+    for markers in QUOTE_BOUNDARIES:
+        start = find_quote_boundary(text, markers)
+        if start is not None:
+            text = text[:start].strip()
     
     # Check for any lines starting with ">" which is a common quote marker
-    text = re.sub(r'(?m)^>.*$', '', text)
+    if '>' in text:
+        text = QUOTE_LINE_RE.sub('', text)
     
     # Clean up any trailing signatures or footers with common patterns
-    text = re.sub(r'--\s*$.*', '', text, flags=re.DOTALL)  # "--" signature marker
+    if '--' in text:
+        text = SIGNATURE_RE.sub('', text)  # "--" signature marker
     
     # Clean up any extra spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+    return ' '.join(text.split())
+
+def clean_email_body(html_content):
+    """Turn a raw HTML email body into plain text without the quoted earlier messages"""
+    return remove_quoted_content(clean_html(html_content))
 
-async def fetch_thread_content(thread_info, email_handler, company_email_addresses, colors):
-    """Fetch content for a thread asynchronously"""
+async def clean_email_content(html_content, inline_max_chars: int = None):
+    """
+    Clean a raw HTML email body
+    Bodies longer than inline_max_chars are cleaned in the shared process pool, so a
+    multi-megabyte newsletter does not block every other request on the event loop
+    """
+    if inline_max_chars is None:
+        inline_max_chars = get_zoho_pipeline_config()["content_inline_clean_max_chars"]
+    if len(html_content) <= inline_max_chars:
+        return clean_email_body(html_content)
+    try:
+        return await run_in_process_pool(clean_email_body, html_content)
+    except BrokenProcessPool:
+        # The body kills the workers, so only as much as is safe to clean inline is kept
+        logger.error("Process pool broken twice, cleaning the first %d of %d characters inline",
+                     inline_max_chars, len(html_content))
+        return clean_email_body(html_content[:inline_max_chars])
+
+async def fetch_thread_content(thread: ThreadRecord, email_handler, company_email_addresses, colors,
+                               content_cache=None) -> Optional[ThreadRecord]:
+    """
+    Fetch content for a thread asynchronously, reusing cached content when available
+    Returns the thread with its history (oldest first) and latest email set, or None
+    """
     MAGENTA, RED, GREEN, YELLOW, CYAN, RESET = colors["MAGENTA"], colors["RED"], colors["GREEN"], colors["YELLOW"], colors["CYAN"], colors["RESET"]
     
     try:
-        thread_id = thread_info["thread_id"]
-        latest_email = thread_info["latest_email"]
-        is_standalone = thread_info["standalone"]
-        is_contact_form = thread_info.get("is_contact_form", False)
+        thread_id = thread.thread_id
+        latest_email = thread.latest_email
+        is_standalone = thread.standalone
+        is_contact_form = thread.is_contact_form
         
-        print(f"\n{MAGENTA}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━{RESET}")
-        print(f"{MAGENTA}▶ PROCESSING THREAD: {thread_id}{RESET}")
+        logger.debug("\n%s━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━%s", MAGENTA, RESET)
+        logger.debug("%s▶ PROCESSING THREAD: %s%s", MAGENTA, thread_id, RESET)
         if is_contact_form:
-            print(f"{YELLOW}This is a contact form submission{RESET}")
+            logger.debug("%sThis is a contact form submission%s", YELLOW, RESET)
         
         # Log thread info at start
-        print(f"\n{CYAN}=== Thread Info {thread_id} ==={RESET}")
-        thread_info_log = {
-            "is_standalone": is_standalone,
-            "is_contact_form": is_contact_form,
-            "email_from": latest_email.get("fromAddress"),
-            "email_to": latest_email.get("toAddress"),
-            "sender": latest_email.get("sender"),
-            "subject": latest_email.get("subject")
-        }
-        print(json.dumps(thread_info_log, indent=2, default=str))
+        if logger.isEnabledFor(logging.DEBUG):
+            thread_info_log = {
+                "is_standalone": is_standalone,
+                "is_contact_form": is_contact_form,
+                "email_from": latest_email.from_address,
+                "email_to": latest_email.to_address,
+                "sender": latest_email.sender,
+                "subject": latest_email.subject
+            }
+            log_json(thread_info_log, f"\n{CYAN}=== Thread Info {thread_id} ==={RESET}", logger)
         
         # Helper function for fetching a single email's content
         async def fetch_single_email_content(email, msg_id, folder_id=None):
@@ -108,176 +192,148 @@ async def fetch_thread_content(thread_info, email_handler, company_email_address
             max_retries = 3
             retry_count = 0
             
-            folder_id = folder_id or email.get("folderId")
+            folder_id = folder_id or email.folder_id
             if not folder_id:
-                print(f"{RED}· Missing folder ID for email {msg_id}, cannot fetch content{RESET}")
+                logger.warning("%s· Missing folder ID for email %s, cannot fetch content%s", RED, msg_id, RESET)
                 return False
             
+            # Records from a cached thread listing keep the content fetched in an earlier run
+            if email.content is not None:
+                return True
+            
+            # Message content never changes, so a cached copy is always valid
+            if content_cache is not None:
+                cached_content = content_cache.get(msg_id)
+                if cached_content is not None:
+                    email.content = cached_content
+                    logger.debug("%s· Email %s: Content from cache (%s chars)%s", GREEN, msg_id, len(cached_content), RESET)
+                    return True
+            
             while retry_count < max_retries:
                 try:
                     # Simplified log to reduce output clutter
-                    print(f"{MAGENTA}· Fetching content for email {msg_id}{RESET}")
+                    logger.debug("%s· Fetching content for email %s%s", MAGENTA, msg_id, RESET)
                     email_content = await email_handler.get_email_content(msg_id, folder_id)
                     
                     if "data" in email_content and "content" in email_content["data"]:
-                        # Clean and store the content
-                        content = clean_html(email_content["data"]["content"])
-                        # Remove quoted email content
-                        content = remove_quoted_content(content)
-                        email["content"] = content
-                        print(f"{GREEN}· Email {msg_id}: Content fetched ({len(content)} chars){RESET}")
+                        if email_content.get("truncated"):
+                            logger.warning("%s· Email %s: Body over the size limit, truncated%s", YELLOW, msg_id, RESET)
+                        # Clean the content and remove quoted email content
+                        content = await clean_email_content(email_content["data"]["content"])
+                        email.content = content
+                        if content_cache is not None:
+                            content_cache.put(msg_id, content)
+                        logger.debug("%s· Email %s: Content fetched (%s chars)%s", GREEN, msg_id, len(content), RESET)
                         return True
                     else:
                         error = email_content.get('error', 'Unknown error')
-                        print(f"{RED}· Email {msg_id}: Failed to fetch content: {error}{RESET}")
+                        logger.error("%s· Email %s: Failed to fetch content: %s%s", RED, msg_id, error, RESET)
                         retry_count += 1
                         await asyncio.sleep(1)  # Wait 1 second before retrying
                 except Exception as e:
-                    print(f"{RED}· Email {msg_id}: Exception fetching content: {str(e)}{RESET}")
+                    logger.error("%s· Email %s: Exception fetching content: %s%s", RED, msg_id, e, RESET)
                     retry_count += 1
                     await asyncio.sleep(1)
             
             # Failed after max retries
-            print(f"{RED}· Email {msg_id}: Failed after {max_retries} attempts{RESET}")
+            logger.error("%s· Email %s: Failed after %s attempts%s", RED, msg_id, max_retries, RESET)
             return False
         
         if is_standalone:
             # Handle standalone emails
-            message_id = latest_email.get("messageId", "")
-            folder_id = latest_email.get("folderId", "")
+            message_id = latest_email.message_id
+            folder_id = latest_email.folder_id
+            # Thread is just the single email
+            thread.history = [latest_email]
             
             if not folder_id:
-                print(f"Missing folder ID for email {message_id}, cannot fetch content")
-                thread = [latest_email]  # Fallback to basic email
-                return {
-                    "thread_id": thread_id,
-                    "latest_email": latest_email,
-                    "thread": thread
-                }
+                logger.warning("Missing folder ID for email %s, cannot fetch content", message_id)
+                return thread
             
             if message_id:
-                print(f"Email (ID: {message_id}, folder ID: {folder_id})")
+                logger.debug("Email (ID: %s, folder ID: %s)", message_id, folder_id)
                 success = await fetch_single_email_content(latest_email, message_id, folder_id)
                 
-                thread = [latest_email]
                 if success:
-                    print(f"Content: {latest_email.get('content', '')[:100]}...")
+                    logger.debug("Content: %s...", (latest_email.content or '')[:100])
                 else:
-                    print(f"Failed to fetch content")
-                
-                return {
-                    "thread_id": thread_id,
-                    "latest_email": latest_email, 
-                    "thread": thread
-                }
-            else:
-                thread = [latest_email]  # Thread is just the single email
-                return {
-                    "thread_id": thread_id,
-                    "latest_email": latest_email,
-                    "thread": thread
-                }
+                    logger.error("Failed to fetch content")
+            
+            return thread
         else:
-            # Fetch all emails in thread
-            print(f"{MAGENTA}▶ Fetching thread: {thread_id}{RESET}")
-            thread_response = await email_handler.list_emails(threadId=thread_id, limit=100)
-            print(f"\n{CYAN}=== Thread Response for {thread_id} ==={RESET}")
-            thread_log = {
-                "has_data": "data" in thread_response,
-                "has_error": "error" in thread_response,
-                "emails_count": len(thread_response.get("data", [])) if "data" in thread_response else 0
-            }
-            print(json.dumps(thread_log, indent=2, default=str))
+            # Reuse the thread listing fetched in step 2 (newest first)
+            thread_emails = thread.emails
+            logger.debug("%s▶ Using thread listing from step 2: %s (%s emails)%s", MAGENTA, thread_id, len(thread_emails), RESET)
             
-            if "data" in thread_response:
+            if thread_emails:
                 # Sort thread emails by received time
-                try:
-                    thread = sorted(thread_response["data"], 
-                                    key=lambda x: int(x.get("receivedTime", 0)))
-                except (ValueError, TypeError):
-                    # Fallback if sorting by time fails
-                    thread = thread_response["data"]
-                
-                # Skip if the thread is empty
-                if not thread:
-                    print(f"{RED}Skipping thread {thread_id} - no emails found{RESET}")
-                    return None
+                history = sorted(thread_emails, key=attrgetter("received_time"))
                 
                 # Use our original logic in the parent to determine if this is a contact form
                 # Check if last email is the same as our last_email from parent (don't try to redetermine)
-                if not is_contact_form and thread and len(thread) > 0:
-                    last_email = thread[-1]
-                    last_email_id = last_email.get("messageId", "")
-                    latest_email_id = latest_email.get("messageId", "")
+                if not is_contact_form and history and len(history) > 0:
+                    last_email = history[-1]
+                    last_email_id = last_email.message_id
+                    latest_email_id = latest_email.message_id
                     
                     # Verify if the email IDs match - they should match if we're looking at the same email
                     if last_email_id != latest_email_id:
-                        print(f"{RED}⚠️ WARNING: Thread last email ID ({last_email_id}) doesn't match our latest email ID ({latest_email_id}){RESET}")
-                        print(f"{YELLOW}Using our original determination to continue processing{RESET}")
+                        logger.warning("%s⚠️ WARNING: Thread last email ID (%s) doesn't match our latest email ID (%s)%s", RED, last_email_id, latest_email_id, RESET)
+                        logger.debug("%sUsing our original determination to continue processing%s", YELLOW, RESET)
                 
                 # Create tasks for fetching content for all emails in the thread
                 fetch_tasks = []
-                for email in thread:
-                    msg_id = email.get("messageId")
+                for email in history:
+                    msg_id = email.message_id
                     if msg_id:
                         task = fetch_single_email_content(email, msg_id)
                         fetch_tasks.append(task)
                 
                 # Group all content fetching logs to keep them together
-                print(f"{MAGENTA}━ Fetching content for {len(fetch_tasks)} emails in thread {thread_id} ━{RESET}")
+                logger.debug("%s━ Fetching content for %s emails in thread %s ━%s", MAGENTA, len(fetch_tasks), thread_id, RESET)
                 
                 # Run all fetch tasks concurrently with retry logic
                 if fetch_tasks:
                     results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
                     success_count = sum(1 for r in results if not isinstance(r, Exception) and r is True)
-                    print(f"{GREEN}Fetched content for {success_count} out of {len(fetch_tasks)} emails in thread {thread_id}{RESET}")
+                    logger.debug("%sFetched content for %s out of %s emails in thread %s%s", GREEN, success_count, len(fetch_tasks), thread_id, RESET)
                 
-                print(f"{GREEN}Total emails in thread {thread_id}: {len(thread)}{RESET}")
+                logger.debug("%sTotal emails in thread %s: %s%s", GREEN, thread_id, len(history), RESET)
                 
                 # Check last email has content
-                last_email_content = thread[-1].get("content", "")
-                print(f"\n{CYAN}=== Last Email Content Length for {thread_id} ==={RESET}")
-                content_length_log = {
-                    "length": len(last_email_content),
-                    "from": thread[-1].get("fromAddress"),
-                    "has_content": bool(last_email_content)
-                }
-                print(json.dumps(content_length_log, indent=2, default=str))
+                last_email_content = history[-1].content or ""
+                if logger.isEnabledFor(logging.DEBUG):
+                    content_length_log = {
+                        "length": len(last_email_content),
+                        "from": history[-1].from_address,
+                        "has_content": bool(last_email_content)
+                    }
+                    log_json(content_length_log, f"\n{CYAN}=== Last Email Content Length for {thread_id} ==={RESET}", logger)
                 
-                return {
-                    "thread_id": thread_id,
-                    "latest_email": thread[-1],
-                    "thread": thread
-                }
+                thread.history = history
+                thread.latest_email = history[-1]
+                return thread
             else:
-                print(f"{RED}Failed to fetch thread: {thread_response.get('error', 'Unknown error')}{RESET}")
+                logger.debug("%sSkipping thread %s - no emails found%s", RED, thread_id, RESET)
                 return None
     except Exception as e:
-        print(f"{RED}Error processing thread {thread_info['thread_id']}: {str(e)}{RESET}")
+        logger.error("%sError processing thread %s: %s%s", RED, thread.thread_id, e, RESET)
         return None
 
-async def fetch_all_content(customer_last_threads, email_handler, company_email_addresses, colors):
+async def fetch_all_content(customer_last_threads, email_handler, company_email_addresses, colors, content_cache=None):
     """
     Step 4: Fetch full content for all filtered threads
     Returns a list of threads with full content
     """
     MAGENTA, RED, RESET = colors["MAGENTA"], colors["RED"], colors["RESET"]
     
-    print(f"\n{MAGENTA}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{MAGENTA}▶▶▶ STEP 4: FETCHING FULL CONTENT FOR {len(customer_last_threads)} THREADS ◀◀◀{RESET}")
-    print(f"{MAGENTA}═════════════════════════════════════════════════════════════{RESET}")
+    log_step(logger, f"STEP 4: FETCHING FULL CONTENT FOR {len(customer_last_threads)} THREADS", MAGENTA, RESET)
     threads_with_content = []
     
     # Create tasks for fetching content for all threads
     fetch_tasks = []
-    for thread_id, thread_data in customer_last_threads.items():
-        thread_info = {
-            "thread_id": thread_id,
-            "latest_email": thread_data["latest_email"],
-            "standalone": thread_id.startswith("standalone_"),
-            "is_contact_form": thread_data["is_contact_form"]
-        }
-        task = fetch_thread_content(thread_info, email_handler, company_email_addresses, colors)
+    for thread in customer_last_threads.values():
+        task = fetch_thread_content(thread, email_handler, company_email_addresses, colors, content_cache)
         fetch_tasks.append(task)
     
     # Run all fetch tasks concurrently
@@ -286,7 +342,7 @@ async def fetch_all_content(customer_last_threads, email_handler, company_email_
         
         for result in results:
             if isinstance(result, Exception):
-                print(f"{RED}Error fetching thread content: {result}{RESET}")
+                logger.error("%sError fetching thread content: %s%s", RED, result, RESET)
             elif result is not None:
                 threads_with_content.append(result)
     
@@ -294,6 +350,8 @@ async def fetch_all_content(customer_last_threads, email_handler, company_email_
     # print(f"{colors['WHITE']}RAW_THREADS_WITH_CONTENT:{RESET}")
     # print(json.dumps(threads_with_content, indent=2, default=str))
     
-    print(f"{MAGENTA}Successfully fetched content for {len(threads_with_content)} threads{RESET}")
+    logger.info("%sSuccessfully fetched content for %s threads%s", MAGENTA, len(threads_with_content), RESET)
+    if content_cache is not None:
+        logger.info("%sContent cache: %s%s", MAGENTA, content_cache.stats(), RESET)
     
     return threads_with_content 
\ No newline at end of file
@@ -2,114 +2,226 @@
 Step 5: Classify Emails
 This module handles classifying emails to determine if they need a response.
 """
+import logging
 import json
+import asyncio
 from typing import Dict, Any, List
 
-async def classify_thread(thread_data, classify_email_func, mark_as_spam, mark_as_responded, colors):
+from app.api.services.zoho.records import EmailRecord, ThreadRecord
+from app.utils.logger import log_json, log_step
+
+logger = logging.getLogger(__name__)
+
+def is_confirmation_email(latest_email: EmailRecord, content) -> bool:
+    """
+    Simple check for confirmation/thank you emails
+    These are almost always from customers confirming appointments
+    """
+    subject_lower = latest_email.subject.lower()
+    content_lower = content.lower()
+    
+    return (
+        ('thank' in content_lower or 'confirm' in content_lower or 'perfect' in content_lower) and
+        len(content) < 200 and  # Short messages are often confirmations
+        ('cleaning' in subject_lower or 'service' in subject_lower or 'booking' in subject_lower)
+    )
+
+def confirmation_classification(colors) -> Dict[str, bool]:
+    """Classification used for emails caught by is_confirmation_email"""
+    YELLOW, RESET = colors["YELLOW"], colors["RESET"]
+    logger.debug("%sClassification: RELEVANT but NO RESPONSE NEEDED - Appears to be a confirmation/thank you message%s", YELLOW, RESET)
+    return {
+        "is_cleaning_related": True,
+        "needs_response": False
+    }
+
+def local_classification(thread: ThreadRecord, content, preclassify_func, colors):
+    """
+    Classify a thread's latest email without the LLM when possible
+    Uses the pre-classifier when one is configured, otherwise the confirmation heuristic
+    Contact form submissions always go to the LLM: they come from our own address
+    and often read like notifications, but they are leads
+    Returns a classification dict, or None if the LLM has to decide
+    """
+    YELLOW, RED, RESET = colors["YELLOW"], colors["RED"], colors["RESET"]
+    latest_email = thread.latest_email
+    
+    if thread.is_contact_form:
+        return None
+    
+    if preclassify_func is None:
+        if is_confirmation_email(latest_email, content):
+            return confirmation_classification(colors)
+        return None
+    
+    classification = preclassify_func(latest_email, content)
+    if classification:
+        if not classification["is_cleaning_related"]:
+            logger.debug("%sClassification: NOT RELEVANT (SPAM) - local %s%s", RED, classification.get('source'), RESET)
+        else:
+            logger.debug("%sClassification: RELEVANT but NO RESPONSE NEEDED - local %s%s", YELLOW, classification.get('source'), RESET)
+    return classification
+
+def build_classification_result(thread: ThreadRecord, classification) -> Dict[str, Any]:
+    """
+    Combine a thread with its classification
+    Side effects (spam / responded marks) are applied by classify_emails
+    in thread order once every classification has finished
+    """
+    return {
+        "thread_id": thread.thread_id,
+        "message_id": thread.latest_email.message_id,
+        "result": classification,
+        "needs_response": classification["is_cleaning_related"] and classification["needs_response"],
+        "thread": thread
+    }
+
+async def classify_thread(thread: ThreadRecord, classify_email_func, colors, preclassify_func=None):
     """
     Classify a single thread and determine if it needs a response
-    Returns classification result and whether it needs response
+    Returns classification result and whether it needs response, without side effects
     """
-    CYAN, RED, YELLOW, GREEN, RESET = colors["CYAN"], colors["RED"], colors["YELLOW"], colors["GREEN"], colors["RESET"]
+    CYAN, RED, RESET = colors["CYAN"], colors["RED"], colors["RESET"]
     
-    thread_id = thread_data["thread_id"]
-    latest_email = thread_data["latest_email"]
-    content = latest_email.get("content", "")
+    thread_id = thread.thread_id
+    latest_email = thread.latest_email
+    content = latest_email.content or ""
     
     if not content:
-        print(f"{RED}Skipping thread {thread_id} - no content available{RESET}")
+        logger.debug("%sSkipping thread %s - no content available%s", RED, thread_id, RESET)
         return None
     
     # Classify the email
-    print(f"{CYAN}▶ Classifying thread: {thread_id}{RESET}")
-    
-    # First do a simple check for confirmation/thank you emails
-    # These are almost always from customers confirming appointments
-    subject_lower = latest_email.get('subject', '').lower()
-    content_lower = content.lower()
+    logger.debug("%s▶ Classifying thread: %s%s", CYAN, thread_id, RESET)
     
-    # Check if this is likely a confirmation email
-    is_confirmation = (
-        ('thank' in content_lower or 'confirm' in content_lower or 'perfect' in content_lower) and
-        len(content) < 200 and  # Short messages are often confirmations
-        ('cleaning' in subject_lower or 'service' in subject_lower or 'booking' in subject_lower)
-    )
-    
-    if is_confirmation:
-        print(f"{YELLOW}Classification: RELEVANT but NO RESPONSE NEEDED - Appears to be a confirmation/thank you message{RESET}")
-        classification = {
-            "is_cleaning_related": True,
-            "needs_response": False
-        }
-    else:
+    classification = local_classification(thread, content, preclassify_func, colors)
+    if classification is None:
         # For other emails, use the classification agent
         classification = await classify_email_func(latest_email, content)
     
+    return build_classification_result(thread, classification)
+
+async def classify_threads_batched(threads_with_content, classify_batch_func, colors, preclassify_func=None) -> List[Dict[str, Any]]:
+    """
+    Classify all threads with a single call to the batch classifier
+    Returns one result per thread in input order (None for skipped threads)
+    """
+    CYAN, RED, RESET = colors["CYAN"], colors["RED"], colors["RESET"]
+    
+    results = [None] * len(threads_with_content)
+    to_classify = []
+    
+    for index, thread in enumerate(threads_with_content):
+        thread_id = thread.thread_id
+        latest_email = thread.latest_email
+        content = latest_email.content or ""
+        
+        if not content:
+            logger.debug("%sSkipping thread %s - no content available%s", RED, thread_id, RESET)
+            continue
+        
+        logger.debug("%s▶ Classifying thread: %s%s", CYAN, thread_id, RESET)
+        classification = local_classification(thread, content, preclassify_func, colors)
+        if classification is not None:
+            results[index] = build_classification_result(thread, classification)
+        else:
+            to_classify.append(index)
+    
+    if to_classify:
+        logger.info("%s▶ Batch classifying %s threads%s", CYAN, len(to_classify), RESET)
+        classifications = await classify_batch_func([
+            (threads_with_content[index].latest_email, threads_with_content[index].latest_email.content)
+            for index in to_classify
+        ])
+        for index, classification in zip(to_classify, classifications):
+            results[index] = build_classification_result(threads_with_content[index], classification)
+    
+    return results
+
+def apply_classification(result, mark_as_spam, mark_as_responded, colors):
+    """Record the outcome of a thread classification in the spam / responded tracking"""
+    RED, YELLOW, GREEN, RESET = colors["RED"], colors["YELLOW"], colors["GREEN"], colors["RESET"]
+    
+    thread_id = result["thread_id"]
+    message_id = result["message_id"]
+    classification = result["result"]
+    
     # Skip if not cleaning related (mark as spam)
     if not classification["is_cleaning_related"]:
-        print(f"{RED}Marking thread {thread_id} as spam{RESET}")
-        message_id = latest_email.get("messageId")
-        mark_as_spam(message_id, thread_id)
-        return {
-            "thread_id": thread_id,
-            "result": classification, 
-            "needs_response": False
-        }
-    
+        if classification.get("source"):
+            # A local pre-classifier decision only covers this email; the next
+            # email in the thread is classified again instead of being skipped
+            logger.debug("%sMarking message %s as spam (%s)%s", RED, message_id, classification["source"], RESET)
+            mark_as_spam(message_id)
+        else:
+            logger.debug("%sMarking thread %s as spam%s", RED, thread_id, RESET)
+            mark_as_spam(message_id, thread_id)
     # Skip if no response needed
-    if not classification["needs_response"]:
-        print(f"{YELLOW}Thread {thread_id} - No response needed{RESET}")
+    elif not classification["needs_response"]:
+        logger.debug("%sThread %s - No response needed%s", YELLOW, thread_id, RESET)
         # Still mark as responded to avoid reprocessing
-        message_id = latest_email.get("messageId")
         if message_id:
             mark_as_responded(message_id)
-        return {
-            "thread_id": thread_id,
-            "result": classification,
-            "needs_response": False
-        }
-    
-    # Thread needs response
-    print(f"{GREEN}Thread {thread_id} - Response needed{RESET}")
-    return {
-        "thread_id": thread_id,
-        "result": classification,
-        "needs_response": True,
-        "thread_data": thread_data
-    }
+    else:
+        # Thread needs response
+        logger.debug("%sThread %s - Response needed%s", GREEN, thread_id, RESET)
 
-async def classify_emails(threads_with_content, classify_email_func, mark_as_spam, mark_as_responded, colors) -> List[Dict[str, Any]]:
+async def classify_emails(threads_with_content, classify_email_func, mark_as_spam, mark_as_responded, colors,
+                          concurrency: int = 5, classify_batch_func=None, preclassify_func=None) -> List[Dict[str, Any]]:
     """
     Step 5: Classify emails to determine which need responses
-    Returns information about classified threads which need responses
+    Emails decided by preclassify_func skip the LLM. For the rest, up to `concurrency`
+    threads are classified at the same time, or all of them are passed to
+    classify_batch_func at once when batch classification is enabled
+    Returns information about classified threads which need responses, in input order
     """
-    CYAN, RESET = colors["CYAN"], colors["RESET"]
+    CYAN, RED, RESET = colors["CYAN"], colors["RED"], colors["RESET"]
     
-    print(f"\n{CYAN}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{CYAN}▶▶▶ STEP 5: CLASSIFYING EMAILS ◀◀◀{RESET}")
-    print(f"{CYAN}═════════════════════════════════════════════════════════════{RESET}")
+    log_step(logger, "STEP 5: CLASSIFYING EMAILS", CYAN, RESET)
+    
+    if classify_batch_func is not None:
+        try:
+            results = await classify_threads_batched(threads_with_content, classify_batch_func, colors, preclassify_func)
+        except Exception as e:
+            results = [e] * len(threads_with_content)
+    else:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def classify_with_limit(thread):
+            async with semaphore:
+                return await classify_thread(thread, classify_email_func, colors, preclassify_func)
+        
+        # gather keeps results in the same order as threads_with_content
+        results = await asyncio.gather(
+            *(classify_with_limit(thread) for thread in threads_with_content),
+            return_exceptions=True
+        )
     
     threads_for_response = []
     all_classifications = []
     
-    for thread_data in threads_with_content:
-        result = await classify_thread(thread_data, classify_email_func, mark_as_spam, mark_as_responded, colors)
+    # Apply side effects sequentially in thread order so the tracking files are
+    # written one at a time and in the same order as the sequential version
+    for thread, result in zip(threads_with_content, results):
+        if isinstance(result, Exception):
+            logger.error("%sError classifying thread %s: %s%s", RED, thread.thread_id, result, RESET)
+            continue
+        if not result:
+            continue
         
-        if result:
-            all_classifications.append({
-                "thread_id": result["thread_id"], 
-                "result": result["result"]
-            })
-            
-            if result["needs_response"]:
-                threads_for_response.append(result["thread_data"])
-    
+        apply_classification(result, mark_as_spam, mark_as_responded, colors)
+        all_classifications.append({
+            "thread_id": result["thread_id"], 
+            "result": result["result"]
+        })
+        
+        if result["needs_response"]:
+            threads_for_response.append(result["thread"])
     # Raw data dump
-    print(f"{colors['WHITE']}RAW_CLASSIFICATIONS:{RESET}")
-    print(json.dumps(all_classifications, indent=2, default=str))
+    log_json(all_classifications, f"{colors['WHITE']}RAW_CLASSIFICATIONS:{RESET}", logger)
     # print(f"{colors['WHITE']}RAW_THREADS_FOR_RESPONSE:{RESET}")
     # print(json.dumps(threads_for_response, indent=2, default=str))
     
-    print(f"{CYAN}Found {len(threads_for_response)} threads needing response{RESET}")
+    logger.info("%sFound %s threads needing response%s", CYAN, len(threads_for_response), RESET)
     
     return threads_for_response 
\ No newline at end of file
@@ -2,72 +2,76 @@
 Step 6: Generate AI Responses
 This module handles generating AI responses to emails that need a reply (without saving drafts).
 """
+import logging
 import json
+import asyncio
 from typing import Dict, Any, List
 
-async def generate_responses(threads_for_response, create_draft_response_func, colors) -> List[Dict[str, Any]]:
+from app.api.services.zoho.records import ThreadRecord
+from app.utils.logger import log_step
+
+logger = logging.getLogger(__name__)
+
+async def generate_thread_response(thread: ThreadRecord, create_draft_response_func, colors) -> ThreadRecord:
     """
-    Step 6: Generate AI responses for threads that need replies
-    Returns a list of results with generated content (without creating drafts)
+    Generate the AI response for a single thread, stored on the thread for step 7
+    Errors are captured in thread.error so one thread never fails the others
     """
     BLUE, RED, RESET = colors["BLUE"], colors["RED"], colors["RESET"]
     
-    print(f"\n{BLUE}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{BLUE}▶▶▶ STEP 6: GENERATING AI RESPONSES ◀◀◀{RESET}")
-    print(f"{BLUE}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{BLUE}Generating responses for {len(threads_for_response)} threads{RESET}")
+    thread_id = thread.thread_id
     
-    results = []
-    for thread_data in threads_for_response:
-        thread_id = thread_data["thread_id"]
-        latest_email = thread_data["latest_email"]
-        thread = thread_data["thread"]
+    logger.debug("%s▶ Creating AI response for thread: %s%s", BLUE, thread_id, RESET)
+    
+    try:
+        # Generate response WITHOUT creating draft (passing create_draft=False)
+        result = await create_draft_response_func(thread.latest_email, thread.history, thread_id, create_draft=False)
         
-        print(f"{BLUE}▶ Creating AI response for thread: {thread_id}{RESET}")
+        if "error" in result:
+            logger.error("%sError generating response for thread %s: %s%s", RED, thread_id, result['error'], RESET)
+        elif "response" in result and result["response"]:
+            logger.debug("%sSuccessfully generated response for thread %s (%s chars)%s", BLUE, thread_id, len(result['response']), RESET)
+        else:
+            logger.warning("%sNo response generated for thread %s%s", RED, thread_id, RESET)
+            result["error"] = "No response content was generated"
         
-        try:
-            # Generate response WITHOUT creating draft (passing create_draft=False)
-            result = await create_draft_response_func(latest_email, thread, thread_id, create_draft=False)
-            
-            if "error" in result:
-                print(f"{RED}Error generating response for thread {thread_id}: {result['error']}{RESET}")
-            elif "response" in result and result["response"]:
-                print(f"{BLUE}Successfully generated response ({len(result['response'])} chars){RESET}")
-            else:
-                print(f"{RED}No response generated for thread {thread_id}{RESET}")
-                result["error"] = "No response content was generated"
-            
-            # Store the result along with thread data for step 7
-            results.append({
-                "thread_id": thread_id,
-                "message_id": latest_email.get("messageId"),
-                "subject": latest_email.get("subject"),
-                "to_address": latest_email.get("fromAddress", ""),
-                "cc_address": latest_email.get("ccAddress", ""),
-                "is_standalone": thread_id.startswith("standalone_"),
-                "latest_email": latest_email,
-                "response": result.get("response", ""),
-                "error": result.get("error", None)
-            })
-        except Exception as e:
-            error_msg = f"Unexpected error generating response: {str(e)}"
-            print(f"{RED}{error_msg}{RESET}")
-            results.append({
-                "thread_id": thread_id,
-                "message_id": latest_email.get("messageId"),
-                "subject": latest_email.get("subject"),
-                "to_address": latest_email.get("fromAddress", ""),
-                "cc_address": latest_email.get("ccAddress", ""),
-                "is_standalone": thread_id.startswith("standalone_"),
-                "response": "",
-                "error": error_msg
-            })
+        thread.response = result.get("response", "")
+        thread.error = result.get("error", None)
+    except Exception as e:
+        error_msg = f"Unexpected error generating response: {str(e)}"
+        logger.error("%s%s%s", RED, error_msg, RESET)
+        thread.response = ""
+        thread.error = error_msg
+    return thread
+
+async def generate_responses(threads_for_response, create_draft_response_func, colors, concurrency: int = 5) -> List[ThreadRecord]:
+    """
+    Step 6: Generate AI responses for threads that need replies
+    Up to `concurrency` responses are generated at the same time; OpenAI quota is
+    enforced by the rate limiter inside create_draft_response_func
+    Returns the threads with their generated response or error (without creating drafts), in input order
+    """
+    BLUE, RESET = colors["BLUE"], colors["RESET"]
+    
+    log_step(logger, "STEP 6: GENERATING AI RESPONSES", BLUE, RESET)
+    logger.info("%sGenerating responses for %s threads%s", BLUE, len(threads_for_response), RESET)
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def generate_with_limit(thread):
+        async with semaphore:
+            return await generate_thread_response(thread, create_draft_response_func, colors)
+    
+    # gather keeps results in the same order as threads_for_response, as step 7 expects
+    results = list(await asyncio.gather(
+        *(generate_with_limit(thread) for thread in threads_for_response)
+    ))
     
     # Raw data dump
     # print(f"{colors['WHITE']}RAW_GENERATED_RESPONSES:{RESET}")
     # print(json.dumps(results, indent=2, default=str))
     
-    successful = sum(1 for r in results if r.get("response") and not r.get("error"))
-    print(f"{BLUE}Successfully generated {successful} of {len(results)} AI responses{RESET}")
+    successful = sum(1 for thread in results if thread.response and not thread.error)
+    logger.info("%sSuccessfully generated %s of %s AI responses%s", BLUE, successful, len(results), RESET)
     
-    return results 
\ No newline at end of file
+    return results
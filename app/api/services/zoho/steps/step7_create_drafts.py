@@ -2,10 +2,18 @@
 Step 7: Create Draft Emails
 This module handles saving the generated AI responses as draft emails in Zoho Mail.
 """
+import logging
 import json
 import re
+import time
+import asyncio
 from typing import Dict, Any, List
 
+from app.api.services.zoho.records import ThreadRecord
+from app.utils.logger import log_json, log_step
+
+logger = logging.getLogger(__name__)
+
 def extract_customer_email(content: str) -> str:
     """Extract customer email from form submission content"""
     email_match = re.search(r"Email:\s*([^\s]+@[^\s]+\.[^\s]+)", content)
@@ -13,128 +21,152 @@ def extract_customer_email(content: str) -> str:
         return email_match.group(1)
     return ""
 
-async def create_drafts(responses_from_step6, email_handler, company_email_addresses, colors, enable_draft_creation: bool = True) -> List[Dict[str, Any]]:
+async def create_thread_draft(thread: ThreadRecord, email_handler, company_email_addresses, colors) -> Dict[str, Any]:
+    """
+    Create the Zoho draft for a single generated response, attached to its thread
+    Returns the step 7 result for the thread
+    """
+    GREEN, RED, BLUE, RESET = colors["GREEN"], colors["RED"], colors["BLUE"], colors["RESET"]
+    
+    latest_email = thread.latest_email
+    thread_id = thread.thread_id
+    message_id = latest_email.message_id
+    subject = latest_email.subject
+    to_address = latest_email.from_address
+    cc_address = latest_email.cc_address or ""
+    response_content = thread.response or ""
+    error = thread.error
+    is_standalone = thread.standalone
+    is_contact_form = is_standalone and "Email:" in (latest_email.content or "")
+    
+    # Skip if there was an error generating the response
+    if error:
+        logger.warning("%s▶ Skipping draft creation for thread %s due to error: %s%s", RED, thread_id, error, RESET)
+        return {
+            "thread_id": thread_id,
+            "message_id": message_id,
+            "subject": subject,
+            "result": {"error": error}
+        }
+    
+    # Skip if no response content was generated
+    if not response_content:
+        logger.debug("%s▶ Skipping draft creation for thread %s - no response content%s", RED, thread_id, RESET)
+        return {
+            "thread_id": thread_id,
+            "message_id": message_id,
+            "subject": subject,
+            "result": {"error": "No response content generated"}
+        }
+        
+    logger.debug("%s▶ Creating draft for thread: %s%s", GREEN, thread_id, RESET)
+    started = time.perf_counter()
+    
+    # Format subject with Re: prefix if needed
+    if subject and not subject.lower().startswith("re:"):
+        subject = f"Re: {subject}"
+    
+    # For contact forms, extract the customer email from the content
+    if is_contact_form:
+        content = latest_email.content or ""
+        customer_email = extract_customer_email(content)
+        if customer_email:
+            to_address = customer_email
+            logger.debug("%sUsing customer email from form: %s%s", GREEN, customer_email, RESET)
+        
+    # Process CC addresses
+    cc_list = [cc.strip() for cc in cc_address.split(",")] if cc_address else []
+    # Only include CC addresses that are not company addresses
+    cc_list = [cc for cc in cc_list if cc and cc.lower() not in [a.lower() for a in company_email_addresses]]
+    
+    # Log draft information
+    logger.debug("%sCreating draft to: %s%s", BLUE, to_address, RESET)
+    if cc_list:
+        logger.debug("%sCC: %s%s", BLUE, ', '.join(cc_list), RESET)
+    
+    # Create the draft in Zoho Mail, in the customer's thread. The key makes
+    # retries return the existing draft instead of creating a second one
+    draft_result = await email_handler.create_draft(
+        to=[to_address],
+        subject=subject,
+        body=response_content,
+        thread_id=None if is_standalone else thread_id,
+        cc=cc_list,
+        is_html=True,  # Always use HTML for consistent formatting
+        idempotency_key=f"draft:{message_id or thread_id}"
+    )
+    duration = round(time.perf_counter() - started, 3)
+    
+    if "error" in draft_result:
+        logger.error("%sError creating draft for thread %s: %s%s", RED, thread_id, draft_result['error'], RESET)
+        return {
+            "thread_id": thread_id,
+            "message_id": message_id,
+            "subject": subject,
+            "duration_seconds": duration,
+            "result": {
+                "response": response_content,
+                "error": draft_result['error']
+            }
+        }
+    
+    logger.debug("%sDraft created successfully for thread %s in %ss%s", GREEN, thread_id, duration, RESET)
+    return {
+        "thread_id": thread_id,
+        "message_id": message_id,
+        "subject": subject,
+        "duration_seconds": duration,
+        "result": {
+            "response": response_content,
+            "draft_id": draft_result.get("data", {}).get("draftId"),
+            "draft_created": True
+        }
+    }
+
+async def create_drafts(threads_from_step6: List[ThreadRecord], email_handler, company_email_addresses, colors,
+                        enable_draft_creation: bool = True, concurrency: int = 5) -> List[Dict[str, Any]]:
     """
     Step 7: Create draft emails in Zoho Mail using the responses from step 6
-    Returns a list of results for each draft created
+    Up to `concurrency` drafts are created at the same time
+    Returns a list of results for each draft created, in input order
     """
     GREEN, RED, BLUE, YELLOW, RESET = colors["GREEN"], colors["RED"], colors["BLUE"], colors["YELLOW"], colors["RESET"]
     
-    print(f"\n{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{GREEN}▶▶▶ STEP 7: CREATING DRAFT EMAILS IN ZOHO MAIL ◀◀◀{RESET}")
-    print(f"{GREEN}═════════════════════════════════════════════════════════════{RESET}")
-    print(f"{GREEN}Creating drafts for {len(responses_from_step6)} emails{RESET}")
+    log_step(logger, "STEP 7: CREATING DRAFT EMAILS IN ZOHO MAIL", GREEN, RESET)
+    logger.info("%sCreating drafts for %s emails%s", GREEN, len(threads_from_step6), RESET)
     
     results = []
     
     if not enable_draft_creation:
-        print(f"{YELLOW}Running in TEST MODE - no drafts will be created{RESET}")
-        for response_data in responses_from_step6:
+        logger.info("%sRunning in TEST MODE - no drafts will be created%s", YELLOW, RESET)
+        for thread in threads_from_step6:
             results.append({
-                "thread_id": response_data["thread_id"],
-                "message_id": response_data["message_id"],
-                "subject": response_data["subject"],
+                "thread_id": thread.thread_id,
+                "message_id": thread.latest_email.message_id,
+                "subject": thread.latest_email.subject,
                 "result": {
-                    "response": response_data.get("response", ""),
+                    "response": thread.response or "",
                     "draft_created": False,
                     "test_mode": True
                 }
             })
         return results
     
-    for response_data in responses_from_step6:
-        thread_id = response_data["thread_id"]
-        subject = response_data["subject"]
-        to_address = response_data["to_address"]
-        cc_address = response_data.get("cc_address", "")
-        response_content = response_data.get("response", "")
-        error = response_data.get("error")
-        is_contact_form = thread_id.startswith("standalone_") and "Email:" in response_data.get("latest_email", {}).get("content", "")
-        
-        # Skip if there was an error generating the response
-        if error:
-            print(f"{RED}▶ Skipping draft creation for thread {thread_id} due to error: {error}{RESET}")
-            results.append({
-                "thread_id": thread_id,
-                "message_id": response_data["message_id"],
-                "subject": subject,
-                "result": {"error": error}
-            })
-            continue
-        
-        # Skip if no response content was generated
-        if not response_content:
-            print(f"{RED}▶ Skipping draft creation for thread {thread_id} - no response content{RESET}")
-            results.append({
-                "thread_id": thread_id,
-                "message_id": response_data["message_id"],
-                "subject": subject,
-                "result": {"error": "No response content generated"}
-            })
-            continue
-            
-        print(f"{GREEN}▶ Creating draft for thread: {thread_id}{RESET}")
-        
-        # Format subject with Re: prefix if needed
-        if subject and not subject.lower().startswith("re:"):
-            subject = f"Re: {subject}"
-        
-        # For contact forms, extract the customer email from the content
-        if is_contact_form:
-            content = response_data.get("latest_email", {}).get("content", "")
-            customer_email = extract_customer_email(content)
-            if customer_email:
-                to_address = customer_email
-                print(f"{GREEN}Using customer email from form: {customer_email}{RESET}")
-            
-        # Process CC addresses
-        cc_list = [cc.strip() for cc in cc_address.split(",")] if cc_address else []
-        # Only include CC addresses that are not company addresses
-        cc_list = [cc for cc in cc_list if cc and cc.lower() not in [a.lower() for a in company_email_addresses]]
-        
-        # Log draft information
-        print(f"{BLUE}Creating draft to: {to_address}{RESET}")
-        if cc_list:
-            print(f"{BLUE}CC: {', '.join(cc_list)}{RESET}")
-        
-        # Create the draft in Zoho Mail
-        draft_result = await email_handler.create_draft(
-            to=[to_address],
-            subject=subject,
-            body=response_content,
-            cc=cc_list,
-            is_html=True  # Always use HTML for consistent formatting
-        )
-        
-        if "error" in draft_result:
-            print(f"{RED}Error creating draft: {draft_result['error']}{RESET}")
-            results.append({
-                "thread_id": thread_id,
-                "message_id": response_data["message_id"],
-                "subject": subject,
-                "result": {
-                    "response": response_content,
-                    "error": draft_result['error']
-                }
-            })
-        else:
-            print(f"{GREEN}Draft created successfully{RESET}")
-            results.append({
-                "thread_id": thread_id,
-                "message_id": response_data["message_id"],
-                "subject": subject,
-                "result": {
-                    "response": response_content,
-                    "draft_id": draft_result.get("data", {}).get("draftId"),
-                    "draft_created": True
-                }
-            })
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def create_with_limit(thread):
+        async with semaphore:
+            return await create_thread_draft(thread, email_handler, company_email_addresses, colors)
+    
+    # gather keeps results in the same order as threads_from_step6
+    results = list(await asyncio.gather(
+        *(create_with_limit(thread) for thread in threads_from_step6)
+    ))
     
     # Raw data dump
-    print(f"{colors['WHITE']}RAW_DRAFT_RESULTS:{RESET}")
-    print(json.dumps(results, indent=2, default=str))
+    log_json(results, f"{colors['WHITE']}RAW_DRAFT_RESULTS:{RESET}", logger)
     
     successful_drafts = sum(1 for r in results if r.get("result", {}).get("draft_created", False))
-    print(f"{GREEN}Successfully created {successful_drafts} draft emails{RESET}")
+    logger.info("%sSuccessfully created %s draft emails%s", GREEN, successful_drafts, RESET)
     
     return results 
\ No newline at end of file
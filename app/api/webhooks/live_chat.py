@@ -2,9 +2,14 @@ from fastapi import APIRouter, Request # type: ignore
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import json
+import logging
 from app.utils.logger import log_json
+from app.utils.webhook_capture import capture_webhook
+from app.utils.tracing import start_trace
 from app.api.services.chatwoot.handler import conversation_manager
 
+logger = logging.getLogger(__name__)
+
 # Create a router for the live chat endpoints
 router = APIRouter(prefix="/live-chat", tags=["live-chat"])
 
@@ -25,23 +30,25 @@ class ChatwootMessage(BaseModel):
 # Live chat endpoint for Chatwoot
 @router.post("/")
 async def live_chat(request: Request) -> Dict[str, Any]:
-    try:
-        # Parse the webhook data
-        body = await request.body()
-        data = json.loads(body)
-        webhook = ChatwootMessage(**data)
+    with start_trace(f"POST {request.url.path}", source="live-chat"):
+        try:
+            # Parse the webhook data
+            body = await request.body()
+            capture_webhook("live-chat", request.url.path, body)
+            data = json.loads(body)
+            webhook = ChatwootMessage(**data)
         
-        # Log the incoming webhook data with message type for clarity
-        log_type = f"Parsed Webhook Data ({webhook.message_type} message)" if webhook.message_type else "Parsed Webhook Data"
-        log_json(webhook.dict(), log_type)
+            # Log the incoming webhook data with message type for clarity
+            log_type = f"Parsed Webhook Data ({webhook.message_type} message)" if webhook.message_type else "Parsed Webhook Data"
+            log_json(webhook.dict(), log_type)
         
-        # Check if this message should be processed
-        if conversation_manager.is_valid_for_processing(webhook.dict()):
-            # Process the message with the conversation manager
-            return conversation_manager.process_message(webhook.dict())
-        else:
-            return {"status": "ignored"}
+            # Check if this message should be processed
+            if conversation_manager.is_valid_for_processing(webhook.dict()):
+                # Process the message with the conversation manager
+                return conversation_manager.process_message(webhook.dict())
+            else:
+                return {"status": "ignored"}
     
-    except Exception as e:
-        print(f"Error processing webhook: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        except Exception as e:
+            logger.error("Error processing webhook: %s", e)
+            return {"status": "error", "message": str(e)}
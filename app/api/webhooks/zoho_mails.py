@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Request # type: ignore
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
+import logging
 from app.utils.logger import log_json
+from app.utils.webhook_capture import capture_webhook
+from app.utils.tracing import start_trace
 from app.api.services.zoho.handler import get_mail_handler
 
+logger = logging.getLogger(__name__)
+
 # Create a router for Zoho Mail webhook
 router = APIRouter(prefix="/zoho-mails", tags=["zoho-mails"])
 
@@ -29,29 +34,41 @@ async def handle_zoho_mail(request: Request) -> Dict[str, Any]:
     """
     Webhook endpoint for incoming Zoho Mail emails
     """
-    # Get the raw request body
-    body = await request.body()
+    with start_trace(f"POST {request.url.path}", source="zoho-mails"):
+        # Get the raw request body
+        body = await request.body()
+        capture_webhook("zoho-mails", request.url.path, body)
     
-    try:
-        # Log the raw incoming data
-        payload = await request.json()
-        log_json(payload, "Incoming Zoho Mail webhook")
+        try:
+            # Log the raw incoming data
+            payload = await request.json()
+            log_json(payload, "Incoming Zoho Mail webhook")
 
-        # Process the email using the ZohoMailHandler
-        mail_handler = get_mail_handler()
+            # Process the email using the ZohoMailHandler
+            mail_handler = get_mail_handler()
         
-        # Process only a small batch (1-3) since this is triggered by new emails
-        # This avoids processing the entire inbox on each webhook
-        result = await mail_handler.process_emails(limit=3, enable_draft_creation=True)
+            # Process only a small batch (1-3) since this is triggered by new emails
+            # This avoids processing the entire inbox on each webhook
+            result = await mail_handler.process_emails(limit=3, enable_draft_creation=True)
         
-        log_json(result, "Email processing result")
+            log_json(result, "Email processing result")
         
-        return {
-            "status": "success", 
-            "message": "Email received and processed",
-            "processed": result.get("threads_processed", 0)
-        }
+            return {
+                "status": "success", 
+                "message": "Email received and processed",
+                "processed": result.get("threads_processed", 0)
+            }
+        except Exception as e:
+            logger.exception("Error processing Zoho Mail webhook: %s", e)
+            log_json(body, "Zoho Mail webhook body", logger)
+            return {"status": "error", "message": str(e)}
+
+@router.get("/stats")
+async def zoho_mail_stats() -> Dict[str, Any]:
+    """
+    Cache sizes, hit rates and usage counters of the long-lived mail handler
+    """
+    try:
+        return {"status": "success", "stats": get_mail_handler().stats()}
     except Exception as e:
-        log_json({"error": str(e), "body": body.decode('utf-8', errors='ignore')}, 
-                 "Error processing Zoho Mail webhook")
         return {"status": "error", "message": str(e)}
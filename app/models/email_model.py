@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, Field
 
 class EmailClassification(BaseModel):
@@ -16,3 +17,21 @@ class EmailClassification(BaseModel):
         ..., 
         description="Brief explanation of why this email is or isn't cleaning related and whether it needs a response. Keep it concise."
     )
+
+class EmailBatchItemClassification(EmailClassification):
+    """
+    Classification of one email within a batch, identified by its message ID.
+    """
+    message_id: str = Field(
+        ...,
+        description="The message_id of the email this classification belongs to, copied exactly from the input."
+    )
+
+class EmailBatchClassification(BaseModel):
+    """
+    Model to classify several emails in a single request.
+    """
+    classifications: List[EmailBatchItemClassification] = Field(
+        ...,
+        description="One classification for every email in the input, in any order."
+    )
@@ -12,16 +12,19 @@ Prerequisites:
 """
 
 import json
+import logging
 from datetime import datetime
 from os import getenv
 from typing import List, Optional
 
 from agno.tools import Toolkit
 
+logger = logging.getLogger(__name__)
+
 try:
     import googlemaps
 except ImportError:
-    print("Error importing googlemaps. Please install the package using `pip install googlemaps`.")
+    logger.error("Error importing googlemaps. Please install the package using `pip install googlemaps`.")
 
 
 class GoogleMapTools(Toolkit):
@@ -103,7 +106,7 @@ class GoogleMapTools(Toolkit):
                                 }
                             )
                     except Exception as e:
-                        print(f"Error getting place details: {str(e)}")
+                        logger.error("Error getting place details: %s", e)
                         # Continue with basic place info if details fetch fails
 
                 places.append(place_info)
@@ -111,7 +114,7 @@ class GoogleMapTools(Toolkit):
             return json.dumps(places)
 
         except Exception as e:
-            print(f"Error searching Google Maps: {str(e)}")
+            logger.error("Error searching Google Maps: %s", e)
             return str([])
 
     def get_directions(
@@ -142,12 +145,12 @@ class GoogleMapTools(Toolkit):
                 try:
                     departure_datetime = datetime.fromisoformat(departure_time)
                 except ValueError:
-                    print(f"Invalid datetime format for departure_time: {departure_time}. Expected ISO format.")
+                    logger.warning("Invalid datetime format for departure_time: %s. Expected ISO format.", departure_time)
             
             result = self.client.directions(origin, destination, mode=mode, departure_time=departure_datetime, avoid=avoid)
             return str(result)
         except Exception as e:
-            print(f"Error getting directions: {str(e)}")
+            logger.error("Error getting directions: %s", e)
             return str([])
 
     def validate_address(
@@ -171,7 +174,7 @@ class GoogleMapTools(Toolkit):
             )
             return str(result)
         except Exception as e:
-            print(f"Error validating address: {str(e)}")
+            logger.error("Error validating address: %s", e)
             return str({})
 
     def geocode_address(self, address: str, region: Optional[str] = None) -> str:
@@ -189,7 +192,7 @@ class GoogleMapTools(Toolkit):
             result = self.client.geocode(address, region=region)
             return str(result)
         except Exception as e:
-            print(f"Error geocoding address: {str(e)}")
+            logger.error("Error geocoding address: %s", e)
             return str([])
 
     def reverse_geocode(
@@ -211,7 +214,7 @@ class GoogleMapTools(Toolkit):
             result = self.client.reverse_geocode((lat, lng), result_type=result_type, location_type=location_type)
             return str(result)
         except Exception as e:
-            print(f"Error reverse geocoding: {str(e)}")
+            logger.error("Error reverse geocoding: %s", e)
             return str([])
 
     def get_distance_matrix(
@@ -242,14 +245,14 @@ class GoogleMapTools(Toolkit):
                 try:
                     departure_datetime = datetime.fromisoformat(departure_time)
                 except ValueError:
-                    print(f"Invalid datetime format for departure_time: {departure_time}. Expected ISO format.")
+                    logger.warning("Invalid datetime format for departure_time: %s. Expected ISO format.", departure_time)
             
             result = self.client.distance_matrix(
                 origins, destinations, mode=mode, departure_time=departure_datetime, avoid=avoid
             )
             return str(result)
         except Exception as e:
-            print(f"Error getting distance matrix: {str(e)}")
+            logger.error("Error getting distance matrix: %s", e)
             return str({})
 
     def get_elevation(self, lat: float, lng: float) -> str:
@@ -267,7 +270,7 @@ class GoogleMapTools(Toolkit):
             result = self.client.elevation((lat, lng))
             return str(result)
         except Exception as e:
-            print(f"Error getting elevation: {str(e)}")
+            logger.error("Error getting elevation: %s", e)
             return str([])
 
     def get_timezone(self, lat: float, lng: float, timestamp: Optional[str] = None) -> str:
@@ -289,10 +292,10 @@ class GoogleMapTools(Toolkit):
                 try:
                     timestamp_datetime = datetime.fromisoformat(timestamp)
                 except ValueError:
-                    print(f"Invalid datetime format for timestamp: {timestamp}. Expected ISO format. Using current time.")
+                    logger.warning("Invalid datetime format for timestamp: %s. Expected ISO format. Using current time.", timestamp)
 
             result = self.client.timezone(location=(lat, lng), timestamp=timestamp_datetime)
             return str(result)
         except Exception as e:
-            print(f"Error getting timezone: {str(e)}")
+            logger.error("Error getting timezone: %s", e)
             return str({})
@@ -1,9 +1,14 @@
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# "development" logs everything as colored text, "production" INFO and above as JSON lines
+LOG_PROFILE = os.getenv('LOG_PROFILE', 'development').lower()
+PRODUCTION = LOG_PROFILE == 'production'
+
 # Chatwoot configuration
 CHATWOOT_CONFIG = {
     'api_token': os.getenv('CHATWOOT_API_TOKEN', ''),
@@ -14,9 +19,102 @@ CHATWOOT_CONFIG = {
 # Agent configuration
 AGENT_CONFIG = {
     'openai_api_key': os.getenv('OPENAI_API_KEY', ''),
+    # OpenAI-compatible API to use instead of api.openai.com (None keeps the default)
+    'openai_base_url': os.getenv('OPENAI_BASE_URL') or None,
+    # Record OpenAI responses to, or replay them from, a cassette file: "off", "record" or "replay"
+    'llm_cassette_mode': os.getenv('LLM_CASSETTE_MODE', 'off').lower(),
+    'llm_cassette_path': os.getenv('LLM_CASSETTE_PATH', os.path.join('data', 'llm_cassette.jsonl')),
+    # "recorded" replays each response after its recorded latency, "zero" at once
+    'llm_cassette_replay_latency': os.getenv('LLM_CASSETTE_REPLAY_LATENCY', 'recorded').lower(),
     'google_maps_api_key': os.getenv('GOOGLE_MAPS_API_KEY', ''),
     'telegram_bot_token': os.getenv('TELEGRAM_BOT_TOKEN', ''),
-    'telegram_chat_id': os.getenv('TELEGRAM_CHAT_ID', '')
+    'telegram_chat_id': os.getenv('TELEGRAM_CHAT_ID', ''),
+    'google_calendar_credentials_path': os.getenv(
+        'GOOGLE_CALENDAR_CREDENTIALS_PATH',
+        'secrets/client_secret_836000232789-l1ae1n2burh365vr9iiktkoff5lo9kt4.apps.googleusercontent.com.json'
+    ),
+    'google_calendar_token_path': os.getenv('GOOGLE_CALENDAR_TOKEN_PATH', 'secrets/token.json'),
+    # agno's debug output of every prompt and response
+    'debug_mode': os.getenv('AGENT_DEBUG_MODE', 'false' if PRODUCTION else 'true').lower() == 'true',
+    # OpenAI quota shared by all agents; the email agents wait for it, live chat replies only use it up
+    'openai_requests_per_minute': int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500')),
+    'openai_tokens_per_minute': int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '200000')),
+    # Timezone of the current time appended to the agents' messages
+    'timezone': os.getenv('AGENT_TIMEZONE', 'Europe/Dublin'),
+    # Token usage and cost per conversation, thread, agent and day (see app/utils/llm_usage.py)
+    'llm_usage_db_path': os.getenv('LLM_USAGE_DB_PATH', os.path.join('data', 'llm_usage.db')),
+    'llm_usage_flush_seconds': float(os.getenv('LLM_USAGE_FLUSH_SECONDS', '5')),
+    'llm_usage_retention_days': float(os.getenv('LLM_USAGE_RETENTION_DAYS', '400')),
+    # JSON of US dollars per million tokens by model, [uncached prompt, cached prompt, completion],
+    # added to the built-in prices
+    'llm_prices': json.loads(os.getenv('LLM_PRICES') or '{}')
+}
+
+# Zoho pipeline configuration
+ZOHO_PIPELINE_CONFIG = {
+    'classification_concurrency': int(os.getenv('ZOHO_CLASSIFICATION_CONCURRENCY', '5')),
+    # Emails per classification request, 1 disables batching
+    'classification_batch_size': int(os.getenv('ZOHO_CLASSIFICATION_BATCH_SIZE', '1')),
+    'classification_batch_token_budget': int(os.getenv('ZOHO_CLASSIFICATION_BATCH_TOKEN_BUDGET', '6000')),
+    # Local pre-classification of obvious spam and confirmations before the LLM
+    'preclassifier_enabled': os.getenv('ZOHO_PRECLASSIFIER_ENABLED', 'true').lower() == 'true',
+    'preclassifier_threshold': float(os.getenv('ZOHO_PRECLASSIFIER_THRESHOLD', '0.97')),
+    'preclassifier_min_examples': int(os.getenv('ZOHO_PRECLASSIFIER_MIN_EXAMPLES', '100')),
+    'response_concurrency': int(os.getenv('ZOHO_RESPONSE_CONCURRENCY', '5')),
+    'draft_concurrency': int(os.getenv('ZOHO_DRAFT_CONCURRENCY', '5')),
+    # "streaming" runs each thread through the steps independently, "barrier" runs step by step
+    'pipeline_mode': os.getenv('ZOHO_PIPELINE_MODE', 'streaming'),
+    'thread_fetch_concurrency': int(os.getenv('ZOHO_THREAD_FETCH_CONCURRENCY', '5')),
+    'pipeline_channel_size': int(os.getenv('ZOHO_PIPELINE_CHANNEL_SIZE', '10')),
+    # Responded / spam marks older than this are deleted from the state store (0 keeps them forever)
+    'state_retention_days': float(os.getenv('ZOHO_STATE_RETENTION_DAYS', '180')),
+    # In-memory caches kept by the long-lived mail handler between runs
+    'thread_cache_size': int(os.getenv('ZOHO_THREAD_CACHE_SIZE', '500')),
+    'thread_cache_ttl_seconds': float(os.getenv('ZOHO_THREAD_CACHE_TTL_SECONDS', '900')),
+    'classification_cache_size': int(os.getenv('ZOHO_CLASSIFICATION_CACHE_SIZE', '2000')),
+    'classification_cache_ttl_seconds': float(os.getenv('ZOHO_CLASSIFICATION_CACHE_TTL_SECONDS', '86400')),
+    'draft_cache_size': int(os.getenv('ZOHO_DRAFT_CACHE_SIZE', '2000')),
+    'draft_cache_ttl_seconds': float(os.getenv('ZOHO_DRAFT_CACHE_TTL_SECONDS', '86400')),
+    # Email bodies longer than this are cleaned in the process pool instead of on the event loop
+    'content_inline_clean_max_chars': int(os.getenv('ZOHO_CONTENT_INLINE_CLEAN_MAX_CHARS', '100000')),
+    # Email bodies are truncated at this many characters once inline images are stripped
+    'content_max_chars': int(os.getenv('ZOHO_CONTENT_MAX_CHARS', '1000000'))
+}
+
+# Server configuration
+SERVER_CONFIG = {
+    # Worker processes for CPU-heavy work shared by the whole app
+    'process_pool_workers': int(os.getenv('PROCESS_POOL_WORKERS', '2')),
+    # Raw webhook payloads appended to rotating gzip JSONL files, for replay with benchmarks/webhook_replay.py
+    'webhook_capture_enabled': os.getenv('WEBHOOK_CAPTURE_ENABLED', 'false').lower() == 'true',
+    'webhook_capture_dir': os.getenv('WEBHOOK_CAPTURE_DIR', os.path.join('data', 'webhook_capture')),
+    'webhook_capture_max_bytes': int(os.getenv('WEBHOOK_CAPTURE_MAX_BYTES', '52428800')),
+    'webhook_capture_max_files': int(os.getenv('WEBHOOK_CAPTURE_MAX_FILES', '20')),
+    'webhook_capture_queue_size': int(os.getenv('WEBHOOK_CAPTURE_QUEUE_SIZE', '10000')),
+    # Serve the in-process metrics in the Prometheus text format on GET /metrics
+    'metrics_enabled': os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+    # One trace file per webhook, with spans for its pipeline steps, API requests, LLM calls and tool calls
+    'tracing_enabled': os.getenv('TRACING_ENABLED', 'false').lower() == 'true',
+    'tracing_dir': os.getenv('TRACING_DIR', os.path.join('data', 'traces')),
+    # "chrome" (chrome://tracing, Perfetto) or "otlp" (OTLP/JSON, for OpenTelemetry tools)
+    'tracing_format': os.getenv('TRACING_FORMAT', 'chrome').lower(),
+    # Fraction of webhooks traced
+    'tracing_sample_rate': float(os.getenv('TRACING_SAMPLE_RATE', '1.0')),
+    'tracing_max_spans': int(os.getenv('TRACING_MAX_SPANS', '5000')),
+    'tracing_max_files': int(os.getenv('TRACING_MAX_FILES', '200'))
+}
+
+# Logging configuration (see app/utils/logger.py)
+LOGGING_CONFIG = {
+    'profile': LOG_PROFILE,
+    'level': os.getenv('LOG_LEVEL', 'INFO' if PRODUCTION else 'DEBUG').upper(),
+    # "text" or "json" lines
+    'format': os.getenv('LOG_FORMAT', 'json' if PRODUCTION else 'text').lower(),
+    'colors': os.getenv('LOG_COLORS', 'false' if PRODUCTION else 'true').lower() == 'true',
+    # Format and write records on a background thread instead of the event loop
+    'async': os.getenv('LOG_ASYNC', 'true').lower() == 'true',
+    # Records waiting for the writer thread; more are dropped
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000'))
 }
 
 def get_chatwoot_config():
@@ -25,4 +123,16 @@ def get_chatwoot_config():
 
 def get_agent_config():
     """Get Agent configuration settings"""
-    return AGENT_CONFIG 
\ No newline at end of file
+    return AGENT_CONFIG
+
+def get_zoho_pipeline_config():
+    """Get Zoho email pipeline configuration settings"""
+    return ZOHO_PIPELINE_CONFIG
+
+def get_server_config():
+    """Get server configuration settings"""
+    return SERVER_CONFIG
+
+def get_logging_config():
+    """Get logging configuration settings"""
+    return LOGGING_CONFIG
@@ -0,0 +1,227 @@
+import logging
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.utils.config import get_agent_config
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+# Parts of a request that differ between otherwise identical prompts
+VOLATILE_PATTERNS = [
+    # The current time appended to each agent message (app/agents/context.py), up to
+    # the JSON-escaped newline that ends its line
+    (re.compile(r"Current date and time: [^\\\"<]*"), "Current date and time: <datetime>"),
+    # ISO timestamps, e.g. webhook times quoted in a message
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"), "<datetime>"),
+    # Tool call IDs are generated by OpenAI and echoed back in the history
+    (re.compile(r"\bcall_[A-Za-z0-9]+"), "<tool_call_id>"),
+]
+
+# The body is stored decoded, so these headers of the original response no longer apply
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "date", "set-cookie"}
+
+def normalize_request(method: str, path: str, body: bytes) -> str:
+    """Canonical text of a request: JSON with sorted keys and the volatile parts masked"""
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = body.decode("utf-8", "replace")
+    text = json.dumps({"method": method, "path": path, "body": payload},
+                      sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    for pattern, replacement in VOLATILE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def request_key(request: httpx.Request) -> str:
+    """Hash of the normalized request, the key of its recorded response"""
+    normalized = normalize_request(request.method, request.url.path, request.content)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class LLMCassette:
+    """
+    OpenAI responses recorded by request, stored as JSON lines
+
+    In "record" mode requests go to the API and each response is appended to the
+    file; a request recorded again replaces the earlier response. In "replay"
+    mode requests are answered from the file, after the recorded latency or, with
+    replay_latency "zero", at once. A request that was never recorded gets a 404,
+    which the OpenAI client does not retry.
+    """
+
+    def __init__(self, path: str, mode: str, replay_latency: str = "recorded"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        # Time the model took for the responses served, as recorded
+        self.model_seconds = 0.0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if self.mode == "replay":
+                logger.warning("LLM cassette %s does not exist, every request will miss", self.path)
+            return
+        with open(self.path, encoding="utf-8") as cassette_file:
+            for line in cassette_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+
+    def lookup(self, request: httpx.Request) -> Tuple[str, Optional[Dict[str, Any]]]:
+        request.read()
+        key = request_key(request)
+        return key, self.entries.get(key)
+
+    def replay(self, key: str, entry: Optional[Dict[str, Any]], request: httpx.Request) -> Tuple[httpx.Response, float]:
+        """Return the recorded response and the seconds to wait before returning it"""
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.model_seconds += entry["latency_seconds"]
+        if entry is None:
+            logger.warning("LLM cassette miss for %s (key %s)", request.url.path, key[:12])
+            error = {"error": {"message": f"No recorded response for request {key}", "type": "cassette_miss"}}
+            return httpx.Response(404, json=error, request=request), 0.0
+        delay = entry["latency_seconds"] if self.replay_latency == "recorded" else 0.0
+        return httpx.Response(entry["status"], headers=entry["headers"], content=entry["body"].encode("utf-8"),
+                              request=request), delay
+
+    def record(self, key: str, request: httpx.Request, response: httpx.Response, body: bytes,
+               latency: float) -> httpx.Response:
+        """Store a response read from the API and return a copy for the caller"""
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS}
+        # Throttling and server errors are not answers to the prompt
+        if response.status_code < 500 and response.status_code != 429:
+            entry = {
+                "key": key,
+                "recorded_at": time.time(),
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "headers": headers,
+                "body": body.decode("utf-8"),
+                "latency_seconds": round(latency, 3)
+            }
+            with self._lock:
+                self.entries[key] = entry
+                self.recorded += 1
+                self.model_seconds += latency
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as cassette_file:
+                    cassette_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+            "model_seconds": round(self.model_seconds, 3)
+        }
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport for the synchronous OpenAI client (the Lisa agent)"""
+
+    def __init__(self, cassette: LLMCassette):
+        self.cassette = cassette
+        self.transport = httpx.HTTPTransport() if cassette.mode == "record" else None
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key, entry = self.cassette.lookup(request)
+        if self.cassette.mode == "replay":
+            response, delay = self.cassette.replay(key, entry, request)
+            if delay:
+                time.sleep(delay)
+            return response
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return self.cassette.record(key, request, response, body, time.perf_counter() - started)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport for the asynchronous OpenAI client (the Zoho agents)"""
+
+    def __init__(self, cassette: LLMCassette):
+        self.cassette = cassette
+        self.transport = httpx.AsyncHTTPTransport() if cassette.mode == "record" else None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key, entry = self.cassette.lookup(request)
+        if self.cassette.mode == "replay":
+            response, delay = self.cassette.replay(key, entry, request)
+            if delay:
+                await asyncio.sleep(delay)
+            return response
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        return self.cassette.record(key, request, response, body, time.perf_counter() - started)
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
+
+# Singleton instance, created on first use unless the mode is "off"
+_cassette = None
+
+def configure_llm_cassette(mode: str, path: Optional[str] = None, replay_latency: str = "recorded") -> Optional[LLMCassette]:
+    """Replace the process-wide cassette (used by the benchmarks); agents created afterwards use it"""
+    global _cassette
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {CASSETTE_MODES}")
+    _cassette = None if mode == "off" else LLMCassette(path or get_agent_config()['llm_cassette_path'], mode, replay_latency)
+    return _cassette
+
+def get_llm_cassette() -> Optional[LLMCassette]:
+    global _cassette
+    if _cassette is None:
+        config = get_agent_config()
+        if config['llm_cassette_mode'] in ("record", "replay"):
+            _cassette = LLMCassette(
+                config['llm_cassette_path'], config['llm_cassette_mode'], config['llm_cassette_replay_latency']
+            )
+    return _cassette
+
+def get_llm_http_client(async_client: bool = False):
+    """
+    HTTP client for OpenAIChat(http_client=...) that records to or replays from the
+    cassette, or None when recording is off so the model creates its own client
+    """
+    cassette = get_llm_cassette()
+    if cassette is None:
+        return None
+    if async_client:
+        return httpx.AsyncClient(transport=AsyncCassetteTransport(cassette))
+    return httpx.Client(transport=CassetteTransport(cassette))
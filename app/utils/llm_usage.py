@@ -0,0 +1,289 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.config import get_agent_config
+from app.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# US dollars per million tokens: (uncached prompt, cached prompt, completion).
+# AGENT_CONFIG['llm_prices'] (LLM_PRICES) overrides or adds models.
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+# Who a run's usage is attributed to
+CONVERSATION = "conversation"
+THREAD = "thread"
+
+# Pending aggregates are committed once this many rows have accumulated, even within flush_seconds
+FLUSH_THRESHOLD = 200
+
+# Columns summed per row, in table order
+USAGE_COLUMNS = ("runs", "requests", "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd", "seconds")
+
+# /llm-usage groupings and the column each groups by
+GROUPINGS = {
+    "conversation": "subject",
+    "thread": "subject",
+    "agent": "agent",
+    "day": "day",
+    "model": "model",
+}
+
+COST_USD = get_metrics().counter(
+    "llm_agent_cost_usd_total", "Estimated OpenAI cost of agent runs in US dollars, by agent type", ["agent"]
+)
+
+def run_usage(response: Any) -> Dict[str, int]:
+    """
+    Model requests and prompt, cached prompt and completion tokens of one agent run
+    Assistant messages copied in from the conversation history are skipped, as in
+    app/utils/metrics.py run_token_counts.
+    """
+    usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+    for message in getattr(response, "messages", None) or []:
+        if message.role != "assistant" or message.metrics is None or getattr(message, "from_history", False):
+            continue
+        usage["requests"] += 1
+        usage["prompt_tokens"] += message.metrics.input_tokens or 0
+        usage["completion_tokens"] += message.metrics.output_tokens or 0
+        usage["cached_tokens"] += (message.metrics.prompt_tokens_details or {}).get("cached_tokens") or 0
+    return usage
+
+class LLMUsageStore:
+    """
+    Token usage and estimated cost of agent runs, summed per day, agent type,
+    model and subject (a Chatwoot conversation or a Zoho thread), in SQLite
+
+    record() only adds to aggregates held in memory; they are committed in one
+    transaction when flush_seconds have passed since the last commit, before a
+    query and on close, so an agent run costs no disk write. Like the email
+    state store, the database runs in WAL mode and commits are additive upserts,
+    so several worker processes can share it.
+    """
+    def __init__(self, db_path: str = None, prices: Optional[Dict[str, Tuple[float, float, float]]] = None,
+                 flush_seconds: float = 5.0, retention_days: Optional[float] = None):
+        self.db_path = db_path or os.path.join("data", "llm_usage.db")
+        self.prices = dict(DEFAULT_PRICES, **(prices or {}))
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                day TEXT NOT NULL,
+                agent TEXT NOT NULL,
+                model TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                runs REAL NOT NULL,
+                requests REAL NOT NULL,
+                prompt_tokens REAL NOT NULL,
+                cached_tokens REAL NOT NULL,
+                completion_tokens REAL NOT NULL,
+                cost_usd REAL NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (day, agent, model, scope, subject)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_subject ON llm_usage (scope, subject)")
+        self.conn.commit()
+
+        self._lock = threading.Lock()
+        self.pending: Dict[Tuple[str, str, str, str, str], List[float]] = {}
+        self.flushed_at = time.monotonic()
+        self.commits = 0
+        self.pruned_at = 0.0
+        self._unpriced = set()
+
+        if self.retention_days:
+            self.prune(self.retention_days)
+
+    def cost(self, model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+        """Estimated US dollars for the tokens, 0 for a model without a price"""
+        price = self.prices.get(model)
+        if price is None:
+            if model not in self._unpriced:
+                self._unpriced.add(model)
+                logger.warning("No price for model %s, its cost is counted as 0 (set LLM_PRICES)", model)
+            return 0.0
+        uncached_price, cached_price, completion_price = price
+        return ((prompt_tokens - cached_tokens) * uncached_price + cached_tokens * cached_price
+                + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, agent_type: str, response: Any, seconds: float, scope: str = "",
+               subjects: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        Add one agent run to the aggregates
+
+        Args:
+            agent_type: Agent type, as in llm_agent_run_seconds
+            response: The agno RunResponse
+            seconds: Duration of the run
+            scope: CONVERSATION, THREAD, or "" for a run without a subject
+            subjects: Subject IDs of the run with their weights; a run shared by
+                several subjects (a batch classification) is split between them
+                in proportion, so every grouping adds up to the same totals
+
+        Returns:
+            The run's requests, tokens and cost
+        """
+        usage = run_usage(response)
+        model = getattr(response, "model", None) or "unknown"
+        usage["cost_usd"] = self.cost(model, usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"])
+        if usage["cost_usd"]:
+            COST_USD.inc(usage["cost_usd"], agent=agent_type)
+
+        subjects = subjects or {"": 1}
+        total_weight = sum(subjects.values()) or 1
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        values = [1, usage["requests"], usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"],
+                  usage["cost_usd"], seconds]
+        with self._lock:
+            for subject, weight in subjects.items():
+                share = weight / total_weight
+                key = (day, agent_type, model, scope if subject else "", str(subject))
+                row = self.pending.setdefault(key, [0] * len(USAGE_COLUMNS))
+                for index, value in enumerate(values):
+                    row[index] += value * share
+            due = len(self.pending) >= FLUSH_THRESHOLD or time.monotonic() - self.flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+        return usage
+
+    def flush(self):
+        """Commit the pending aggregates in a single transaction"""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        # Shares of a split run are stored unrounded, so the sums stay exact
+        rows = [key + tuple(row) for key, row in pending.items()]
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in USAGE_COLUMNS)
+        with self._lock, self.conn:
+            self.conn.executemany(f"""
+                INSERT INTO llm_usage (day, agent, model, scope, subject, {", ".join(USAGE_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, {", ".join("?" * len(USAGE_COLUMNS))})
+                ON CONFLICT (day, agent, model, scope, subject) DO UPDATE SET {updates}
+            """, rows)
+            self.commits += 1
+
+        # Long-running processes apply retention at most once a day
+        if self.retention_days and time.time() - self.pruned_at > 86400:
+            self.prune(self.retention_days)
+
+    def prune(self, retention_days: float) -> int:
+        """Delete days older than retention_days; returns the number of rows removed"""
+        cutoff = time.strftime("%Y-%m-%d", time.gmtime(time.time() - retention_days * 86400))
+        with self._lock, self.conn:
+            removed = self.conn.execute("DELETE FROM llm_usage WHERE day < ?", (cutoff,)).rowcount
+        self.pruned_at = time.time()
+        return removed
+
+    def summary(self, group_by: str = "conversation", agent: Optional[str] = None, subject: Optional[str] = None,
+                since: Optional[str] = None, until: Optional[str] = None, order_by: str = "cost_usd",
+                limit: int = 50) -> Dict[str, Any]:
+        """
+        Usage summed by conversation, thread, agent, day or model, largest first
+
+        Args:
+            group_by: One of GROUPINGS
+            agent: Only this agent type
+            subject: Only this conversation or thread ID
+            since, until: Only these days (YYYY-MM-DD, UTC, inclusive)
+            order_by: One of USAGE_COLUMNS to sort by, descending
+            limit: Rows returned; the totals cover every matching row
+
+        Returns:
+            Dict with the totals and the rows, each with its share of the total cost
+        """
+        if group_by not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+        if order_by not in USAGE_COLUMNS:
+            raise ValueError(f"order_by must be one of {', '.join(USAGE_COLUMNS)}")
+        self.flush()
+
+        conditions, parameters = [], []
+        if group_by in (CONVERSATION, THREAD):
+            conditions.append("scope = ?")
+            parameters.append(group_by)
+        for column, value, operator in (("agent", agent, "="), ("subject", subject, "="),
+                                        ("day", since, ">="), ("day", until, "<=")):
+            if value:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sums = ", ".join(f"SUM({column})" for column in USAGE_COLUMNS)
+        column = GROUPINGS[group_by]
+
+        with self._lock:
+            totals = self.conn.execute(f"SELECT {sums} FROM llm_usage {where}", parameters).fetchone()
+            rows = self.conn.execute(
+                f"SELECT {column}, {sums} FROM llm_usage {where} GROUP BY {column} "
+                f"ORDER BY SUM({order_by}) DESC LIMIT ?", parameters + [max(0, limit)]
+            ).fetchall()
+
+        total_cost = totals[USAGE_COLUMNS.index("cost_usd")] or 0.0
+
+        def usage_dict(values) -> Dict[str, Any]:
+            usage = {name: value or 0 for name, value in zip(USAGE_COLUMNS, values)}
+            usage["cached_ratio"] = round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0
+            usage["cost_share"] = round(usage["cost_usd"] / total_cost, 4) if total_cost else 0.0
+            for name in USAGE_COLUMNS[:5]:
+                usage[name] = round(usage[name])
+            usage["cost_usd"] = round(usage["cost_usd"], 6)
+            usage["seconds"] = round(usage["seconds"], 3)
+            return usage
+
+        results = []
+        for row in rows:
+            result = {group_by: row[0]}
+            result.update(usage_dict(row[1:]))
+            results.append(result)
+        return {"group_by": group_by, "totals": usage_dict(totals), "rows": results}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self.conn.execute("SELECT COUNT(*) FROM llm_usage").fetchone()[0]
+            return {"rows": rows, "pending": len(self.pending), "commits": self.commits}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+# Singleton instance
+_llm_usage = None
+
+def get_llm_usage() -> LLMUsageStore:
+    global _llm_usage
+    if _llm_usage is None:
+        config = get_agent_config()
+        _llm_usage = LLMUsageStore(
+            config["llm_usage_db_path"],
+            prices=config["llm_prices"],
+            flush_seconds=config["llm_usage_flush_seconds"],
+            retention_days=config["llm_usage_retention_days"]
+        )
+    return _llm_usage
+
+def close_llm_usage():
+    """Commit pending usage and close the database, if it was opened (called on app shutdown)"""
+    global _llm_usage
+    if _llm_usage is not None:
+        _llm_usage.close()
+        _llm_usage = None
@@ -1,24 +1,178 @@
+import atexit
 import json
-from typing import Any
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 from colorama import Fore, Style, init # type: ignore
 
+from app.utils.config import get_logging_config
+from app.utils.metrics import get_metrics
+
 # Initialize colorama
 init()
 
-def log_json(data: Any, title: str = None):
-    """Simple JSON logger with basic formatting using colorama"""
+# Colors the step modules put in their messages, blank when the profile has no colors
+ANSI_COLORS = {
+    "RED": "\033[91m",
+    "GREEN": "\033[92m",
+    "YELLOW": "\033[93m",
+    "BLUE": "\033[94m",
+    "MAGENTA": "\033[95m",
+    "CYAN": "\033[96m",
+    "WHITE": "\033[97m",
+    "RESET": "\033[0m"
+}
+
+LEVEL_COLORS = {
+    logging.WARNING: Fore.YELLOW,
+    logging.ERROR: Fore.RED,
+    logging.CRITICAL: Style.BRIGHT + Fore.RED
+}
+
+_logger = logging.getLogger("app")
+
+def get_log_colors() -> Dict[str, str]:
+    """The colors dict passed to the step modules"""
+    if get_logging_config()['colors']:
+        return dict(ANSI_COLORS)
+    return {name: "" for name in ANSI_COLORS}
+
+def log_step(logger: logging.Logger, title: str, color: str = "", reset: str = ""):
+    """Log the banner that starts a pipeline step"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if color:
+        rule = "═" * 61
+        logger.info("\n%s%s\n▶▶▶ %s ◀◀◀\n%s%s", color, rule, title, rule, reset)
+    else:
+        logger.info("▶▶▶ %s ◀◀◀", title)
+
+class LazyJson:
+    """Pretty-printed JSON of a value, only rendered when the record is written"""
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __str__(self) -> str:
+        data = self.data
+        if isinstance(data, bytes):
+            try:
+                data = json.loads(data.decode('utf-8'))
+            except ValueError:
+                return repr(data)
+        try:
+            return json.dumps(data, indent=2, default=str, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return str(data)
+
+def log_json(data: Any, title: str = None, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+    """Log a payload as indented JSON, at DEBUG unless told otherwise"""
+    logger = logger or _logger
     if title:
-        print(f"{Style.BRIGHT}{Fore.BLUE}{title}{Style.RESET_ALL}")
-    
-    if isinstance(data, bytes):
+        logger.log(level, "%s\n%s", title, LazyJson(data))
+    else:
+        logger.log(level, "%s", LazyJson(data))
+
+class TextFormatter(logging.Formatter):
+    """Time, level and message, colored by level in the development profile"""
+
+    def __init__(self, colors: bool):
+        super().__init__("%(asctime)s.%(msecs)03d %(levelname)-7s %(message)s", "%H:%M:%S")
+        self.colors = colors
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        color = LEVEL_COLORS.get(record.levelno) if self.colors else None
+        return f"{color}{text}{Style.RESET_ALL}" if color else text
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log collectors"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to sys.stdout as it is at the time of writing, so redirect_stdout applies as it did to print"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without formatting them
+
+    The stdlib QueueHandler formats the message on the calling thread so the
+    record can be pickled; here the queue never leaves the process, so the
+    %-formatting, LazyJson dumps and writes all happen on the writer thread. The
+    arguments are formatted when the record is written, so callers log values
+    they no longer change. When the queue is full records are dropped and
+    counted rather than blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
         try:
-            data = json.loads(data.decode('utf-8'))
-        except:
-            print(data)
-            return
-            
-    try:
-        formatted = json.dumps(data, indent=2)
-        print(f"{Fore.GREEN}{formatted}{Style.RESET_ALL}")
-    except:
-        print(data)
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# Writer thread of the background handler, started by setup_logging
+_listener = None
+
+def setup_logging(level: Optional[str] = None):
+    """
+    Configure the "app" logger from the logging configuration (once per process)
+    level overrides the configured level, e.g. "CRITICAL" to silence a benchmark
+    """
+    global _listener
+    if _logger.handlers:
+        return
+    config = get_logging_config()
+    output = StdoutHandler()
+    output.setFormatter(JsonFormatter() if config['format'] == 'json' else TextFormatter(config['colors']))
+    if config['async']:
+        handler = BackgroundQueueHandler(queue.Queue(maxsize=config['queue_size']))
+        _listener = QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        get_metrics().gauge("log_queue_depth", "Log records waiting for the writer thread").set_function(handler.queue.qsize)
+        get_metrics().counter(
+            "log_records_dropped_total", "Log records dropped because the writer queue was full"
+        ).set_function(lambda: handler.dropped)
+    else:
+        handler = output
+    _logger.addHandler(handler)
+    _logger.setLevel(level or config['level'])
+    _logger.propagate = False
+
+def shutdown_logging():
+    """Write out the queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
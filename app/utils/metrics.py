@@ -0,0 +1,271 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.tracing import span
+
+# Upper bounds in seconds, from a cached lookup to a slow LLM call or a whole pipeline run
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    """
+    A named metric with one series per combination of label values
+
+    Recording only takes a lock and updates a dict entry, so it is cheap enough
+    for every request and pipeline step. A metric can instead read its values
+    from a function when scraped (set_function), for sizes kept elsewhere such
+    as queue depths, which then cost nothing until /metrics is requested.
+    """
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], Any]] = None
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        try:
+            return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError as e:
+            raise ValueError(f"Metric {self.name} is missing label {e}") from None
+
+    def set_function(self, function: Callable[[], Any]):
+        """
+        Read the values from function at scrape time: a number for a metric
+        without labels, or a dict from label value tuples to numbers
+        """
+        self._function = function
+
+    def _samples(self) -> List[Tuple[str, str, float]]:
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception:
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = [((key,) if not isinstance(key, tuple) else key, value) for key, value in values.items()]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in sorted(items)]
+
+    def render(self) -> List[str]:
+        documentation = self.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [f"# HELP {self.name} {documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self._samples())
+        return lines
+
+class Counter(Metric):
+    """A total that only goes up"""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A value that goes up and down"""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, with their sum and count"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        self._bucket_labels = tuple(f'le="{_format_value(bound)}"' for bound in self.buckets + (float("inf"),))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # bisect_left puts a value equal to a bound in that bound's bucket (le is inclusive)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts, the +Inf bucket last, then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        samples = []
+        for key, series in items:
+            cumulative = 0
+            for bucket_label, count in zip(self._bucket_labels, series):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, bucket_label), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, series[-1]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """The process's metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with another type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Singleton instance
+_metrics = None
+
+def get_metrics() -> MetricsRegistry:
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
+
+# Shared by the Lisa and Zoho agents
+AGENT_RUN_SECONDS = get_metrics().histogram(
+    "llm_agent_run_seconds", "Duration of agent runs (bot.run / agent.arun) by agent type", ["agent", "status"]
+)
+AGENT_TOKENS = get_metrics().counter(
+    "llm_agent_tokens_total",
+    "Tokens used by agent runs, by agent type and kind (input, cached: the part of input read from the prompt cache, output)",
+    ["agent", "kind"]
+)
+TOOL_SECONDS = get_metrics().histogram(
+    "llm_tool_call_seconds", "Duration of agent tool calls by toolkit and function", ["toolkit", "function", "status"]
+)
+
+def run_token_counts(response: Any) -> Dict[str, int]:
+    """
+    Input, cached input and output tokens of the model requests made by one agent run
+    agno's response.metrics also adds up the assistant messages copied in from
+    the conversation history, so those are skipped here.
+    """
+    counts = {"input": 0, "cached": 0, "output": 0}
+    messages = getattr(response, "messages", None)
+    if messages is None:
+        metrics = getattr(response, "metrics", None) or {}
+        for kind in counts:
+            value = metrics.get(f"{kind}_tokens", 0)
+            counts[kind] = sum(value) if isinstance(value, list) else (value or 0)
+        return counts
+    for message in messages:
+        if message.role == "assistant" and message.metrics is not None and not getattr(message, "from_history", False):
+            counts["input"] += message.metrics.input_tokens or 0
+            counts["output"] += message.metrics.output_tokens or 0
+            counts["cached"] += (message.metrics.prompt_tokens_details or {}).get("cached_tokens") or 0
+    return counts
+
+def record_agent_run(agent_type: str, seconds: float, response: Any = None):
+    """Observe one agent run and add the tokens of its model requests"""
+    AGENT_RUN_SECONDS.observe(seconds, agent=agent_type, status="ok" if response is not None else "error")
+    for kind, tokens in run_token_counts(response).items():
+        if tokens:
+            AGENT_TOKENS.inc(tokens, agent=agent_type, kind=kind)
+
+def _timed_entrypoint(entrypoint: Callable, labels: Dict[str, str]) -> Callable:
+    span_name = f"tool {labels['toolkit']}.{labels['function']}"
+    if asyncio.iscoroutinefunction(entrypoint):
+        @functools.wraps(entrypoint)
+        async def timed(*args, **kwargs):
+            started, status = time.perf_counter(), "error"
+            with span(span_name):
+                try:
+                    result = await entrypoint(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    TOOL_SECONDS.observe(time.perf_counter() - started, status=status, **labels)
+    else:
+        @functools.wraps(entrypoint)
+        def timed(*args, **kwargs):
+            started, status = time.perf_counter(), "error"
+            with span(span_name):
+                try:
+                    result = entrypoint(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    TOOL_SECONDS.observe(time.perf_counter() - started, status=status, **labels)
+    timed._metrics_instrumented = True
+    return timed
+
+def instrument_toolkit(toolkit):
+    """
+    Time every function of an agno toolkit into llm_tool_call_seconds, and trace each call
+    agno reads the signature and docstring through functools.wraps, so the tool
+    schemas sent to the model do not change.
+    """
+    for name, function in toolkit.functions.items():
+        if function.entrypoint is not None and not getattr(function.entrypoint, "_metrics_instrumented", False):
+            function.entrypoint = _timed_entrypoint(function.entrypoint, {"toolkit": toolkit.name, "function": name})
+    return toolkit
@@ -0,0 +1,53 @@
+import logging
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.utils.config import get_server_config
+
+logger = logging.getLogger(__name__)
+
+# Singleton instance, created on first use
+_process_pool = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=max(1, get_server_config()['process_pool_workers']))
+    return _process_pool
+
+async def run_in_process_pool(func: Callable, *args) -> Any:
+    """
+    Run a CPU-bound, picklable module-level function in the shared process pool
+    so the event loop keeps serving other requests meanwhile
+
+    If a worker dies (e.g. killed for memory) the broken pool is shut down and
+    the call is retried once on a fresh pool. If that pool breaks too,
+    BrokenProcessPool is raised; the call is never run on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+            logger.warning("Process pool broken, retrying %s on a fresh pool", func.__name__)
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Shut a broken pool down; the next call creates a fresh one"""
+    global _process_pool
+    # Concurrent calls that failed on the same pool replace it only once
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_process_pool():
+    """Stop the worker processes (called on app shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
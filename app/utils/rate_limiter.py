@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Dict, Any
+
+from app.utils.config import get_agent_config
+from app.utils.metrics import get_metrics
+
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity"""
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket only wait for a full bucket)"""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        # The level may go negative; later callers then wait for the debt to refill
+        self.level -= amount
+
+    def adjust(self, amount: float):
+        self.level = min(self.capacity, self.level - amount)
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter for an API quota
+
+    Callers acquire an estimated token count before a request and settle the
+    difference with the real usage afterwards. Waiting callers are served in
+    arrival order.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = asyncio.Lock()
+        self.queued = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def acquire(self, tokens: int, requests: int = 1):
+        """Wait until both quotas have room, then reserve the request and tokens"""
+        self.queued += 1
+        try:
+            async with self._lock:
+                started = time.monotonic()
+                delay = max(self.requests.wait_time(requests), self.tokens.wait_time(tokens))
+                if delay > 0:
+                    self.waits += 1
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = max(self.requests.wait_time(requests), self.tokens.wait_time(tokens))
+                self.wait_seconds += time.monotonic() - started
+                self.requests.consume(requests)
+                self.tokens.consume(tokens)
+        finally:
+            self.queued -= 1
+
+    def settle(self, estimated_tokens: int, actual_tokens: int, actual_requests: int = 1):
+        """Correct the buckets with the usage reported after the request finished"""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+        self.requests.adjust(actual_requests - 1)
+
+    def record(self, tokens: int, requests: int = 1):
+        """
+        Take usage of a request that did not acquire first (e.g. a live chat reply,
+        which is never delayed); later acquire() callers wait for it to refill
+        """
+        self.requests.consume(requests)
+        self.tokens.consume(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            "queued": self.queued,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "requests_available": int(self.requests.level),
+            "tokens_available": int(self.tokens.level)
+        }
+
+# Singleton instance
+_openai_rate_limiter = None
+
+def get_openai_rate_limiter():
+    global _openai_rate_limiter
+    if _openai_rate_limiter is None:
+        config = get_agent_config()
+        _openai_rate_limiter = RateLimiter(
+            requests_per_minute=config['openai_requests_per_minute'],
+            tokens_per_minute=config['openai_tokens_per_minute']
+        )
+        get_metrics().gauge(
+            "openai_rate_limiter_queued", "Agent runs waiting for OpenAI request or token quota"
+        ).set_function(lambda: _openai_rate_limiter.queued)
+    return _openai_rate_limiter
@@ -0,0 +1,357 @@
+import contextvars
+import functools
+import glob
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.utils.config import get_server_config
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+class Span:
+    """One timed operation of a trace; times are perf_counter nanoseconds"""
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.end_ns: Optional[int] = None
+        self.start_ns = time.perf_counter_ns()
+
+    def set(self, **attributes):
+        """Add attributes known only once the operation ran, e.g. a response status"""
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.end_ns = time.perf_counter_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:300]
+
+class Trace:
+    """The spans of one webhook, collected until its root span ends"""
+
+    def __init__(self, max_spans: int):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.closed = False
+        # Anchors the perf_counter span times to the wall clock
+        self.wall_ns = time.time_ns()
+        self.perf_ns = time.perf_counter_ns()
+
+    def open(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        if self.closed or len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+        span = Span(self, name, parent.span_id if parent is not None else None, attributes)
+        self.spans.append(span)
+        return span
+
+# The span the running code is part of; asyncio tasks and asyncio.to_thread copy it,
+# so spans opened under asyncio.gather become children of the span that started the gather
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+class SpanContext:
+    """
+    Context manager opening a span under the current one, or a trace when root is set
+
+    Outside a trace (tracing disabled, not sampled, or code not called from a
+    webhook) it only reads the context variable.
+    """
+    __slots__ = ("name", "attributes", "root", "span", "token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], root: bool = False):
+        self.name = name
+        self.attributes = attributes
+        self.root = root
+        self.span: Optional[Span] = None
+        self.token = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            self.span = parent.trace.open(self.name, parent, self.attributes)
+        elif self.root:
+            tracer = get_tracer()
+            if tracer is not None and random.random() < tracer.sample_rate:
+                self.span = Trace(tracer.max_spans).open(self.name, None, self.attributes)
+        if self.span is not None:
+            self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            _current_span.reset(self.token)
+            self.span.finish(exc)
+            if self.span.parent_id is None:
+                get_tracer().export(self.span.trace)
+        return False
+
+def span(name: str, **attributes) -> SpanContext:
+    """with span("zoho get_email", endpoint=...) as current: ... (current is None when not tracing)"""
+    return SpanContext(name, attributes)
+
+def start_trace(name: str, **attributes) -> SpanContext:
+    """Open the root span of a new trace, exported when it ends (a child span inside a trace)"""
+    return SpanContext(name, attributes, root=True)
+
+def _leaf_span(name: str, attributes: Dict[str, Any]) -> Optional[Span]:
+    """A span under the current one that is not made current, for code that yields to its caller"""
+    parent = _current_span.get()
+    return parent.trace.open(name, parent, attributes) if parent is not None else None
+
+def _lanes(spans: List[Span]) -> Dict[str, int]:
+    """
+    Chrome trace lane (tid) of each span: a span goes on its parent's lane when
+    it nests there, so concurrent siblings get lanes of their own
+    """
+    lanes: List[List[Span]] = []
+    assigned = {}
+    for span in sorted(spans, key=lambda span: (span.start_ns, -span.end_ns)):
+        candidate = None
+        for index, lane in enumerate(lanes):
+            while lane and lane[-1].end_ns <= span.start_ns:
+                lane.pop()
+            if lane and lane[-1].span_id == span.parent_id:
+                candidate = index
+                break
+            if not lane and candidate is None:
+                candidate = index
+        if candidate is None:
+            lanes.append([])
+            candidate = len(lanes) - 1
+        lanes[candidate].append(span)
+        assigned[span.span_id] = candidate + 1
+    return assigned
+
+def chrome_trace(trace: Trace, spans: List[Span]) -> Dict[str, Any]:
+    """Complete ("X") events in microseconds from the trace start, for chrome://tracing or Perfetto"""
+    root = spans[0]
+    lanes = _lanes(spans)
+    events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"{root.name} {trace.trace_id[:8]}"}}]
+    for lane in sorted(set(lanes.values())):
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": f"lane {lane}"}})
+    for span in spans:
+        args = dict(span.attributes, span_id=span.span_id, parent_id=span.parent_id)
+        if span.error:
+            args["error"] = span.error
+        events.append({
+            "name": span.name,
+            "cat": span.name.split(" ")[0],
+            "ph": "X",
+            "ts": (span.start_ns - root.start_ns) / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": 1,
+            "tid": lanes[span.span_id],
+            "args": args
+        })
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"trace_id": trace.trace_id, "started": trace.wall_ns / 1e9, "dropped_spans": trace.dropped}
+    }
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_trace(trace: Trace, spans: List[Span]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest, as accepted by OpenTelemetry collectors and Jaeger"""
+    def unix_ns(perf_ns: int) -> str:
+        return str(trace.wall_ns + perf_ns - trace.perf_ns)
+
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 2 if span.parent_id is None else 1,  # SERVER for the webhook, INTERNAL below it
+            "startTimeUnixNano": unix_ns(span.start_ns),
+            "endTimeUnixNano": unix_ns(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id is not None:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "openleadsai"}}]},
+        "scopeSpans": [{"scope": {"name": "app.utils.tracing"}, "spans": otlp_spans}]
+    }]}
+
+class Tracer:
+    """
+    Writes each finished trace to its own JSON file in directory
+
+    Spans are only collected in memory while the webhook runs; when the root
+    span ends the trace goes on a bounded queue and a writer thread converts
+    and writes it, so the event loop never serializes or waits for the disk.
+    Traces are dropped and counted when the queue is full, and only the newest
+    max_files files are kept.
+    """
+
+    def __init__(self, directory: str, export_format: str = "chrome", sample_rate: float = 1.0,
+                 max_spans: int = 5000, max_files: int = 200, queue_size: int = 100):
+        if export_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {export_format!r}, expected one of {TRACE_FORMATS}")
+        self.directory = directory
+        self.export_format = export_format
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        self.max_files = max(1, max_files)
+        self.queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=max(1, queue_size))
+        self.exported = 0
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._write_loop, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        """Queue a trace whose root span ended; never blocks"""
+        trace.closed = True
+        try:
+            self.queue.put_nowait(trace)
+            self.exported += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, trace: Trace):
+        root = trace.spans[0]
+        spans = list(trace.spans)
+        for span in spans:
+            if span.end_ns is None:
+                # Still running in a task the webhook did not wait for
+                span.end_ns = root.end_ns
+                span.attributes["unfinished"] = True
+        document = chrome_trace(trace, spans) if self.export_format == "chrome" else otlp_trace(trace, spans)
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "-", root.name).strip("-") or "trace"
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(trace.wall_ns / 1e9))
+        path = os.path.join(self.directory, f"trace-{stamp}-{name}-{trace.trace_id[:16]}.{self.export_format}.json")
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(document, trace_file, ensure_ascii=False, default=str)
+        self.written += 1
+        paths = sorted(glob.glob(os.path.join(self.directory, "trace-*.json")), key=os.path.getmtime)
+        for old_path in paths[:-self.max_files]:
+            os.remove(old_path)
+
+    def _write_loop(self):
+        while True:
+            trace = self.queue.get()
+            if trace is None:
+                return
+            try:
+                self._write(trace)
+            except Exception:
+                self.dropped += 1
+
+    def close(self):
+        """Write out the queued traces and stop the writer thread"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "format": self.export_format,
+            "exported": self.exported,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize()
+        }
+
+# Singleton instance, created on the first webhook when tracing is enabled
+_tracer = None
+
+def get_tracer() -> Optional[Tracer]:
+    global _tracer
+    config = get_server_config()
+    if _tracer is None and config['tracing_enabled']:
+        _tracer = Tracer(
+            config['tracing_dir'],
+            config['tracing_format'],
+            config['tracing_sample_rate'],
+            config['tracing_max_spans'],
+            config['tracing_max_files']
+        )
+    return _tracer
+
+def close_tracer():
+    """Write out the queued traces (called on app shutdown)"""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+def _traced_call(name: str, call, *, streaming: bool):
+    """Wrap a model method so every request it makes to the model is a span"""
+    if streaming:
+        @functools.wraps(call)
+        def traced(*args, **kwargs):
+            # A generator yields into its caller, so the span is not made current
+            span = _leaf_span(name, {})
+            error = None
+            try:
+                yield from call(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                if span is not None:
+                    span.finish(error)
+        return traced
+
+    @functools.wraps(call)
+    def traced(*args, **kwargs):
+        with span(name):
+            return call(*args, **kwargs)
+    return traced
+
+def _traced_async_call(name: str, call, *, streaming: bool):
+    if streaming:
+        @functools.wraps(call)
+        async def traced(*args, **kwargs):
+            span = _leaf_span(name, {})
+            error = None
+            try:
+                async for chunk in call(*args, **kwargs):
+                    yield chunk
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                if span is not None:
+                    span.finish(error)
+        return traced
+
+    @functools.wraps(call)
+    async def traced(*args, **kwargs):
+        with span(name):
+            return await call(*args, **kwargs)
+    return traced
+
+def trace_model(model):
+    """Make each chat completion request of an agno model a span under the agent run"""
+    name = f"openai {model.id}"
+    model.invoke = _traced_call(name, model.invoke, streaming=False)
+    model.invoke_stream = _traced_call(name, model.invoke_stream, streaming=True)
+    model.ainvoke = _traced_async_call(name, model.ainvoke, streaming=False)
+    model.ainvoke_stream = _traced_async_call(name, model.ainvoke_stream, streaming=True)
+    return model
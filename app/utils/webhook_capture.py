@@ -0,0 +1,146 @@
+import base64
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.utils.config import get_server_config
+from app.utils.metrics import get_metrics
+
+# Wait at most this long before writing queued payloads to disk
+FLUSH_SECONDS = 1.0
+
+class WebhookCapture:
+    """
+    Appends raw webhook payloads with their arrival time to rotating gzip JSONL files
+
+    capture() only puts the payload on a bounded queue; a writer thread compresses
+    and writes it, so the request path never waits for the disk. When the queue
+    is full the payload is dropped and counted. A file is closed and a new one
+    started once max_bytes of JSON lines were written to it, and only the newest
+    max_files files are kept.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_files: int, queue_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max(1, max_files)
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max(1, queue_size))
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.files_rotated = 0
+        self._file = None
+        self._file_bytes = 0
+        self._thread = threading.Thread(target=self._write_loop, name="webhook-capture", daemon=True)
+        self._thread.start()
+
+    def capture(self, source: str, path: str, body: bytes):
+        """Queue one payload for writing; never blocks"""
+        record = {"ts": time.time(), "source": source, "path": path}
+        try:
+            record["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(body).decode("ascii")
+        try:
+            self.queue.put_nowait(record)
+            self.captured += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        name = time.strftime("webhooks-%Y%m%d-%H%M%S", time.gmtime(now)) + f"-{int(now % 1 * 1e6):06d}"
+        self._file = gzip.open(os.path.join(self.directory, f"{name}.jsonl.gz"), "ab")
+        self._file_bytes = 0
+        # Drop the oldest files beyond max_files, counting the new one
+        paths = sorted(glob.glob(os.path.join(self.directory, "webhooks-*.jsonl.gz")), key=os.path.getmtime)
+        for old_path in paths[:-self.max_files]:
+            os.remove(old_path)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_loop(self):
+        running = True
+        while running:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=FLUSH_SECONDS))
+                while True:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                running = False
+                batch = [record for record in batch if record is not None]
+            for record in batch:
+                if self._file is None:
+                    self._open()
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                self._file.write(line)
+                self._file_bytes += len(line)
+                self.written += 1
+                if self._file_bytes >= self.max_bytes:
+                    self._close_file()
+                    self.files_rotated += 1
+            if batch and self._file is not None:
+                # A sync flush makes everything written so far readable even if the process dies
+                self._file.flush()
+        self._close_file()
+
+    def close(self):
+        """Write out the queued payloads and close the current file"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "files_rotated": self.files_rotated
+        }
+
+# Singleton instance, created on the first captured webhook when capture is enabled
+_webhook_capture = None
+
+def get_webhook_capture() -> Optional[WebhookCapture]:
+    global _webhook_capture
+    config = get_server_config()
+    if _webhook_capture is None and config['webhook_capture_enabled']:
+        _webhook_capture = WebhookCapture(
+            config['webhook_capture_dir'],
+            config['webhook_capture_max_bytes'],
+            config['webhook_capture_max_files'],
+            config['webhook_capture_queue_size']
+        )
+        get_metrics().gauge(
+            "webhook_capture_queue_depth", "Captured webhooks waiting for the writer thread"
+        ).set_function(lambda: _webhook_capture.queue.qsize() if _webhook_capture is not None else 0)
+        get_metrics().counter(
+            "webhook_capture_dropped_total", "Captured webhooks dropped because the writer queue was full"
+        ).set_function(lambda: _webhook_capture.dropped if _webhook_capture is not None else 0)
+    return _webhook_capture
+
+def capture_webhook(source: str, path: str, body: bytes):
+    """Record a raw incoming webhook payload if capture is enabled"""
+    capture = get_webhook_capture()
+    if capture is not None:
+        capture.capture(source, path, body)
+
+def close_webhook_capture():
+    """Flush and close the capture files (called on app shutdown)"""
+    global _webhook_capture
+    if _webhook_capture is not None:
+        _webhook_capture.close()
+        _webhook_capture = None
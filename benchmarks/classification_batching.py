@@ -0,0 +1,114 @@
+"""
+Benchmark: single-email vs batched email classification
+
+Classifies the same synthetic emails with the current one-request-per-email path
+(ZohoMailHandler.classify_email) and with the batch path
+(ZohoMailHandler.classify_emails_batch), then reports wall time and tokens per
+classified email. Makes real OpenAI requests, so OPENAI_API_KEY must be set.
+The benchmark runs in a temporary directory, so the handler's state store,
+content cache, pre-classifier and LLM usage databases are created under its
+data/ directory instead of the repository's or a deployment's.
+
+Usage:
+    python benchmarks/classification_batching.py --emails 20 --batch-size 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Classification never calls Zoho, but the handler needs an account ID to start
+os.environ.setdefault("ZOHO_ACCOUNT_ID", "benchmark")
+# Keep the usage of benchmark runs in the temporary directory's data/, even if a deployment sets a path
+os.environ["LLM_USAGE_DB_PATH"] = os.path.join("data", "llm_usage.db")
+
+from app.api.services.zoho.handler import ZohoMailHandler
+from app.api.services.zoho.records import EmailRecord
+from app.utils.llm_usage import close_llm_usage
+
+SAMPLE_EMAILS = [
+    ("Quote for end of tenancy cleaning", "Hi, I'm moving out of a 2 bed 1 bath apartment in Lucan on the 28th. Could you give me a price for an end of tenancy clean including the oven?"),
+    ("Carpet cleaning", "Hello, do you clean carpets in Naas? We have three bedrooms and a stairs. What would it cost?"),
+    ("Re: Cleaning booking", "Thank you, Thursday at 10am is perfect. See you then."),
+    ("Boost your SEO rankings today", "We help businesses like yours reach the first page of Google. Reply to book a free consultation with our growth team."),
+    ("Invoice #4821 from your hosting provider", "Your invoice for the period is now available. This is an automated message, please do not reply."),
+    ("After builders clean", "We just finished an extension in Bray, roughly 40 square meters. Can you do an after builders clean next week and how much?"),
+    ("Re: Deep clean quote", "Thanks for the quote. Is the fridge included, and could you come on a Saturday?"),
+    ("Partnership opportunity", "We are a lead generation agency offering exclusive leads for cleaning companies at a discounted rate this month."),
+]
+
+def build_emails(count):
+    """Build a deterministic list of (email, content) tuples"""
+    emails = []
+    for index in range(count):
+        subject, content = SAMPLE_EMAILS[index % len(SAMPLE_EMAILS)]
+        email = EmailRecord(
+            message_id=f"bench_{index}",
+            from_address=f"customer{index}@example.com",
+            from_name=f"Customer {index}",
+            subject=subject
+        )
+        emails.append((email, content))
+    return emails
+
+async def run_single(handler, emails):
+    return [await handler.classify_email(email, content) for email, content in emails]
+
+async def run_batched(handler, emails):
+    return await handler.classify_emails_batch(emails)
+
+async def measure(name, runner, emails, batch_size, token_budget):
+    handler = ZohoMailHandler()
+    handler.pipeline_config = dict(
+        handler.pipeline_config,
+        classification_batch_size=batch_size,
+        classification_batch_token_budget=token_budget
+    )
+    started = time.perf_counter()
+    results = await runner(handler, emails)
+    elapsed = time.perf_counter() - started
+
+    usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for counter in handler.llm_usage.values():
+        for key in usage:
+            usage[key] += counter[key]
+
+    count = len(emails)
+    print(f"{name:>8}: {elapsed:7.2f}s total, {elapsed / count * 1000:7.0f} ms/email, "
+          f"{usage['calls']:3d} requests, {usage['input_tokens'] / count:7.1f} input + "
+          f"{usage['output_tokens'] / count:6.1f} output tokens/email")
+    return results
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=20, help="number of emails to classify")
+    parser.add_argument("--batch-size", type=int, default=10, help="maximum emails per batch request")
+    parser.add_argument("--token-budget", type=int, default=6000, help="estimated prompt tokens per batch request")
+    args = parser.parse_args()
+
+    emails = build_emails(args.emails)
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as state_dir:
+        # The stores open data/... relative to the working directory
+        os.chdir(state_dir)
+        try:
+            single = await measure("single", run_single, emails, args.batch_size, args.token_budget)
+            batched = await measure("batched", run_batched, emails, args.batch_size, args.token_budget)
+        finally:
+            close_llm_usage()
+            os.chdir(working_dir)
+
+    agreement = sum(
+        1 for a, b in zip(single, batched)
+        if a["is_cleaning_related"] == b["is_cleaning_related"] and a["needs_response"] == b["needs_response"]
+    )
+    print(f"Agreement between paths: {agreement}/{len(emails)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,212 @@
+"""
+Benchmark: email content cleaning (step 4)
+
+Checks that clean_html and remove_quoted_content produce exactly the same
+text as their original implementations (kept below as legacy_clean_html and
+legacy_remove_quoted_content) and reports the throughput of both in MB/s. The
+check runs on built-in sample messages, on randomly generated fragments, and
+on real messages when a corpus directory of raw .html files is given (e.g.
+message bodies saved from the Zoho API).
+
+It then times remove_quoted_content on pathological inputs: text full of
+partial quote headers ("On ..., ", "From: ... Date: ... at") that never
+complete, where the original regex cascade backtracks polynomially. The
+legacy timings stop once one input takes longer than --legacy-budget seconds.
+
+Usage:
+    python benchmarks/content_cleaning.py --corpus path/to/html --fuzz 20000
+"""
+import argparse
+import html
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.services.zoho.steps.step4_fetch_content import clean_html, remove_quoted_content
+
+def legacy_clean_html(html_content):
+    """clean_html as it was before the passes were precompiled and skipped when not needed"""
+    text = re.sub(r'<head.*?>.*?</head>', '', html_content, flags=re.DOTALL)
+    text = re.sub(r'<style.*?>.*?</style>', '', text, flags=re.DOTALL)
+    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
+    text = html.unescape(text)
+    text = re.sub(r'<br\s*/?>', ' ', text)
+    text = re.sub(r'</p>\s*<p[^>]*>', ' ', text)
+    text = re.sub(r'<div[^>]*>', ' ', text)
+    text = re.sub(r'</div>', '', text)
+    text = re.sub(r'<[^>]*>', '', text)
+    text = re.sub(r'\n', ' ', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    return text.strip()
+
+def legacy_remove_quoted_content(text):
+    """remove_quoted_content as it was before the linear quote boundary scan"""
+    patterns = [
+        r'[-_]{2,}(\s)?On.*?wrote(\s)?[-_]{2,}.*',
+        r'From:.*?Sent:.*?To:.*',
+        r'On\s+.*?,\s+.*?\s+wrote:.*',
+        r'On\s+.*?\s+at\s+.*?,\s+.*?\s+wrote:.*',
+        r'[-]{4,}\s*Original message\s*[-]{4,}.*',
+        r'Sent from my.*?[-]{4,}.*',
+        r'From:.*?Date:.*?To:.*',
+        r'From:.*?Date:.*?at.*?To:.*?Subject:.*',
+    ]
+    for pattern in patterns:
+        split_text = re.split(pattern, text, flags=re.IGNORECASE | re.DOTALL)
+        if len(split_text) > 1:
+            text = split_text[0].strip()
+    text = re.sub(r'(?m)^>.*$', '', text)
+    text = re.sub(r'--\s*$.*', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+NEWSLETTER_BLOCK = (
+    '<div style="font-family:Arial;color:#333"><table width="600" cellpadding="0"><tr>'
+    '<td class="x"><p style="margin:0">Hello &amp; welcome to our '
+    '<a href="https://example.com/track?id=123&amp;u=4">summer sale</a> with 20% off</p><br/>'
+    '<img src="https://example.com/pixel.png" width="1" height="1"></td></tr></table></div>\n'
+)
+
+SAMPLE_MESSAGES = {
+    "newsletter": (
+        '<html><head><meta charset="utf-8"><title>Sale</title><style>.a{color:red}</style></head><body>'
+        + NEWSLETTER_BLOCK * 200 + '<script>track();</script></body></html>'
+    ),
+    "outlook_reply": (
+        '<div dir="ltr">Hi,\r\n<br>\r\nCould you quote for a deep clean of a 3 bed house in Naas?</div>\r\n'
+        '<div><br></div><div>Thanks,<br>Mary</div>\r\n<hr>\r\n'
+        '<div id="divRplyFwdMsg"><b>From:</b> Deep Cleaning &lt;info@deepcleaning.ie&gt;<br>'
+        '<b>Sent:</b> Monday 3 June 2024 10:12<br><b>To:</b> Mary &lt;mary@example.com&gt;<br>'
+        '<b>Subject:</b> Re: Quote</div><p>Dear Mary,</p>\r\n<p>Thank you for your enquiry.</p>'
+    ),
+    "gmail_reply": (
+        '<div dir="ltr">Thursday at 10am works, thanks!</div><br><div class="gmail_quote">'
+        '<div dir="ltr" class="gmail_attr">On Tue, 4 Jun 2024 at 09:30, Deep Cleaning '
+        '&lt;<a href="mailto:info@deepcleaning.ie">info@deepcleaning.ie</a>&gt; wrote:<br></div>'
+        '<blockquote class="gmail_quote" style="margin:0px 0px 0px 0.8ex">Hi John,<br>'
+        'We can do Thursday at 10am or Friday at 2pm.&nbsp; Let us know.</blockquote></div>'
+    ),
+    "contact_form": (
+        '<p><strong>Name:</strong> Sean</p>\n<p><strong>Email:</strong> sean@example.com</p>\n'
+        '<p><strong>Message:</strong> Price for end of tenancy clean, 2 bed apartment &amp; oven? '
+        'Budget &lt; &euro;300</p>'
+    ),
+    "plain": "Hello,\n\nJust confirming the booking for Saturday.\n\nRegards,\nTom",
+}
+
+FUZZ_TOKENS = [
+    '<p>', '</p>', '<p class="x">', '<br>', '<br/>', '<br />', '<BR>', '<br class=a>', '<div>', '</div>',
+    '<div style="a">', '<span>', '</span>', '<head>', '</head>', '<header>', '<style>', '</style>',
+    '<script>', '</script>', '&lt;', '&gt;', '&amp;', '&nbsp;', '&#60;', '&quot;', '<', '>', '\n',
+    '\r\n', ' ', '  ', '\t', '\xa0', 'hello', 'world', '<pre>', '</P>', '<a href="x?a=1&amp;b=2">', '</a>',
+]
+
+QUOTE_FUZZ_TOKENS = [
+    'On', 'on', ' ', '  ', '\n', '\t', '\r\n', ',', 'wrote', 'wrote:', 'WROTE:', '-', '--', '----', '_', '__',
+    'From:', 'from:', 'Sent:', 'To:', 'Date:', 'at', 'AT', 'Subject:', 'Original message', 'Sent from my',
+    '>', '> quoted', 'hello', 'Lisbon', 'Monday', '\xa0',
+]
+
+# Quote headers that start but never complete, repeated to build large inputs
+PATHOLOGICAL_UNITS = {
+    "on-comma": "on Monday, the 3rd ",
+    "from-date-at": "From: a Date: b at c ",
+    "dash-runs": "-" * 50 + " x ",
+}
+
+def load_corpus(directory):
+    return {path.name: path.read_text(encoding="utf-8", errors="ignore")
+            for path in sorted(Path(directory).glob("*.htm*"))}
+
+def fuzz_messages(count, seed, tokens=FUZZ_TOKENS):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(tokens) for _ in range(rng.randint(0, 30)))
+
+def check_identical(name, new, legacy, messages):
+    """Return the number of messages where the two implementations differ"""
+    mismatches = 0
+    for label, message in messages:
+        if new(message) != legacy(message):
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"  {name} differs on {label}: {message[:120]!r}")
+    return mismatches
+
+def throughput(func, messages, repeat):
+    """MB/s of input processed by func"""
+    total_bytes = sum(len(message.encode("utf-8")) for message in messages) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    return total_bytes / 1e6 / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of raw .html message bodies")
+    parser.add_argument("--fuzz", type=int, default=20000, help="random fragments to compare")
+    parser.add_argument("--repeat", type=int, default=20, help="repetitions for the throughput runs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy-budget", type=float, default=2.0,
+                        help="stop timing the legacy version on an input shape after a run this slow")
+    args = parser.parse_args()
+
+    messages = dict(SAMPLE_MESSAGES)
+    if args.corpus:
+        messages.update(load_corpus(args.corpus))
+
+    labelled = list(messages.items())
+    labelled += [(f"fuzz #{index}", message) for index, message in enumerate(fuzz_messages(args.fuzz, args.seed))]
+    mismatches = check_identical("clean_html", clean_html, legacy_clean_html, labelled)
+    print(f"clean_html: {len(labelled) - mismatches}/{len(labelled)} identical to the legacy output")
+
+    bodies = list(messages.values())
+    print(f"Throughput on {len(bodies)} messages ({sum(map(len, bodies)) / 1e6:.2f} MB):")
+    legacy_rate = throughput(legacy_clean_html, bodies, args.repeat)
+    new_rate = throughput(clean_html, bodies, args.repeat)
+    print(f"  legacy_clean_html: {legacy_rate:7.1f} MB/s")
+    print(f"  clean_html:        {new_rate:7.1f} MB/s ({new_rate / legacy_rate:.2f}x)")
+
+    # remove_quoted_content works on the cleaned text
+    cleaned = {label: legacy_clean_html(message) for label, message in messages.items()}
+    labelled = list(cleaned.items())
+    labelled += [(f"fuzz #{index}", message) for index, message
+                 in enumerate(fuzz_messages(args.fuzz, args.seed, QUOTE_FUZZ_TOKENS))]
+    quote_mismatches = check_identical("remove_quoted_content", remove_quoted_content,
+                                       legacy_remove_quoted_content, labelled)
+    print(f"remove_quoted_content: {len(labelled) - quote_mismatches}/{len(labelled)} identical to the legacy output")
+
+    texts = list(cleaned.values())
+    legacy_rate = throughput(legacy_remove_quoted_content, texts, args.repeat)
+    new_rate = throughput(remove_quoted_content, texts, args.repeat)
+    print(f"  legacy_remove_quoted_content: {legacy_rate:7.1f} MB/s")
+    print(f"  remove_quoted_content:        {new_rate:7.1f} MB/s ({new_rate / legacy_rate:.2f}x)")
+
+    print("Pathological inputs (seconds):")
+    for name, unit in PATHOLOGICAL_UNITS.items():
+        legacy_enabled = True
+        for repeats in (10, 20, 40, 80, 10000):
+            text = unit * repeats
+            started = time.perf_counter()
+            remove_quoted_content(text)
+            new_seconds = time.perf_counter() - started
+            # The legacy version is only timed on the small sizes, it can take hours on the large one
+            legacy_column = "skipped"
+            if legacy_enabled and repeats <= 80:
+                started = time.perf_counter()
+                legacy_remove_quoted_content(text)
+                legacy_seconds = time.perf_counter() - started
+                legacy_column = f"{legacy_seconds:9.4f}"
+                legacy_enabled = legacy_seconds < args.legacy_budget
+            print(f"  {name:>13} {len(text):8d} chars: legacy {legacy_column:>9}, new {new_seconds:9.4f}")
+
+    sys.exit(1 if mismatches or quote_mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: reading large email content responses (step 4)
+
+Builds synthetic Zoho content responses of about --size-mb megabytes (a
+message with base64 inline images, and a plain HTML newsletter) and feeds
+them in 64 KB chunks to two readers:
+
+  legacy     read the whole body, json.loads it, clean the content
+  streaming  read_email_content_stream with the configured size limit,
+             then clean the content
+
+Reports the time and tracemalloc peak of each. Exits with status 1 if the
+streaming reader, given a limit larger than the body, produces different
+cleaned text than the legacy reader.
+
+Usage:
+    python benchmarks/content_fetch.py --size-mb 5
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.services.zoho.api import CONTENT_CHUNK_BYTES
+from app.api.services.zoho.content_stream import read_email_content_stream
+from app.api.services.zoho.steps.step4_fetch_content import clean_email_body
+from app.utils.config import get_zoho_pipeline_config
+
+NEWSLETTER_BLOCK = (
+    '<div style="font-family:Arial;color:#333"><table width="600" cellpadding="0"><tr>'
+    '<td class="x"><p style="margin:0">Hello &amp; welcome to our '
+    '<a href="https://example.com/track?id=123&amp;u=4">summer sale</a> with 20% off</p><br/>'
+    '<img src="https://example.com/pixel.png" width="1" height="1"></td></tr></table></div>\n'
+)
+
+def build_inline_images(size_mb, seed):
+    """A short reply with photos pasted into the body"""
+    rng = random.Random(seed)
+    images = []
+    for index in range(4):
+        payload = base64.b64encode(rng.randbytes(int(size_mb * 1e6 * 0.75 / 4))).decode()
+        images.append(f'<p>Photo {index + 1}:</p><img src="data:image/jpeg;base64,{payload}" width="600">')
+    return (
+        '<div dir="ltr">Hi, the oven and the hob are in this state, could you quote for both?</div>'
+        + "".join(images) + '<div>Thanks,<br>Mary</div>'
+    )
+
+def build_newsletter(size_mb):
+    repeats = int(size_mb * 1e6 / len(NEWSLETTER_BLOCK)) + 1
+    return '<html><body>' + NEWSLETTER_BLOCK * repeats + '</body></html>'
+
+def build_response(html_content):
+    """The content endpoint's JSON, with slashes escaped as Zoho sends them"""
+    body = json.dumps({
+        "status": {"code": 200, "description": "success"},
+        "data": {"messageId": "1700000000000000001", "content": html_content}
+    })
+    return body.replace("/", "\\/").encode("utf-8")
+
+async def chunked(raw):
+    for start in range(0, len(raw), CONTENT_CHUNK_BYTES):
+        yield raw[start:start + CONTENT_CHUNK_BYTES]
+        await asyncio.sleep(0)
+
+async def legacy_read(raw, max_chars):
+    parts = [chunk async for chunk in chunked(raw)]
+    return json.loads(b"".join(parts))
+
+async def streaming_read(raw, max_chars):
+    return await read_email_content_stream(chunked(raw), max_chars)
+
+def read_and_clean(reader, raw, max_chars):
+    response = asyncio.run(reader(raw, max_chars))
+    return clean_email_body(response["data"]["content"]), response
+
+def measure(reader, raw, max_chars):
+    """Return (cleaned text, response, seconds, peak MB) for one read and clean"""
+    # Timed without tracemalloc, which slows down every allocation
+    started = time.perf_counter()
+    cleaned, response = read_and_clean(reader, raw, max_chars)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    read_and_clean(reader, raw, max_chars)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cleaned, response, elapsed, peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=5.0, help="approximate size of each response")
+    parser.add_argument("--max-chars", type=int, default=get_zoho_pipeline_config()["content_max_chars"],
+                        help="size limit for the streaming reader")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bodies = {
+        "inline images": build_inline_images(args.size_mb, args.seed),
+        "newsletter": build_newsletter(args.size_mb),
+    }
+
+    mismatches = 0
+    for name, html_content in bodies.items():
+        raw = build_response(html_content)
+        print(f"{name}: {len(raw) / 1e6:.1f} MB response")
+
+        legacy_text, _, seconds, peak = measure(legacy_read, raw, args.max_chars)
+        print(f"  legacy:    {seconds:6.3f}s, peak {peak:7.1f} MB, {len(legacy_text)} chars cleaned")
+
+        text, response, seconds, peak = measure(streaming_read, raw, args.max_chars)
+        print(f"  streaming: {seconds:6.3f}s, peak {peak:7.1f} MB, {len(text)} chars cleaned, "
+              f"truncated={response['truncated']}, {response['stripped_data_uris']} data URIs "
+              f"({response['stripped_chars'] / 1e6:.1f} MB) stripped")
+
+        # Without truncation the streaming reader must not change the cleaned text
+        unlimited_text, _, _, _ = measure(streaming_read, raw, len(raw))
+        if unlimited_text != legacy_text:
+            mismatches += 1
+            print("  MISMATCH: streaming output without a size limit differs from the legacy output")
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: memory of the email records passed through the Zoho pipeline
+
+Builds a synthetic inbox (see synthetic_inbox.py) of --messages messages
+with the fields the Zoho messages/view listing returns, then runs steps 2
+and 3 over it twice:
+
+  dicts    the raw listing dicts, as the pipeline kept them before
+           EmailRecord (including the copies the thread cache made)
+  records  EmailRecord / ThreadRecord, parsed once from the same listings
+
+and reports the memory still held afterwards and the tracemalloc peak,
+plus the time taken. Exits with status 1 if the two runs do not keep the
+same threads.
+
+Usage:
+    python benchmarks/email_records.py --messages 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_inbox import generate_inbox, COMPANY_EMAIL_ADDRESSES
+
+from app.api.services.zoho.records import EmailRecord
+from app.api.services.zoho.steps import organize_emails_by_thread, filter_threads, clean_email_address
+from app.utils.memory_cache import MemoryCache
+
+COLORS = {name: "" for name in ("RED", "GREEN", "YELLOW", "BLUE", "MAGENTA", "CYAN", "WHITE", "RESET")}
+
+def build_listings(message_count, seed):
+    """Return (inbox listing JSON, {thread ID: thread listing JSON}) like the Zoho API sends them"""
+    inbox = generate_inbox(message_count, thread_length=6, seed=seed, standalone_ratio=0, max_messages=message_count)
+    listing = json.dumps({"status": {"code": 200}, "data": inbox.messages})
+    thread_listings = {thread_id: json.dumps({"status": {"code": 200}, "data": emails})
+                       for thread_id, emails in inbox.threads.items()}
+    return listing, thread_listings
+
+def legacy_steps(listing, thread_listings):
+    """Steps 2 and 3 over raw listing dicts, as the pipeline ran them before EmailRecord"""
+    recent_emails = json.loads(listing)
+    threads = {}
+    for email in recent_emails["data"]:
+        thread_id = email.get("threadId")
+        current = threads.get(thread_id)
+        if current is None or int(email.get("receivedTime", 0)) > int(current.get("receivedTime", 0)):
+            threads[thread_id] = email
+
+    thread_cache = {}
+    full_threads = {}
+    for thread_id in threads:
+        data = json.loads(thread_listings[thread_id])["data"]
+        thread_emails = sorted(data, key=lambda x: int(x.get("receivedTime", 0)), reverse=True)
+        # The thread cache kept its own copies of the listing dicts
+        thread_cache[thread_id] = [dict(email) for email in thread_emails]
+        full_threads[thread_id] = thread_emails
+
+    company_emails_lower = [email.lower() for email in COMPANY_EMAIL_ADDRESSES]
+    customer_last_threads = {}
+    for thread_id, thread_emails in full_threads.items():
+        latest_email = thread_emails[0]
+        if clean_email_address(latest_email.get("fromAddress", "")) in company_emails_lower:
+            continue
+        customer_last_threads[thread_id] = {
+            "latest_email": latest_email,
+            "thread_emails": thread_emails,
+            "is_contact_form": False
+        }
+    return recent_emails, full_threads, customer_last_threads, thread_cache
+
+class ListingHandler:
+    """Answers list_emails from the prebuilt listings, parsing them as ZohoEmailHandler does"""
+
+    def __init__(self, thread_listings):
+        self.thread_listings = thread_listings
+
+    async def list_emails(self, limit=20, **kwargs):
+        result = json.loads(self.thread_listings[kwargs["threadId"]])
+        result["data"] = [EmailRecord.from_api(message) for message in result["data"]]
+        return result
+
+def record_steps(listing, thread_listings):
+    """Steps 2 and 3 with the pipeline's own step functions over EmailRecords"""
+    recent_emails = json.loads(listing)
+    recent_emails["data"] = [EmailRecord.from_api(message) for message in recent_emails["data"]]
+    thread_cache = MemoryCache(len(thread_listings) + 1, 3600)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        full_threads = asyncio.run(organize_emails_by_thread(
+            recent_emails, ListingHandler(thread_listings), set(), COLORS, thread_cache=thread_cache
+        ))
+        customer_last_threads = filter_threads(full_threads, COMPANY_EMAIL_ADDRESSES, set(), set(), COLORS)
+    return recent_emails, full_threads, customer_last_threads, thread_cache
+
+def measure(steps, listing, thread_listings):
+    """Return (result, seconds, MB held afterwards, peak MB)"""
+    started = time.perf_counter()
+    steps(listing, thread_listings)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    result = steps(listing, thread_listings)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current / 1e6, peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000, help="messages in the synthetic inbox")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    listing, thread_listings = build_listings(args.messages, args.seed)
+    print(f"Inbox: {args.messages} messages in {len(thread_listings)} threads "
+          f"({len(listing) / 1e6:.1f} MB listing JSON)")
+
+    legacy, legacy_seconds, legacy_held, legacy_peak = measure(legacy_steps, listing, thread_listings)
+    records, seconds, held, peak = measure(record_steps, listing, thread_listings)
+    print(f"  dicts:   {legacy_seconds:6.3f}s, {legacy_held:7.1f} MB held, peak {legacy_peak:7.1f} MB")
+    print(f"  records: {seconds:6.3f}s, {held:7.1f} MB held, peak {peak:7.1f} MB "
+          f"({legacy_held / held:.1f}x less held)")
+
+    legacy_kept = sorted(legacy[2])
+    kept = sorted(records[2])
+    print(f"Threads kept by step 3: {len(legacy_kept)} (dicts), {len(kept)} (records)")
+    sys.exit(0 if legacy_kept == kept else 1)
+
+if __name__ == "__main__":
+    main()
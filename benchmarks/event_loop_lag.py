@@ -0,0 +1,93 @@
+"""
+Benchmark: event loop lag while large email bodies are cleaned
+
+Cleans several multi-megabyte HTML newsletters with clean_email_content while a
+ticker coroutine measures how late the event loop wakes it up. Runs once with
+every body cleaned inline on the event loop and once with the configured
+inline limit, where large bodies go to the shared process pool. Exits with
+status 1 if the maximum lag with the process pool exceeds --max-lag-ms.
+
+Usage:
+    python benchmarks/event_loop_lag.py --bodies 4 --size-mb 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.services.zoho.steps.step4_fetch_content import clean_email_content, clean_email_body
+from app.utils.config import get_zoho_pipeline_config
+from app.utils.process_pool import get_process_pool, shutdown_process_pool
+
+NEWSLETTER_BLOCK = (
+    '<div style="font-family:Arial;color:#333"><table width="600" cellpadding="0"><tr>'
+    '<td class="x"><p style="margin:0">Hello &amp; welcome to our '
+    '<a href="https://example.com/track?id=123&amp;u=4">summer sale</a> with 20% off</p><br/>'
+    '<img src="https://example.com/pixel.png" width="1" height="1"></td></tr></table></div>\n'
+)
+
+TICK_SECONDS = 0.005
+
+def build_newsletter(size_mb):
+    repeats = int(size_mb * 1e6 / len(NEWSLETTER_BLOCK)) + 1
+    return '<html><head><style>.a{color:red}</style></head><body>' + NEWSLETTER_BLOCK * repeats + '</body></html>'
+
+async def measure(bodies, inline_max_chars):
+    """Clean the bodies concurrently and return (seconds taken, lags in ms)"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(clean_email_content(body, inline_max_chars) for body in bodies))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    return elapsed, lags
+
+def report(name, elapsed, lags):
+    ordered = sorted(lags) or [0.0]
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(f"{name:>13}: {elapsed:6.2f}s, event loop lag max {max(lags, default=0.0):7.1f} ms, "
+          f"p99 {p99:7.1f} ms over {len(lags)} ticks")
+    return max(lags, default=0.0)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bodies", type=int, default=4, help="number of large bodies to clean")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="size of each body")
+    parser.add_argument("--max-lag-ms", type=float, default=50.0, help="allowed lag with the process pool")
+    args = parser.parse_args()
+
+    body = build_newsletter(args.size_mb)
+    bodies = [body] * args.bodies
+    inline_max_chars = get_zoho_pipeline_config()["content_inline_clean_max_chars"]
+    print(f"Cleaning {args.bodies} bodies of {len(body) / 1e6:.1f} MB (inline limit {inline_max_chars} chars)")
+
+    # Start the workers before measuring, as the app does after its first large body
+    await asyncio.get_running_loop().run_in_executor(get_process_pool(), clean_email_body, "<p>warm up</p>")
+
+    inline_elapsed, inline_lags = await measure(bodies, inline_max_chars=len(body))
+    report("inline", inline_elapsed, inline_lags)
+    pool_elapsed, pool_lags = await measure(bodies, inline_max_chars=inline_max_chars)
+    pool_max = report("process pool", pool_elapsed, pool_lags)
+    shutdown_process_pool()
+
+    if pool_max > args.max_lag_ms:
+        print(f"FAIL: event loop lag {pool_max:.1f} ms exceeds {args.max_lag_ms} ms")
+        sys.exit(1)
+    print(f"OK: event loop lag stayed under {args.max_lag_ms} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
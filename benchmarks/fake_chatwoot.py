@@ -0,0 +1,88 @@
+"""
+Local stand-in for the Chatwoot messages API
+
+Accepts POST /api/v1/accounts/{account}/conversations/{id}/messages, the call
+ChatwootResponder.send_response makes for every live-chat reply, after a
+latency drawn from --latency (see fake_server.py), and counts the replies
+per conversation. Requests without an api_access_token header get a 401.
+
+Point the app at it with CHATWOOT_BASE_URL=http://HOST:PORT.
+
+Usage:
+    python benchmarks/fake_chatwoot.py --port 8767 --latency lognormal:0.1:0.3
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import FakeService, print_stats
+
+class FakeChatwoot(FakeService):
+    """The fake messages endpoint, with the replies received per conversation"""
+    ENDPOINTS = ("send_message",)
+
+    def __init__(self, latency: Optional[Dict[str, str]] = None, seed: int = 1):
+        super().__init__(latency, seed)
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.replies = Counter()
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/api/v1/accounts/{account}/conversations/{conversation}/messages", self.send_message)
+
+    def _check(self, endpoint: str, request: web.Request) -> Optional[web.Response]:
+        if not request.headers.get("api_access_token"):
+            return web.json_response({"errors": ["You need to sign in or sign up before continuing."]}, status=401)
+        return None
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        async def respond(request):
+            data = await request.json()
+            conversation = request.match_info["conversation"]
+            if not data.get("content"):
+                return web.json_response({"error": "content is required"}, status=422)
+            self.replies[conversation] += 1
+            return web.json_response({
+                "id": sum(self.replies.values()),
+                "content": data["content"],
+                "inbox_id": 1,
+                "conversation_id": int(conversation) if conversation.isdigit() else conversation,
+                "message_type": 1,
+                "content_type": "text",
+                "private": bool(data.get("private")),
+                "created_at": int(time.time()),
+                "echo_id": data.get("echo_id"),
+                "sender": {"id": 1, "name": "Lisa", "type": "user"}
+            })
+        return await self._serve("send_message", request, respond)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", default="lognormal:0.1:0.3", help="latency of each request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    fake = FakeChatwoot({"default": args.latency}, seed=args.seed)
+    print(f"Fake Chatwoot: CHATWOOT_BASE_URL=http://{args.host}:{args.port}")
+
+    async def report(app):
+        print("Requests served:")
+        print_stats(fake)
+        print(f"  replies to {len(fake.replies)} conversations")
+
+    app = fake.app()
+    app.on_cleanup.append(report)
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
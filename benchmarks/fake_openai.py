@@ -0,0 +1,218 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions API
+
+Answers POST /v1/chat/completions after a latency drawn from --latency (see
+fake_server.py) with a canned reply. Requests with a json_schema
+response_format, as sent for the agents' structured outputs, get a JSON
+object filling every field of the schema: strings with the reply, booleans
+with true. Streaming requests get the reply as server-sent events. Token
+usage is estimated at four characters per token.
+
+Prompt caching is simulated as OpenAI documents it: a prompt of at least 1024
+tokens reports as cached_tokens the longest prefix, in steps of 128 tokens,
+that an earlier request with the same tools and response format began with.
+
+Point the app at it with OPENAI_BASE_URL=http://HOST:PORT/v1; the load tests
+use offline_agent_environment() to also stand in for the Google credentials
+the agents' tools need.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8766 --latency lognormal:1.0:0.4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import FakeService, print_stats
+
+DEFAULT_REPLY = (
+    "Thanks for getting in touch! A deep clean of a three bedroom house is usually between "
+    "€250 and €350. Would you like me to check our availability for next week?"
+)
+
+def offline_agent_environment(openai_base_url: str, work_dir: str) -> Dict[str, str]:
+    """
+    Environment for creating the app's agents without real credentials
+
+    The tools are never called by the fake, but the calendar tool checks that its
+    credentials file exists and googlemaps checks the key's prefix.
+    """
+    credentials_path = os.path.join(work_dir, "calendar_credentials.json")
+    Path(credentials_path).write_text("{}")
+    return {
+        "OPENAI_BASE_URL": openai_base_url,
+        "OPENAI_API_KEY": "load-test",
+        "GOOGLE_CALENDAR_CREDENTIALS_PATH": credentials_path,
+        "GOOGLE_CALENDAR_TOKEN_PATH": os.path.join(work_dir, "calendar_token.json"),
+        "GOOGLE_MAPS_API_KEY": "AIzaLoadTest",
+        # Keep the usage of simulated runs out of data/llm_usage.db
+        "LLM_USAGE_DB_PATH": os.path.join(work_dir, "llm_usage.db"),
+        # Keep agno from reporting every run to its telemetry API
+        "AGNO_TELEMETRY": "false",
+    }
+
+# Prompt caching: prefixes are cached in steps of 128 tokens, for prompts of 1024 tokens or more
+CACHE_STEP_CHARS = 128 * 4
+CACHE_MIN_TOKENS = 1024
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def fill_schema(schema: Dict[str, Any], reply: str, definitions: Dict[str, Any]) -> Any:
+    """A value matching a JSON schema, with the reply in every string field"""
+    if "$ref" in schema:
+        return fill_schema(definitions[schema["$ref"].split("/")[-1]], reply, definitions)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return fill_schema(options[0], reply, definitions) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fill_schema(field, reply, definitions) for name, field in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fill_schema(schema.get("items", {}), reply, definitions)]
+    if kind == "boolean":
+        return True
+    if kind in ("integer", "number"):
+        return 0
+    return reply
+
+class FakeOpenAI(FakeService):
+    """The fake chat completions endpoint, with request and token counters"""
+    ENDPOINTS = ("chat_completions",)
+
+    def __init__(self, latency: Optional[Dict[str, str]] = None, reply: str = DEFAULT_REPLY, seed: int = 1,
+                 keep_requests: bool = False):
+        self.reply = reply
+        # Request bodies in arrival order, when keep_requests is set
+        self.bodies: Optional[List[Dict[str, Any]]] = [] if keep_requests else None
+        super().__init__(latency, seed)
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        # Hashes of the prompt prefixes seen so far, one per cache step
+        self.prompt_cache = set()
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+
+    def _check(self, endpoint: str, request: web.Request) -> Optional[web.Response]:
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"error": {
+                "message": "You didn't provide an API key.", "type": "invalid_request_error", "code": None
+            }}, status=401)
+        return None
+
+    def _content(self, body: Dict[str, Any]) -> str:
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            return json.dumps(fill_schema(schema, self.reply, schema.get("$defs", {})))
+        if response_format.get("type") == "json_object":
+            return json.dumps({"response": self.reply})
+        return self.reply
+
+    def _cached_tokens(self, body: Dict[str, Any], prompt: str) -> int:
+        """Tokens of the longest cached prefix of the prompt, and cache every prefix of it"""
+        # Tools and the response format come before the messages in the cached prefix
+        digest = hashlib.sha256(json.dumps([body.get("tools"), body.get("response_format")], sort_keys=True).encode())
+        matched = 0
+        for end in range(CACHE_STEP_CHARS, len(prompt) + 1, CACHE_STEP_CHARS):
+            digest.update(prompt[end - CACHE_STEP_CHARS:end].encode())
+            key = digest.hexdigest()
+            if matched == end - CACHE_STEP_CHARS and key in self.prompt_cache:
+                matched = end
+            self.prompt_cache.add(key)
+        cached = matched // 4
+        return cached if estimate_tokens(prompt) >= CACHE_MIN_TOKENS and cached >= CACHE_MIN_TOKENS else 0
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        async def respond(request):
+            body = await request.json()
+            if self.bodies is not None:
+                self.bodies.append(body)
+            content = self._content(body)
+            prompt = "".join(str(message.get("content") or "") for message in body.get("messages", []))
+            usage = {
+                "prompt_tokens": estimate_tokens(prompt),
+                "completion_tokens": estimate_tokens(content),
+                "prompt_tokens_details": {"cached_tokens": self._cached_tokens(body, prompt)}
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.cached_tokens += usage["prompt_tokens_details"]["cached_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+            completion = {
+                "id": f"chatcmpl-fake{self.requests['chat_completions']}",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "system_fingerprint": "fp_fake",
+            }
+            if body.get("stream"):
+                return await self._stream(request, completion, content, usage, body)
+            return web.json_response(dict(
+                completion,
+                object="chat.completion",
+                choices=[{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                    "finish_reason": "stop",
+                    "logprobs": None
+                }],
+                usage=usage
+            ))
+        return await self._serve("chat_completions", request, respond)
+
+    async def _stream(self, request, completion, content, usage, body) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = [
+            {"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None},
+            {"index": 0, "delta": {}, "finish_reason": "stop"},
+        ]
+        for choice in chunks:
+            event = dict(completion, object="chat.completion.chunk", choices=[choice])
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event = dict(completion, object="chat.completion.chunk", choices=[], usage=usage)
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", default="lognormal:1.0:0.4", help="latency of each completion")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI({"default": args.latency}, seed=args.seed)
+    print(f"Fake OpenAI: OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+
+    async def report(app):
+        print("Requests served:")
+        print_stats(fake)
+        print(f"  {fake.prompt_tokens} prompt tokens ({fake.cached_tokens} cached), "
+              f"{fake.completion_tokens} completion tokens")
+
+    app = fake.app()
+    app.on_cleanup.append(report)
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Shared pieces of the local fake APIs used by the load tests
+
+FakeService gives each fake per-endpoint latency drawn from a distribution,
+request and status counters and served latency percentiles. BackgroundServer
+runs fakes on their own event loop in a background thread. Latency specs:
+
+    fixed:SECONDS
+    uniform:MIN:MAX
+    lognormal:MEDIAN:SIGMA
+    exponential:MEAN
+"""
+import asyncio
+import math
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Return a function drawing one latency in seconds from the distribution in spec"""
+    name, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(":")] if params else []
+        if name == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if name == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if name == "lognormal" and len(values) == 2:
+            return lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))
+        if name == "exponential" and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec {spec!r}, expected fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA or exponential:MEAN")
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+class FakeService:
+    """
+    Base class of the fakes
+
+    latency maps endpoint names (see ENDPOINTS) to latency specs; "default"
+    applies to the others. Subclasses add their routes in add_routes() and
+    wrap each endpoint handler in _serve(), and can reject requests in _check().
+    """
+    ENDPOINTS = ()
+
+    def __init__(self, latency: Optional[Dict[str, str]] = None, seed: int = 1):
+        latency = dict(latency or {})
+        default = parse_latency(latency.pop("default", "fixed:0"))
+        self.latency = {endpoint: default for endpoint in self.ENDPOINTS}
+        self.latency.update({endpoint: parse_latency(spec) for endpoint, spec in latency.items()})
+        self.rng = random.Random(seed)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = Counter()
+        self.responses = defaultdict(Counter)
+        self.durations = defaultdict(list)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def stats(self) -> Dict[str, Dict]:
+        """Requests, responses by status and served latency percentiles per endpoint"""
+        return {
+            endpoint: {
+                "requests": self.requests[endpoint],
+                "statuses": dict(self.responses[endpoint]),
+                "p50_ms": round(percentile(self.durations[endpoint], 0.5) * 1000, 1),
+                "p95_ms": round(percentile(self.durations[endpoint], 0.95) * 1000, 1),
+                "max_ms": round(max(self.durations[endpoint]) * 1000, 1),
+            }
+            for endpoint in self.ENDPOINTS if self.requests[endpoint]
+        }
+
+    def add_routes(self, app: web.Application):
+        raise NotImplementedError
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        self.add_routes(app)
+        return app
+
+    def _check(self, endpoint: str, request: web.Request) -> Optional[web.Response]:
+        """Return an error response to send instead of the endpoint's own, or None"""
+        return None
+
+    async def _serve(self, endpoint: str, request: web.Request, respond) -> web.Response:
+        """Apply the endpoint's latency and _check() around one endpoint handler"""
+        started = time.perf_counter()
+        self.requests[endpoint] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency[endpoint](self.rng))
+            response = self._check(endpoint, request)
+            if response is None:
+                response = await respond(request)
+        finally:
+            self.in_flight -= 1
+        self.responses[endpoint][response.status] += 1
+        self.durations[endpoint].append(time.perf_counter() - started)
+        return response
+
+class BackgroundServer:
+    """
+    Serves one or more fakes on their own event loop in a background thread
+
+    The app calls some services with blocking requests calls from inside its
+    event loop (Zoho token refreshes, Chatwoot replies), so the fakes cannot
+    share that loop.
+    """
+
+    def __init__(self, *fakes: FakeService, host: str = "127.0.0.1", port: int = 0):
+        self.fakes = fakes
+        self.host = host
+        self.port = port
+        self.base_url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner = None
+
+    def __enter__(self) -> "BackgroundServer":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(sock), self._loop).result()
+        return self
+
+    async def _start(self, sock):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        for fake in self.fakes:
+            fake.add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.SockSite(self._runner, sock).start()
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+def print_stats(fake: FakeService):
+    for endpoint, stats in fake.stats().items():
+        print(f"  {endpoint:<18} {stats['requests']:>6} requests  p50 {stats['p50_ms']:>7.1f} ms  "
+              f"p95 {stats['p95_ms']:>7.1f} ms  statuses {stats['statuses']}")
+    print(f"  at most {fake.max_in_flight} requests in flight")
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Zoho Mail API, for end-to-end pipeline load tests
+
+Serves a seeded synthetic mailbox (see synthetic_inbox.py) over HTTP with the
+endpoints ZohoEmailHandler and ZohoAuthManager use:
+
+    POST /oauth/v2/token                                             token
+    GET  /api/accounts/{account}/messages/view                       list_emails / list_thread (threadId)
+    GET  /api/accounts/{account}/folders/{folder}/messages/{id}/content   get_email_content
+    POST /api/accounts/{account}/messages                            create_draft
+
+Every request waits for a latency drawn from a distribution, and a share of
+them can fail with a 500 (--error-rate) or be throttled with a 429 and a
+Retry-After header (--throttle-rate). Requests without a Zoho-oauthtoken
+header get a 401. Latencies use the specs of fake_server.py.
+
+Point the app at it with ZOHO_MAIL_BASE_URL and ZOHO_ACCOUNTS_BASE_URL, or
+use zoho_load.py, which starts it in-process and runs the real handler.
+
+Usage:
+    python benchmarks/fake_zoho.py --threads 500 --port 8765 --latency lognormal:0.15:0.5 --throttle-rate 0.02
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import FakeService, print_stats
+from synthetic_inbox import generate_inbox, QUOTING_STYLES, SyntheticInbox
+
+class FakeZoho(FakeService):
+    """
+    The fake Zoho API over one synthetic mailbox
+
+    Errors and throttling are drawn from the same seeded generator as the
+    latencies, so a run is repeatable for a given request order.
+    """
+    ENDPOINTS = ("token", "list_emails", "list_thread", "get_email_content", "create_draft")
+
+    def __init__(self, inbox: SyntheticInbox, latency: Optional[Dict[str, str]] = None, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, seed: int = 1):
+        self.inbox = inbox
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.tokens_issued = 0
+        super().__init__(latency, seed)
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.drafts: List[Dict] = []
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post("/oauth/v2/token", self.token)
+        app.router.add_get("/api/accounts/{account}/messages/view", self.list_messages)
+        app.router.add_get("/api/accounts/{account}/folders/{folder}/messages/{message}/content", self.content)
+        app.router.add_post("/api/accounts/{account}/messages", self.create_draft)
+
+    def _check(self, endpoint: str, request: web.Request) -> Optional[web.Response]:
+        if endpoint != "token" and not request.headers.get("Authorization", "").startswith("Zoho-oauthtoken "):
+            return self._error(401, "INVALID_OAUTHTOKEN")
+        if self.rng.random() < self.throttle_rate:
+            response = self._error(429, "Too many requests")
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response
+        if self.rng.random() < self.error_rate:
+            return self._error(500, "Internal error")
+        return None
+
+    @staticmethod
+    def _error(status: int, description: str) -> web.Response:
+        return web.json_response({"status": {"code": status, "description": description}, "data": {}}, status=status)
+
+    async def token(self, request: web.Request) -> web.Response:
+        async def respond(request):
+            form = await request.post()
+            if form.get("grant_type") != "refresh_token" or not form.get("refresh_token"):
+                return web.json_response({"error": "invalid_code"})
+            self.tokens_issued += 1
+            return web.json_response({
+                "access_token": f"fake-access-token-{self.tokens_issued}",
+                "api_domain": "https://www.zohoapis.eu",
+                "token_type": "Bearer",
+                "expires_in": 3600
+            })
+        return await self._serve("token", request, respond)
+
+    async def list_messages(self, request: web.Request) -> web.Response:
+        thread_id = request.query.get("threadId")
+
+        async def respond(request):
+            limit = int(request.query.get("limit", 20))
+            if thread_id:
+                messages = self.inbox.thread_listing(thread_id, limit)
+            else:
+                messages = self.inbox.listing(limit)
+            return web.json_response({"status": {"code": 200, "description": "success"}, "data": messages})
+        return await self._serve("list_thread" if thread_id else "list_emails", request, respond)
+
+    async def content(self, request: web.Request) -> web.Response:
+        async def respond(request):
+            message_id = request.match_info["message"]
+            content = self.inbox.contents.get(message_id)
+            if content is None:
+                return self._error(404, "Message not found")
+            body = json.dumps({
+                "status": {"code": 200, "description": "success"},
+                "data": {"messageId": message_id, "content": content}
+            })
+            # Zoho escapes slashes in its JSON
+            return web.Response(text=body.replace("/", "\\/"), content_type="application/json")
+        return await self._serve("get_email_content", request, respond)
+
+    async def create_draft(self, request: web.Request) -> web.Response:
+        async def respond(request):
+            data = await request.json()
+            if data.get("mode") != "draft" or not data.get("toAddress"):
+                return self._error(400, "Only drafts with a recipient are supported")
+            message_id = str(1_800_000_000_000_000 + len(self.drafts))
+            self.drafts.append(dict(data, messageId=message_id))
+            return web.json_response({
+                "status": {"code": 200, "description": "success"},
+                "data": {"messageId": message_id, "subject": data.get("subject"), "mode": "draft"}
+            })
+        return await self._serve("create_draft", request, respond)
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    """Mailbox and fault injection options shared with zoho_load.py"""
+    parser.add_argument("--threads", type=int, default=200, help="threads in the synthetic mailbox")
+    parser.add_argument("--thread-length", type=int, default=4, help="maximum messages per thread")
+    parser.add_argument("--html-size", type=int, default=2000, help="approximate HTML size of each body")
+    parser.add_argument("--quoting", choices=QUOTING_STYLES, default="mixed", help="how replies quote earlier messages")
+    parser.add_argument("--latency", default="lognormal:0.15:0.5", help="latency of every endpoint")
+    for endpoint in ("list", "content", "draft"):
+        parser.add_argument(f"--{endpoint}-latency", help=f"override --latency for the {endpoint} endpoints")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests throttled with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the mailbox, latencies and faults")
+
+def build_fake(args) -> FakeZoho:
+    inbox = generate_inbox(args.threads, thread_length=args.thread_length, html_size=args.html_size,
+                           quoting=args.quoting, seed=args.seed)
+    latency = {"default": args.latency}
+    if args.list_latency:
+        latency["list_emails"] = latency["list_thread"] = args.list_latency
+    if args.content_latency:
+        latency["get_email_content"] = args.content_latency
+    if args.draft_latency:
+        latency["create_draft"] = args.draft_latency
+    return FakeZoho(inbox, latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                    retry_after=args.retry_after, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fake_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    fake = build_fake(args)
+    print(f"Fake Zoho with {len(fake.inbox.threads)} threads, {len(fake.inbox.messages)} messages")
+    print(f"  ZOHO_MAIL_BASE_URL=http://{args.host}:{args.port} ZOHO_ACCOUNTS_BASE_URL=http://{args.host}:{args.port}")
+
+    async def report(app):
+        print("Requests served:")
+        print_stats(fake)
+        print(f"  {len(fake.drafts)} drafts created")
+
+    app = fake.app()
+    app.on_cleanup.append(report)
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
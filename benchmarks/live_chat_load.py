@@ -0,0 +1,279 @@
+"""
+Load test: concurrent live-chat conversations against one app worker
+
+Starts fake_openai.py and fake_chatwoot.py in-process, points the app at them
+with OPENAI_BASE_URL and CHATWOOT_BASE_URL, serves main.app with uvicorn on
+the same event loop as the load generator, and replays Chatwoot
+message_created webhooks into /live-chat/ from --conversations simulated
+conversations. Each conversation starts within --ramp-up seconds and sends
+--messages customer messages, waiting for the webhook to return and then a
+--think-time before the next one. The real Lisa agent answers every message,
+so prompts, history and structured outputs go through agno as in production.
+
+Reports the webhook latency percentiles, replies per second (replies the fake
+Chatwoot received), the requests each fake served, the resident memory per
+live conversation in conversation_bots, and the event loop lag measured by a
+ticker coroutine. Latency and think time use the specs of fake_server.py.
+It then scrapes the app's /metrics and reports the Lisa agent runs, Chatwoot
+sends and live conversations recorded there, and the token usage per
+conversation from /llm-usage.
+
+With --cassette, OpenAI responses are recorded to or replayed from an LLM
+cassette (app/utils/llm_cassette.py) instead of coming from the fake. A replay
+with --cassette-latency zero runs without any model time, so the webhook
+latency is the app's own overhead.
+
+Exits with status 1 if a webhook did not return a successful reply, a
+reply did not reach the fake Chatwoot, /metrics did not count every reply, or
+the tokens /llm-usage attributed to the conversations differ from those the
+fake OpenAI served.
+
+Usage:
+    python benchmarks/live_chat_load.py --conversations 50 --messages 4 --openai-latency lognormal:1.0:0.4
+    python benchmarks/live_chat_load.py --cassette live_chat.jsonl --cassette-mode replay --cassette-latency zero
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_chatwoot import FakeChatwoot
+from fake_openai import FakeOpenAI, offline_agent_environment
+from fake_server import BackgroundServer, parse_latency, percentile, print_stats
+
+TICK_SECONDS = 0.01
+
+CUSTOMER_MESSAGES = [
+    "Hi, could I get a price for a deep clean of a 3 bed semi-detached house?",
+    "It has 2 bathrooms and the kitchen needs a good going over too",
+    "Do you bring your own products and equipment?",
+    "Would next Thursday morning work?",
+    "Great, what do you need from me to book it in?",
+    "Is the oven included or is that extra?",
+]
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB (the peak where /proc is not available)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def metric_total(text: str, name: str, **labels) -> float:
+    """Sum of the samples of a metric in Prometheus text format whose labels include the given ones"""
+    total = 0.0
+    for match in re.finditer(rf"^{name}(?:{{(.*)}})? (\S+)$", text, re.MULTILINE):
+        sample_labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1) or ""))
+        if all(sample_labels.get(key) == str(value) for key, value in labels.items()):
+            total += float(match.group(2))
+    return total
+
+def build_webhook(conversation_id: int, message_id: int, content: str) -> dict:
+    """A Chatwoot message_created webhook for an incoming website chat message"""
+    contact = {
+        "id": conversation_id,
+        "name": f"Customer {conversation_id}",
+        "email": f"customer{conversation_id}@example.com",
+        "phone_number": f"+35387{conversation_id:07d}",
+        "type": "contact"
+    }
+    return {
+        "event": "message_created",
+        "id": message_id,
+        "content": content,
+        "content_type": "text",
+        "message_type": "incoming",
+        "private": False,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        "account": {"id": 1, "name": "Deep Cleaning"},
+        "inbox": {"id": 1, "name": "Website"},
+        "sender": contact,
+        "conversation": {
+            "id": conversation_id,
+            "inbox_id": 1,
+            "status": "pending",
+            "channel": "Channel::WebWidget",
+            "meta": {"sender": contact, "assignee": None}
+        }
+    }
+
+async def run_conversation(index, session, url, args, think_time, results):
+    """Send one conversation's messages, one after the other"""
+    rng = random.Random(args.seed * 100003 + index)
+    conversation_id = 10000 + index
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    for turn in range(args.messages):
+        content = CUSTOMER_MESSAGES[(index + turn) % len(CUSTOMER_MESSAGES)]
+        payload = build_webhook(conversation_id, conversation_id * 100 + turn, content)
+        started = time.perf_counter()
+        try:
+            async with session.post(url, json=payload) as response:
+                result = await response.json()
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        results["latencies"].append(time.perf_counter() - started)
+        if result.get("status") != "success" or not result.get("response"):
+            results["failures"].append(result)
+        await asyncio.sleep(think_time(rng))
+
+async def run_load(args):
+    import uvicorn
+    from app.utils.logger import setup_logging
+    # Before main's own setup_logging(), which then leaves this configuration in place
+    setup_logging(None if args.verbose else "CRITICAL")
+    from main import app
+    from app.api.services.chatwoot.handler import conversation_bots
+    from app.utils.llm_cassette import get_llm_cassette
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/live-chat/"
+    # No lifespan: the Zoho mail handler is not needed here
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    server_task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    lags = []
+    memory = {"start": rss_mb(), "peak": 0.0}
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+            memory["peak"] = max(memory["peak"], rss_mb())
+
+    results = {"latencies": [], "failures": []}
+    think_time = parse_latency(args.think_time)
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+        await asyncio.gather(*(
+            run_conversation(index, session, url, args, think_time, results)
+            for index in range(args.conversations)
+        ))
+        elapsed = time.perf_counter() - started
+        async with session.get(url.replace("/live-chat/", "/metrics")) as response:
+            results["metrics"] = await response.text()
+        usage_url = url.replace("/live-chat/", "/llm-usage")
+        async with session.get(usage_url, params={"group_by": "conversation", "limit": args.conversations}) as response:
+            results["usage"] = await response.json()
+    memory["end"] = rss_mb()
+    memory["conversations"] = len(conversation_bots)
+    done.set()
+    await ticker_task
+    server.should_exit = True
+    await server_task
+    cassette = get_llm_cassette()
+    return results, elapsed, lags, memory, cassette.stats() if cassette is not None else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=50, help="simulated live-chat conversations")
+    parser.add_argument("--messages", type=int, default=4, help="customer messages per conversation")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which the conversations start")
+    parser.add_argument("--think-time", default="uniform:1:3", help="customer pause after each reply")
+    parser.add_argument("--openai-latency", default="lognormal:1.0:0.4", help="latency of each completion")
+    parser.add_argument("--chatwoot-latency", default="lognormal:0.1:0.3", help="latency of each reply sent")
+    parser.add_argument("--cassette", help="LLM cassette file to record to or replay from")
+    parser.add_argument("--cassette-mode", choices=("record", "replay"), default="replay")
+    parser.add_argument("--cassette-latency", choices=("recorded", "zero"), default="recorded",
+                        help="wait for the recorded model latency on replay, or not at all")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+
+    fake_openai = FakeOpenAI({"default": args.openai_latency}, seed=args.seed)
+    fake_chatwoot = FakeChatwoot({"default": args.chatwoot_latency}, seed=args.seed)
+    print(f"{args.conversations} conversations x {args.messages} messages, think time {args.think_time}, "
+          f"OpenAI {args.openai_latency}, Chatwoot {args.chatwoot_latency}")
+
+    with BackgroundServer(fake_openai, fake_chatwoot) as server, tempfile.TemporaryDirectory() as work_dir:
+        # Read by app.utils.config when the app is imported in run_load
+        os.environ.update(offline_agent_environment(f"{server.base_url}/v1", work_dir))
+        os.environ.update({
+            "CHATWOOT_BASE_URL": server.base_url,
+            "CHATWOOT_API_TOKEN": "load-test",
+            "CHATWOOT_ACCOUNT_ID": "1",
+        })
+        if args.cassette:
+            os.environ.update({
+                "LLM_CASSETTE_MODE": args.cassette_mode,
+                "LLM_CASSETTE_PATH": args.cassette,
+                "LLM_CASSETTE_REPLAY_LATENCY": args.cassette_latency,
+            })
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else devnull), \
+                contextlib.redirect_stderr(sys.stderr if args.verbose else devnull):
+            results, elapsed, lags, memory, cassette = asyncio.run(run_load(args))
+
+    latencies = results["latencies"]
+    replies = sum(fake_chatwoot.replies.values())
+    print(f"Webhooks: {len(latencies)} sent, {len(results['failures'])} failed, {replies} replies in {elapsed:.1f}s "
+          f"({replies / elapsed:.2f} replies/s)")
+    print(f"  webhook latency: p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms")
+    print(f"  event loop lag: p50 {percentile(lags, 0.5):.1f} ms, p99 {percentile(lags, 0.99):.1f} ms, "
+          f"max {max(lags):.1f} ms")
+    per_conversation = (memory["end"] - memory["start"]) / memory["conversations"] if memory["conversations"] else 0.0
+    print(f"  memory: {memory['conversations']} live conversations, RSS {memory['start']:.1f} MB -> "
+          f"{memory['end']:.1f} MB (peak {memory['peak']:.1f} MB), {per_conversation:.2f} MB per conversation")
+    metrics = results["metrics"]
+    metric_sends = metric_total(metrics, "chatwoot_send_seconds_count")
+    print(f"  /metrics: {metric_total(metrics, 'llm_agent_run_seconds_count', agent='lisa'):.0f} Lisa runs "
+          f"({metric_total(metrics, 'llm_agent_run_seconds_sum', agent='lisa'):.1f}s), {metric_sends:.0f} Chatwoot sends, "
+          f"{metric_total(metrics, 'live_chat_conversations'):.0f} live conversations, "
+          f"{metric_total(metrics, 'llm_agent_tokens_total', agent='lisa', kind='input'):.0f} input and "
+          f"{metric_total(metrics, 'llm_agent_tokens_total', agent='lisa', kind='output'):.0f} output tokens")
+    usage = results["usage"]["totals"]
+    conversations = results["usage"]["rows"]
+    print(f"  /llm-usage: {len(conversations)} conversations, {usage['prompt_tokens']} prompt "
+          f"({usage['cached_tokens']} cached) and {usage['completion_tokens']} completion tokens, "
+          f"${usage['cost_usd']:.4f}")
+    if conversations:
+        top = conversations[0]
+        print(f"  costliest conversation {top['conversation']}: {top['runs']} runs, {top['requests']} requests, "
+              f"{top['prompt_tokens']} prompt tokens, ${top['cost_usd']:.4f} ({top['cost_share']:.1%} of the total)")
+    print("  fake OpenAI:")
+    print_stats(fake_openai)
+    print(f"  {fake_openai.prompt_tokens} prompt tokens ({fake_openai.cached_tokens} cached), "
+          f"{fake_openai.completion_tokens} completion tokens")
+    print("  fake Chatwoot:")
+    print_stats(fake_chatwoot)
+    if cassette is not None:
+        print(f"  LLM cassette: {cassette}")
+
+    for failure in results["failures"][:5]:
+        print(f"FAILED: {failure}")
+    usage_matches = (usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"]) == (
+        fake_openai.prompt_tokens, fake_openai.cached_tokens, fake_openai.completion_tokens
+    )
+    if cassette is None and not usage_matches:
+        print("FAILED: /llm-usage tokens differ from the fake OpenAI's")
+    sys.exit(1 if results["failures"] or replies != len(latencies) or metric_sends != replies
+             or (cassette is None and not usage_matches) else 0)
+
+if __name__ == "__main__":
+    main()
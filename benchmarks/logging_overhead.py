@@ -0,0 +1,190 @@
+"""
+Benchmark: logging overhead per webhook
+
+Each webhook logs an incoming Zoho and live-chat payload, runs
+ZohoMailHandler.process_emails over a synthetic mailbox served by
+fake_zoho.py without latency, with the LLM calls simulated as instant, and
+logs the result, as the /zoho-mails/ route does. Every run starts from an
+empty state, so every thread goes through all seven steps and everything they
+log. Each logging configuration runs in a child process whose stdout is a
+pipe read by this process, as under a process manager:
+
+    off           LOG_LEVEL=CRITICAL, nothing is logged: the baseline
+    production    LOG_PROFILE=production, INFO and above as JSON lines
+    development   LOG_PROFILE=development, DEBUG with the payload dumps, colored text
+    sync          development, written on the calling thread (LOG_ASYNC=false)
+
+The profiles run in turn for --rounds rounds, so drift in the machine's speed
+affects them alike. For each it reports, per webhook (the median over the
+rounds of the median of --webhooks after --warmup runs), the wall time and the
+CPU time of the event loop thread, the overhead of both over the off
+baseline, and the bytes of log output.
+
+Usage:
+    python benchmarks/logging_overhead.py --threads 50 --webhooks 10
+    python benchmarks/logging_overhead.py --profiles off,production
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import BackgroundServer
+from fake_zoho import FakeZoho
+from synthetic_inbox import generate_inbox
+from live_chat_load import build_webhook
+
+PROFILES = {
+    "off": {"LOG_PROFILE": "production", "LOG_LEVEL": "CRITICAL"},
+    "production": {"LOG_PROFILE": "production"},
+    "development": {"LOG_PROFILE": "development"},
+    "sync": {"LOG_PROFILE": "development", "LOG_ASYNC": "false"},
+}
+
+CHILD_ENVIRONMENT = {
+    "ZOHO_ACCOUNT_ID": "5412000000001001",
+    "ZOHO_PRECLASSIFIER_ENABLED": "false",
+    "ZOHO_CLIENT_ID": "benchmark",
+    "ZOHO_CLIENT_SECRET": "benchmark",
+    "ZOHO_REFRESH_TOKEN": "benchmark",
+}
+
+ZOHO_WEBHOOK = {
+    "summary": "Quote request for a deep clean",
+    "sentDateInGMT": 1760000000000,
+    "subject": "Quote request",
+    "messageId": "1760000000000100001",
+    "toAddress": "customers@deepcleaning.ie",
+    "folderId": "5412000000002014",
+    "fromAddress": "customer@example.com",
+    "threadId": "1760000000000100001",
+}
+
+def build_handler(state_dir: str, index: int):
+    """A mail handler with empty state of its own and instant simulated LLM calls"""
+    # Imported here, after the child's logging environment is set
+    from app.api.services.zoho.api import ZohoEmailHandler
+    from app.api.services.zoho.content_cache import EmailContentCache
+    from app.api.services.zoho.handler import ZohoMailHandler
+    from app.api.services.zoho.state_store import EmailStateStore, RESPONDED, SPAM
+
+    async def classify_email(email, content):
+        return {"is_cleaning_related": True, "needs_response": True, "reason": "simulated"}
+
+    async def create_draft_response(latest_email, thread, thread_id, create_draft=True):
+        return {"response": "<p>Thanks for getting in touch, here is your quote.</p>"}
+
+    handler = ZohoMailHandler()
+    handler.email_handler = ZohoEmailHandler()
+    handler.content_cache = EmailContentCache(os.path.join(state_dir, f"cache_{index}.db"))
+    handler.state_store = EmailStateStore(os.path.join(state_dir, f"state_{index}.db"))
+    handler.responded_emails = handler.state_store.view(RESPONDED)
+    handler.spam_emails = handler.state_store.view(SPAM)
+    handler.classify_email = classify_email
+    handler.create_draft_response = create_draft_response
+    return handler
+
+async def run_webhooks(args, state_dir):
+    from app.utils.logger import log_json
+
+    samples = []
+    for index in range(args.warmup + args.webhooks):
+        handler = build_handler(state_dir, index)
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        log_json(ZOHO_WEBHOOK, "Incoming Zoho Mail webhook")
+        log_json(build_webhook(10000 + index, index, "Do you bring your own products?"), "message_created")
+        result = await handler.process_emails(limit=args.limit)
+        log_json(result, "Email processing result")
+        if index >= args.warmup:
+            samples.append({"wall": time.perf_counter() - started, "cpu": time.thread_time() - cpu_started})
+        handler.close()
+    return samples
+
+def run_child(args):
+    from app.utils.logger import setup_logging
+    setup_logging()
+    fake = FakeZoho(generate_inbox(args.threads, seed=args.seed), {"default": "fixed:0"}, seed=args.seed)
+    with BackgroundServer(fake) as server, tempfile.TemporaryDirectory() as state_dir:
+        os.environ["ZOHO_MAIL_BASE_URL"] = server.base_url
+        os.environ["ZOHO_ACCOUNTS_BASE_URL"] = server.base_url
+        args.limit = len(fake.inbox.messages)
+        samples = asyncio.run(run_webhooks(args, state_dir))
+    Path(args.result).write_text(json.dumps(samples))
+
+def run_profile(profile, args):
+    """Run one profile in a child process and return its samples and the bytes it logged"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        result_path = os.path.join(work_dir, "result.json")
+        command = [sys.executable, __file__, "--child", "--result", result_path, "--threads", str(args.threads),
+                   "--webhooks", str(args.webhooks), "--warmup", str(args.warmup), "--seed", str(args.seed)]
+        env = dict(os.environ, **CHILD_ENVIRONMENT, **PROFILES[profile])
+        child = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, cwd=work_dir)
+        logged = [0]
+
+        def drain():
+            for chunk in iter(lambda: child.stdout.read(65536), b""):
+                logged[0] += len(chunk)
+
+        reader = threading.Thread(target=drain)
+        reader.start()
+        child.wait()
+        reader.join()
+        if child.returncode != 0:
+            raise RuntimeError(f"profile {profile} failed with exit status {child.returncode}")
+        return json.loads(Path(result_path).read_text()), logged[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50, help="threads in the synthetic mailbox")
+    parser.add_argument("--webhooks", type=int, default=10, help="measured webhooks per profile")
+    parser.add_argument("--warmup", type=int, default=2, help="webhooks run before measuring")
+    parser.add_argument("--rounds", type=int, default=3, help="times each profile is run, in turn")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma separated profiles")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    profiles = list(dict.fromkeys(args.profiles.split(",")))
+    unknown = [profile for profile in profiles if profile not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles {unknown}, expected some of {list(PROFILES)}")
+    print(f"{args.threads} threads per webhook, {args.rounds} rounds of {args.webhooks} webhooks")
+    measured = {profile: [] for profile in profiles}
+    for _ in range(args.rounds):
+        for profile in profiles:
+            samples, logged = run_profile(profile, args)
+            measured[profile].append((
+                statistics.median(sample["wall"] for sample in samples) * 1000,
+                statistics.median(sample["cpu"] for sample in samples) * 1000,
+                logged
+            ))
+
+    print(f"{'profile':<12} {'wall ms':>9} {'+ms':>8} {'loop CPU ms':>12} {'+ms':>8} {'log KB':>9}")
+    results = {
+        profile: [statistics.median(values) for values in zip(*rounds)]
+        for profile, rounds in measured.items()
+    }
+    baseline = results["off"][:2] if "off" in results else None
+    for profile, (wall, cpu, logged) in results.items():
+        extra_wall = f"{wall - baseline[0]:+8.1f}" if baseline else f"{'':>8}"
+        extra_cpu = f"{cpu - baseline[1]:+8.1f}" if baseline else f"{'':>8}"
+        per_webhook_kb = logged / (args.warmup + args.webhooks) / 1024
+        print(f"{profile:<12} {wall:9.1f} {extra_wall} {cpu:12.1f} {extra_cpu} {per_webhook_kb:9.1f}")
+
+if __name__ == "__main__":
+    main()
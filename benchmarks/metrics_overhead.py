@@ -0,0 +1,130 @@
+"""
+Benchmark: cost of the in-process metrics (app/utils/metrics.py)
+
+Measures the time of one Histogram.observe and Counter.inc with labels, and
+of rendering /metrics with --series label combinations per histogram. It then
+runs --webhooks ZohoMailHandler.process_emails over a synthetic mailbox of
+--threads threads served by fake_zoho.py without latency, with the LLM calls
+simulated as instant, as benchmarks/logging_overhead.py does, and counts the
+observations each webhook recorded. Their number times the cost of one is the
+time metrics add to a webhook, reported next to the webhook's own time.
+
+Also checks the rendered text: every histogram series has cumulative buckets
+ending in +Inf, and a _count equal to its +Inf bucket. Exits with status 1
+if it does not.
+
+Usage:
+    python benchmarks/metrics_overhead.py --threads 50 --webhooks 5
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import BackgroundServer
+from fake_zoho import FakeZoho
+from synthetic_inbox import generate_inbox
+from logging_overhead import CHILD_ENVIRONMENT, run_webhooks
+
+def time_per_call(func, calls: int) -> float:
+    """Median seconds per call over five batches"""
+    batches = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        batches.append((time.perf_counter() - started) / calls)
+    return statistics.median(batches)
+
+def check_exposition(text: str) -> list:
+    """Problems in the histograms of a rendered exposition"""
+    problems = []
+    buckets = defaultdict(list)
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line:
+            continue
+        match = re.match(r"^(\w+?)(_bucket|_count)?(?:\{(.*)\})? (\S+)$", line)
+        if not match:
+            problems.append(f"unparsable line: {line}")
+            continue
+        name, suffix, labels, value = match.groups()
+        labels = labels or ""
+        if suffix == "_bucket":
+            series = re.sub(r',?le="[^"]*"', "", labels)
+            buckets[(name, series)].append((re.search(r'le="([^"]*)"', labels).group(1), float(value)))
+        elif suffix == "_count":
+            counts[(name, labels)] = float(value)
+    for key, values in buckets.items():
+        cumulative = [value for _, value in values]
+        if values[-1][0] != "+Inf":
+            problems.append(f"{key}: last bucket is not +Inf")
+        if cumulative != sorted(cumulative):
+            problems.append(f"{key}: buckets are not cumulative")
+        if counts.get(key) != cumulative[-1]:
+            problems.append(f"{key}: _count {counts.get(key)} != +Inf bucket {cumulative[-1]}")
+    return problems
+
+def observation_count(registry) -> float:
+    """Histogram observations recorded so far"""
+    text = registry.render()
+    return sum(float(value) for value in re.findall(r"^\w+_count(?:\{.*\})? (\S+)$", text, re.MULTILINE))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50, help="threads in the synthetic mailbox")
+    parser.add_argument("--webhooks", type=int, default=5, help="measured webhooks")
+    parser.add_argument("--series", type=int, default=20, help="label combinations per histogram when rendering")
+    parser.add_argument("--calls", type=int, default=200000, help="calls per timed batch")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    os.environ.update(CHILD_ENVIRONMENT)
+
+    from app.utils.logger import setup_logging
+    from app.utils.metrics import MetricsRegistry, get_metrics
+    setup_logging("CRITICAL")
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("benchmark_seconds", "Benchmark histogram", ["endpoint", "status"])
+    counter = registry.counter("benchmark_total", "Benchmark counter", ["agent", "kind"])
+    observe = time_per_call(lambda: histogram.observe(0.042, endpoint="get_email_content", status=200), args.calls)
+    increment = time_per_call(lambda: counter.inc(120, agent="response", kind="input"), args.calls)
+    for index in range(args.series):
+        for metric in range(5):
+            registry.histogram(f"benchmark_{metric}_seconds", "Benchmark histogram", ["endpoint", "status"]).observe(
+                index / 10, endpoint=f"endpoint_{index}", status=200
+            )
+    render = time_per_call(registry.render, 200)
+    print(f"observe {observe * 1e9:.0f} ns, inc {increment * 1e9:.0f} ns, "
+          f"render of 5 histograms x {args.series} series {render * 1000:.2f} ms")
+
+    fake = FakeZoho(generate_inbox(args.threads, seed=args.seed), {"default": "fixed:0"}, seed=args.seed)
+    with BackgroundServer(fake) as server, tempfile.TemporaryDirectory() as state_dir:
+        os.environ["ZOHO_MAIL_BASE_URL"] = server.base_url
+        os.environ["ZOHO_ACCOUNTS_BASE_URL"] = server.base_url
+        args.limit, args.warmup = len(fake.inbox.messages), 0
+        before = observation_count(get_metrics())
+        samples = asyncio.run(run_webhooks(args, state_dir))
+        per_webhook = (observation_count(get_metrics()) - before) / args.webhooks
+    webhook = statistics.median(sample["wall"] for sample in samples)
+    overhead = per_webhook * max(observe, increment)
+    print(f"process_emails over {args.threads} threads: {webhook * 1000:.1f} ms per webhook, "
+          f"{per_webhook:.0f} observations, about {overhead * 1e6:.0f} us of metrics ({overhead / webhook:.3%})")
+
+    problems = check_exposition(get_metrics().render()) + check_exposition(registry.render())
+    for problem in problems[:5]:
+        print(f"FAILED: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: barrier vs streaming Zoho email pipeline
+
+Runs ZohoMailHandler.process_emails in both ZOHO_PIPELINE_MODE settings against a
+simulated Zoho API and simulated OpenAI calls, each with a fixed latency, and
+reports the time until the first draft is ready and the total run time. Nothing
+is sent to Zoho or OpenAI, and the run state is kept in a temporary directory.
+
+Usage:
+    python benchmarks/pipeline_streaming.py --threads 30 --zoho-latency 0.2 --llm-latency 1.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("ZOHO_ACCOUNT_ID", "benchmark")
+os.environ.setdefault("ZOHO_PRECLASSIFIER_ENABLED", "false")
+
+from app.api.services.zoho.content_cache import EmailContentCache
+from app.api.services.zoho.handler import ZohoMailHandler
+from app.api.services.zoho.records import EmailRecord
+from app.api.services.zoho.state_store import EmailStateStore, RESPONDED, SPAM
+
+class SimulatedZoho:
+    """Stands in for ZohoEmailHandler with a fixed latency per request"""
+
+    def __init__(self, threads, emails_per_thread, latency):
+        self.latency = latency
+        self.api_calls = Counter()
+        self.messages = []
+        received = 1_700_000_000_000
+        for thread in range(threads):
+            for index in range(emails_per_thread):
+                received += 1000
+                self.messages.append({
+                    "messageId": f"msg_{thread}_{index}",
+                    "threadId": f"thread_{thread}",
+                    "folderId": "inbox",
+                    "receivedTime": str(received),
+                    "fromAddress": f"customer{thread}@example.com",
+                    "toAddress": "info@deepcleaning.ie",
+                    "subject": f"Cleaning quote {thread}",
+                })
+
+    def get_api_call_counts(self):
+        return dict(self.api_calls)
+
+    async def list_emails(self, limit=20, **kwargs):
+        await asyncio.sleep(self.latency)
+        if "threadId" in kwargs:
+            self.api_calls["list_thread"] += 1
+            messages = [m for m in self.messages if m["threadId"] == kwargs["threadId"]]
+        else:
+            self.api_calls["list_emails"] += 1
+            messages = self.messages
+        messages = sorted(messages, key=lambda m: -int(m["receivedTime"]))[:limit]
+        # Parsed into records like ZohoEmailHandler.list_emails does
+        return {"data": [EmailRecord.from_api(m) for m in messages]}
+
+    async def get_email_content(self, message_id, folder_id):
+        await asyncio.sleep(self.latency)
+        self.api_calls["get_email_content"] += 1
+        return {"data": {"content": f"<p>Hi, could I get a price for a deep clean? ({message_id})</p>"}}
+
+    async def create_draft(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.api_calls["create_draft"] += 1
+        return {"data": {"messageId": f"draft_{kwargs.get('thread_id')}"}}
+
+async def run_mode(mode, args, state_dir):
+    handler = ZohoMailHandler()
+    handler.email_handler = SimulatedZoho(args.threads, args.emails_per_thread, args.zoho_latency)
+    handler.content_cache = EmailContentCache(os.path.join(state_dir, f"{mode}_cache.db"))
+    handler.state_store = EmailStateStore(os.path.join(state_dir, f"{mode}_state.db"))
+    handler.responded_emails = handler.state_store.view(RESPONDED)
+    handler.spam_emails = handler.state_store.view(SPAM)
+    handler.pipeline_config = dict(handler.pipeline_config, pipeline_mode=mode)
+
+    # Jittered latencies with the same seed in both modes
+    rng = random.Random(args.seed)
+
+    async def classify_email(email, content):
+        await asyncio.sleep(args.llm_latency * rng.uniform(0.5, 1.5))
+        return {"is_cleaning_related": True, "needs_response": True, "reason": "simulated"}
+
+    async def create_draft_response(latest_email, thread, thread_id, create_draft=True):
+        await asyncio.sleep(args.llm_latency * 3 * rng.uniform(0.5, 1.5))
+        return {"response": "<p>Thanks for getting in touch, here is your quote.</p>"}
+
+    handler.classify_email = classify_email
+    handler.create_draft_response = create_draft_response
+    return await handler.process_emails(limit=args.threads * args.emails_per_thread)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=30, help="number of simulated threads")
+    parser.add_argument("--emails-per-thread", type=int, default=2, help="emails in each thread")
+    parser.add_argument("--zoho-latency", type=float, default=0.2, help="seconds per simulated Zoho request")
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="seconds per simulated classification")
+    parser.add_argument("--seed", type=int, default=7, help="seed for the latency jitter")
+    args = parser.parse_args()
+
+    summaries = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        for mode in ("barrier", "streaming"):
+            result = await run_mode(mode, args, state_dir)
+            summaries.append((mode, result))
+
+    print()
+    for mode, result in summaries:
+        first_draft = result["first_draft_seconds"]
+        print(f"{mode:>10}: first draft after {'n/a' if first_draft is None else f'{first_draft:6.2f}s'}, "
+              f"total {result['total_seconds']:6.2f}s, {result['threads_processed']} drafts")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark: accuracy and speed of the local email pre-classifier
+
+Stores --emails labelled synthetic emails per label (customer enquiries that
+need a response, short confirmations that do not, and sales spam and
+newsletters) in an EmailPreClassifier in a temporary directory, as the LLM
+classifier would through record_label, then trains it and runs evaluate(),
+the precision/recall report printed by
+`python -m app.api.services.zoho.preclassifier`. It also times classify()
+over every stored email.
+
+Exits with status 1 if evaluate() fails or holds out no emails, or if the
+precision of a label decided locally is below --min-precision.
+
+Usage:
+    python benchmarks/preclassifier_accuracy.py --emails 100
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.api.services.zoho.preclassifier import (
+    CLASSIFICATIONS, EmailPreClassifier, LABEL_NEEDS_RESPONSE, LABEL_NO_RESPONSE, LABEL_SPAM
+)
+from app.api.services.zoho.records import EmailRecord
+from synthetic_inbox import JOBS, REPLIES, TOWNS
+
+NAMES = ["mary", "john", "sean", "aoife", "ciara", "declan"]
+SPAM_OFFERS = [
+    "We can get your website ranked first on Google within 30 days, reply for a free SEO audit.",
+    "Boost your bookings with our lead generation service, no setup fees this month.",
+    "Our marketing agency builds websites for cleaning companies, book a call with our team.",
+]
+NEWSLETTER = "This week's industry news and offers. Unsubscribe or manage your email preferences here."
+CONFIRMATIONS = ["Thanks, see you then.", "Perfect, thank you.", "Sounds good, thanks!", "Confirmed, thanks a million."]
+
+def labelled_emails(per_label: int, seed: int):
+    """Yield (email, content, label) tuples, per_label of each label"""
+    rng = random.Random(seed)
+    for index in range(per_label):
+        name, town, job = rng.choice(NAMES), rng.choice(TOWNS), rng.choice(JOBS)
+        customer = f"{name}.{index}@gmail.com"
+        yield (EmailRecord(f"needs_{index}", subject=f"Quote for {job}", from_address=customer),
+               f"Hi, could you give me a price for {job} in {town}? {rng.choice(REPLIES)}", LABEL_NEEDS_RESPONSE)
+        yield (EmailRecord(f"confirm_{index}", subject=f"Re: Your cleaning booking in {town}", from_address=customer),
+               rng.choice(CONFIRMATIONS), LABEL_NO_RESPONSE)
+        if index % 4:
+            sender, content = f"sales@growth{index % 7}.example", rng.choice(SPAM_OFFERS)
+        else:
+            sender, content = "newsletter@cleaningnews.example", NEWSLETTER
+        yield (EmailRecord(f"spam_{index}", subject="Grow your cleaning business", from_address=sender),
+               content, LABEL_SPAM)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=100, help="labelled emails per label")
+    parser.add_argument("--min-precision", type=float, default=0.95,
+                        help="lowest acceptable precision of a label decided locally")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    examples = list(labelled_emails(args.emails, args.seed))
+    problems = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        preclassifier = EmailPreClassifier(data_dir, min_examples=5)
+        for email, content, label in examples:
+            preclassifier.record_label(email, content, CLASSIFICATIONS[label])
+        if not preclassifier.train():
+            problems.append("the model was not trained")
+
+        report = preclassifier.evaluate()
+        print(json.dumps(report, indent=2))
+
+        started = time.perf_counter()
+        for email, content, _ in examples:
+            preclassifier.classify(email, content)
+        seconds = time.perf_counter() - started
+        preclassifier.conn.close()
+
+    stats = preclassifier.stats()
+    print(f"classify: {len(examples) / seconds:.0f} emails/s, {stats['llm_calls_avoided']} of "
+          f"{stats['checked']} decided locally (rules {stats['rule_hits']}, model {stats['model_hits']})")
+
+    if not report["test_examples"]:
+        problems.append("evaluate() held out no emails")
+    for label, scores in report["labels"].items():
+        if scores["precision"] is not None and scores["precision"] < args.min_precision:
+            problems.append(f"{label} precision {scores['precision']} is below {args.min_precision}")
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
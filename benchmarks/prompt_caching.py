@@ -0,0 +1,171 @@
+"""
+Benchmark: prompt prefix stability and prompt cache hits of the agents
+
+Runs --processes app processes one after the other against fake_openai.py and
+fake_chatwoot.py, as separate workers or restarts would. Each replays
+--conversations live-chat conversations of --messages messages through
+ChatwootConversationManager.process_message, so the real Lisa agent answers
+them, and drafts a response to each thread of a synthetic mailbox of
+--threads threads with ZohoMailHandler.create_draft_response, without
+creating drafts. Every process gets conversations and threads of its own.
+
+The fake keeps every request it was sent, and the requests are checked:
+
+    one system message per agent, the same in every process and at any time
+    each turn of a conversation starts with the whole request of the turn before
+
+so everything before the newest message is a prefix the provider can serve
+from its prompt cache. The fake simulates that cache (see fake_openai.py),
+and the cached share of the prompt tokens is then read back per agent from
+the usage the app recorded (app/utils/llm_usage.py), as GET /llm-usage
+reports it. Exits with status 1 if a check fails or the cached share is
+below --min-cached-ratio.
+
+Usage:
+    python benchmarks/prompt_caching.py --processes 2 --conversations 10 --messages 4 --threads 10
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_chatwoot import FakeChatwoot
+from fake_openai import FakeOpenAI, offline_agent_environment
+from fake_server import BackgroundServer
+from synthetic_inbox import generate_inbox
+from live_chat_load import CUSTOMER_MESSAGES, build_webhook
+from logging_overhead import CHILD_ENVIRONMENT
+
+def digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+def check_requests(bodies) -> dict:
+    """Distinct system messages per agent and the turns that do not extend the turn before"""
+    system_messages = defaultdict(set)
+    earlier = set()
+    turns = broken = 0
+    for body in bodies:
+        messages = body["messages"]
+        # An agent is known by its tools and response format
+        agent = digest([body.get("tools"), body.get("response_format")])
+        system_messages[agent].update(
+            digest(message) for message in messages if message["role"] in ("system", "developer")
+        )
+        # A later turn resends the previous request, then the reply to it and the new message
+        if sum(1 for message in messages if message["role"] == "user") > 1:
+            turns += 1
+            if digest(messages[:-2]) not in earlier:
+                broken += 1
+        earlier.add(digest(messages))
+    return {
+        "agents": len(system_messages),
+        "unstable_agents": sum(1 for variants in system_messages.values() if len(variants) > 1),
+        "turns": turns,
+        "broken_turns": broken,
+    }
+
+async def draft_responses(args):
+    from app.api.services.zoho.handler import ZohoMailHandler
+    from app.api.services.zoho.records import EmailRecord
+
+    inbox = generate_inbox(args.threads, seed=args.seed + args.process)
+    threads = defaultdict(list)
+    for message in sorted(inbox.messages, key=lambda message: int(message["receivedTime"])):
+        email = EmailRecord.from_api(message)
+        email.content = inbox.contents.get(email.message_id, "")
+        threads[email.thread_id].append(email)
+    handler = ZohoMailHandler()
+    for thread_id, thread in threads.items():
+        await handler.create_draft_response(thread[-1], thread, thread_id, create_draft=False)
+    handler.close()
+
+def run_child(args):
+    from app.utils.logger import setup_logging
+    setup_logging("CRITICAL")
+    from app.api.services.chatwoot.handler import conversation_manager
+    from app.utils.llm_usage import close_llm_usage
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for conversation in range(args.conversations):
+            conversation_id = 10000 * (args.process + 1) + conversation
+            for index in range(args.messages):
+                content = CUSTOMER_MESSAGES[(conversation + index) % len(CUSTOMER_MESSAGES)]
+                result = conversation_manager.process_message(build_webhook(conversation_id, index, content))
+                if result.get("status") != "success":
+                    raise RuntimeError(f"conversation {conversation_id}: {result}")
+        asyncio.run(draft_responses(args))
+    close_llm_usage()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=2, help="app processes run one after the other")
+    parser.add_argument("--conversations", type=int, default=10, help="live-chat conversations per process")
+    parser.add_argument("--messages", type=int, default=4, help="customer messages per conversation")
+    parser.add_argument("--threads", type=int, default=10, help="mail threads drafted per process")
+    parser.add_argument("--min-cached-ratio", type=float, default=0.5,
+                        help="lowest acceptable share of cached prompt tokens over all agents")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--process", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    fake_openai = FakeOpenAI({"default": "fixed:0"}, seed=args.seed, keep_requests=True)
+    fake_chatwoot = FakeChatwoot({"default": "fixed:0"}, seed=args.seed)
+    with BackgroundServer(fake_openai, fake_chatwoot) as server, tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, **CHILD_ENVIRONMENT, **offline_agent_environment(f"{server.base_url}/v1", work_dir))
+        env.update({
+            "CHATWOOT_BASE_URL": server.base_url,
+            "CHATWOOT_API_TOKEN": "benchmark",
+            "CHATWOOT_ACCOUNT_ID": "1",
+            "AGENT_DEBUG_MODE": "false",
+        })
+        for process in range(args.processes):
+            command = [sys.executable, __file__, "--child", "--process", str(process),
+                       "--conversations", str(args.conversations), "--messages", str(args.messages),
+                       "--threads", str(args.threads), "--seed", str(args.seed)]
+            # The child's data/ directory goes in the work directory
+            subprocess.run(command, env=env, cwd=work_dir, check=True)
+
+        from app.utils.llm_usage import LLMUsageStore
+        store = LLMUsageStore(env["LLM_USAGE_DB_PATH"])
+        by_agent = store.summary("agent", order_by="prompt_tokens")
+        store.close()
+
+    checks = check_requests(fake_openai.bodies)
+    print(f"{args.processes} processes, {len(fake_openai.bodies)} requests: {checks['agents']} agents, "
+          f"{checks['unstable_agents']} with more than one system message; {checks['turns']} later turns, "
+          f"{checks['broken_turns']} not extending the turn before")
+    print(f"{'agent':<22} {'requests':>8} {'prompt':>9} {'cached':>9} {'ratio':>6} {'uncached/req':>13}")
+    for row in by_agent["rows"] + [dict(by_agent["totals"], agent="total")]:
+        uncached = (row["prompt_tokens"] - row["cached_tokens"]) / row["requests"] if row["requests"] else 0
+        print(f"{row['agent']:<22} {row['requests']:8} {row['prompt_tokens']:9} {row['cached_tokens']:9} "
+              f"{row['cached_ratio']:6.1%} {uncached:13.0f}")
+    print(f"fake OpenAI: {fake_openai.prompt_tokens} prompt tokens, {fake_openai.cached_tokens} cached")
+
+    problems = []
+    if checks["unstable_agents"]:
+        problems.append("an agent's system message changed between requests")
+    if checks["broken_turns"]:
+        problems.append("a conversation turn does not start with the request before it")
+    if by_agent["totals"]["cached_ratio"] < args.min_cached_ratio:
+        problems.append(f"cached ratio {by_agent['totals']['cached_ratio']:.1%} is below {args.min_cached_ratio:.0%}")
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark: pure-Python hot paths of the Zoho pipeline steps
+
+Times the step functions on synthetic inboxes (see synthetic_inbox.py) of
+each size in --sizes threads, without any network or LLM calls:
+
+    organize_emails_by_thread   per thread, thread listings served from memory
+    filter_threads              per thread
+    clean_html                  per message body
+    remove_quoted_content       per cleaned message body
+    clean_email_address         per address
+    format_emails_for_agent     per thread (ZohoMailHandler._format_emails_for_agent)
+
+For each it reports ops/sec (best of --repeat samples of at least
+--min-seconds) and the tracemalloc peak of one pass. --save-baseline writes the results as JSON; --baseline
+compares against a saved file and exits with status 1 when a function got
+slower, or its peak memory grew, by more than --tolerance.
+
+Usage:
+    python benchmarks/step_functions.py --sizes 100,1000,10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/step_functions.py --sizes 100,1000,10000 --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_inbox import generate_inbox, COMPANY_EMAIL_ADDRESSES, QUOTING_STYLES
+
+os.environ.setdefault("ZOHO_ACCOUNT_ID", "benchmark")
+
+from app.api.services.zoho.handler import ZohoMailHandler
+from app.api.services.zoho.records import EmailRecord
+from app.api.services.zoho.steps import (
+    organize_emails_by_thread,
+    filter_threads,
+    clean_html,
+    remove_quoted_content,
+    clean_email_address
+)
+from app.utils.memory_cache import MemoryCache
+
+COLORS = {name: "" for name in ("RED", "GREEN", "YELLOW", "BLUE", "MAGENTA", "CYAN", "WHITE", "RESET")}
+
+class InboxHandler:
+    """Serves thread listings from a synthetic inbox, parsed into records like ZohoEmailHandler does"""
+
+    def __init__(self, inbox):
+        self.inbox = inbox
+
+    async def list_emails(self, limit=20, **kwargs):
+        messages = self.inbox.thread_listing(kwargs["threadId"], limit)
+        return {"data": [EmailRecord.from_api(message) for message in messages]}
+
+def build_cases(inbox):
+    """Return {name: (function running one pass, ops per pass)} for one inbox"""
+    handler = InboxHandler(inbox)
+    listing = inbox.listing(len(inbox.messages))
+    bodies = list(inbox.contents.values())
+    cleaned = [clean_html(body) for body in bodies]
+    addresses = [message["fromAddress"] for message in listing] + [message["toAddress"] for message in listing]
+    # What steps 2 and 3 hand to the later steps, built once for the passes that need it
+    full_threads = asyncio.run(organize(handler, listing))
+    customer_threads = list(filter_threads(full_threads, COMPANY_EMAIL_ADDRESSES, set(), set(), COLORS).values())
+    for thread in customer_threads:
+        thread.history = list(reversed(thread.emails))
+        for email in thread.history:
+            email.content = remove_quoted_content(clean_html(inbox.contents[email.message_id]))
+    # _format_emails_for_agent only reads the company addresses from the handler
+    mail_handler = SimpleNamespace(company_email_addresses=COMPANY_EMAIL_ADDRESSES)
+
+    def run_organize():
+        asyncio.run(organize(handler, listing))
+
+    def run_filter():
+        filter_threads(full_threads, COMPANY_EMAIL_ADDRESSES, set(), set(), COLORS)
+
+    def run_clean_html():
+        for body in bodies:
+            clean_html(body)
+
+    def run_remove_quoted():
+        for text in cleaned:
+            remove_quoted_content(text)
+
+    def run_clean_address():
+        for address in addresses:
+            clean_email_address(address)
+
+    def run_format():
+        for thread in customer_threads:
+            ZohoMailHandler._format_emails_for_agent(mail_handler, thread.history, thread.latest_email)
+
+    return {
+        "organize_emails_by_thread": (run_organize, len(full_threads)),
+        "filter_threads": (run_filter, len(full_threads)),
+        "clean_html": (run_clean_html, len(bodies)),
+        "remove_quoted_content": (run_remove_quoted, len(cleaned)),
+        "clean_email_address": (run_clean_address, len(addresses)),
+        "format_emails_for_agent": (run_format, len(customer_threads)),
+    }
+
+async def organize(handler, listing):
+    recent_emails = {"data": [EmailRecord.from_api(message) for message in listing]}
+    return await organize_emails_by_thread(
+        recent_emails, handler, set(), COLORS, thread_cache=MemoryCache(len(listing) + 1, 3600)
+    )
+
+def measure(func, ops, repeat, min_seconds):
+    """Return ops/sec (best of `repeat` samples) and the tracemalloc peak in KB of one pass"""
+    best = float("inf")
+    for _ in range(repeat):
+        # Small inboxes run several passes per sample so timer noise does not dominate
+        passes = 0
+        started = time.perf_counter()
+        while True:
+            func()
+            passes += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        best = min(best, elapsed / passes)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops": ops, "ops_per_sec": round(ops / best, 1) if best else None, "peak_kb": round(peak / 1024, 1)}
+
+def compare(results, baseline, tolerance):
+    """Print the change against the baseline; returns the number of regressions"""
+    regressions = 0
+    for size, functions in results.items():
+        for name, result in functions.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            speed = result["ops_per_sec"] / before["ops_per_sec"] - 1
+            memory = result["peak_kb"] / before["peak_kb"] - 1 if before["peak_kb"] else 0.0
+            flag = ""
+            if speed < -tolerance or memory > tolerance:
+                regressions += 1
+                flag = "  REGRESSION"
+            print(f"  {size:>6} threads {name:<26} ops/sec {speed:+7.1%}  peak {memory:+7.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated thread counts")
+    parser.add_argument("--thread-length", type=int, default=4, help="maximum messages per thread")
+    parser.add_argument("--html-size", type=int, default=2000, help="approximate HTML size of each body")
+    parser.add_argument("--quoting", choices=QUOTING_STYLES, default="mixed", help="how replies quote earlier messages")
+    parser.add_argument("--repeat", type=int, default=5, help="timed samples per function, the best one counts")
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum duration of each sample")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    inbox_args = {"thread_length": args.thread_length, "html_size": args.html_size,
+                  "quoting": args.quoting, "seed": args.seed}
+    results = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        inbox = generate_inbox(size, **inbox_args)
+        print(f"{size} threads, {len(inbox.messages)} messages:")
+        # The step functions log every thread; keep that out of the timings
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            cases = build_cases(inbox)
+            measured = {name: measure(func, ops, args.repeat, args.min_seconds) for name, (func, ops) in cases.items()}
+        for name, result in measured.items():
+            print(f"  {name:<26} {result['ops_per_sec']:>12,.0f} ops/sec  peak {result['peak_kb']:>10,.1f} KB "
+                  f"({result['ops']} ops)")
+        results[str(size)] = measured
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({
+            "inbox": inbox_args,
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "results": results
+        }, indent=2))
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("inbox") != inbox_args:
+            print(f"Warning: baseline was recorded with different inbox settings: {baseline.get('inbox')}")
+        print(f"Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"FAIL: {regressions} regressions")
+            sys.exit(1)
+        print("OK: no regressions")
+
+if __name__ == "__main__":
+    main()
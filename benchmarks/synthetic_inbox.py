@@ -0,0 +1,151 @@
+"""
+Deterministic synthetic Zoho inbox shared by the benchmarks
+
+generate_inbox() builds threads of customer enquiries and company replies with
+the fields the Zoho messages/view listing returns, plus an HTML body for every
+message. The same arguments and seed always give the same inbox.
+
+Quoting styles control how replies include the previous message:
+
+    none     no quoted text
+    gmail    "On <date>, <name> <address> wrote:" followed by a blockquote
+    outlook  a From: / Sent: / To: / Subject: header block
+    mixed    gmail, outlook or none, picked per message
+"""
+import random
+from typing import Dict, List, Optional
+
+QUOTING_STYLES = ("none", "gmail", "outlook", "mixed")
+
+COMPANY_ADDRESS = "info@deepcleaning.ie"
+COMPANY_EMAIL_ADDRESSES = ["customers@deepcleaning.ie", "info@deepcleaning.ie"]
+FOLDER_ID = "5412000000002014"
+
+TOWNS = ["Naas", "Bray", "Swords", "Dublin 8", "Maynooth", "Greystones"]
+JOBS = ["a deep clean", "an end of tenancy clean", "an after builders clean", "an oven clean", "a carpet clean"]
+REPLIES = [
+    "Thanks for the quote, could you come on a Saturday?",
+    "Is the fridge included in the price?",
+    "Thursday at 10am works for us, thanks!",
+    "Could you send me the price including VAT?",
+]
+PADDING_BLOCK = (
+    '<div style="font-family:Arial;color:#333"><p style="margin:0">We are moving out at the end of the month '
+    'and the landlord wants the place spotless &amp; ready for inspection.</p><br/>'
+    '<img src="https://example.com/signature.png" width="120"></div>\n'
+)
+
+class SyntheticInbox:
+    """Messages newest first, the listing of each thread, and the HTML body of each message"""
+
+    def __init__(self, messages: List[Dict], contents: Dict[str, str]):
+        self.messages = messages
+        self.contents = contents
+        self.threads: Dict[str, List[Dict]] = {}
+        for message in messages:
+            if message["threadId"]:
+                self.threads.setdefault(message["threadId"], []).append(message)
+
+    def listing(self, limit: int) -> List[Dict]:
+        return self.messages[:limit]
+
+    def thread_listing(self, thread_id: str, limit: int) -> List[Dict]:
+        return self.threads.get(thread_id, [])[:limit]
+
+def _quote_header(style: str, previous: Dict, rng: random.Random) -> str:
+    if style == "gmail":
+        return (
+            '<div class="gmail_quote"><div dir="ltr" class="gmail_attr">On Tue, 4 Jun 2024 at 09:30, '
+            f'{previous["fromName"]} &lt;<a href="mailto:{previous["fromAddress"]}">{previous["fromAddress"]}</a>&gt; '
+            'wrote:<br></div><blockquote class="gmail_quote" style="margin:0px 0px 0px 0.8ex">'
+        )
+    if style == "outlook":
+        return (
+            f'<hr><div id="divRplyFwdMsg"><b>From:</b> {previous["fromName"]} &lt;{previous["fromAddress"]}&gt;<br>'
+            f'<b>Sent:</b> Monday {rng.randint(1, 28)} June 2024 10:12<br>'
+            f'<b>To:</b> {previous["toAddress"]}<br><b>Subject:</b> {previous["subject"]}</div>'
+        )
+    return ""
+
+def _build_body(text: str, html_size: int, style: str, previous: Optional[Dict], previous_body: str,
+                rng: random.Random) -> str:
+    body = f'<div dir="ltr">{text}</div>'
+    while len(body) < html_size:
+        body += PADDING_BLOCK
+    body += '<div><br></div><div>Thanks,<br>' + rng.choice(["Mary", "John", "Sean", "Aoife"]) + '</div>'
+    if previous is not None and style != "none":
+        body += _quote_header(style, previous, rng) + previous_body
+        if style == "gmail":
+            body += '</blockquote></div>'
+    return body
+
+def generate_inbox(threads: int, thread_length: int = 4, html_size: int = 2000, quoting: str = "mixed",
+                   seed: int = 1, standalone_ratio: float = 0.05, max_messages: Optional[int] = None) -> SyntheticInbox:
+    """
+    Build an inbox of `threads` threads, each with 1 to thread_length messages
+
+    Messages alternate between the customer and the company, so about half of the
+    threads end with a company reply. A standalone_ratio share of the threads are
+    single contact-form messages without a thread ID, sent by the company to itself.
+    html_size is the approximate size of each body before quoted text.
+    """
+    if quoting not in QUOTING_STYLES:
+        raise ValueError(f"Unknown quoting style {quoting!r}, expected one of {QUOTING_STYLES}")
+    rng = random.Random(seed)
+    messages = []
+    contents = {}
+    received = 1_700_000_000_000
+
+    for thread in range(threads):
+        customer = f"customer{thread}@example.com"
+        customer_name = f"Customer {thread}"
+        subject = f"Quote for {rng.choice(JOBS)} in {rng.choice(TOWNS)}"
+        standalone = rng.random() < standalone_ratio
+        length = 1 if standalone else rng.randint(1, max(1, thread_length))
+        previous = None
+        previous_body = ""
+
+        for index in range(length):
+            received += rng.randint(1000, 600000)
+            from_company = standalone or index % 2 == 1
+            style = rng.choice(QUOTING_STYLES[:3]) if quoting == "mixed" else quoting
+            if standalone:
+                text = f"Name: {customer_name}<br>Email: {customer}<br>Message: Price for {rng.choice(JOBS)}?"
+            elif from_company:
+                text = f"Dear {customer_name},<br>Thank you for your enquiry, the price would be €{rng.randint(90, 400)}."
+            else:
+                text = rng.choice(REPLIES) if index else f"Hi, could I get a price for {rng.choice(JOBS)}?"
+
+            message = {
+                "summary": text[:100],
+                "sentDateInGMT": str(received - 3600000),
+                "calendarType": 0,
+                "subject": subject if index == 0 else f"Re: {subject}",
+                "messageId": str(received * 10 + index),
+                "flagid": "flag_not_set",
+                "status2": "0",
+                "priority": "3",
+                "hasInline": "false",
+                "toAddress": f"&lt;{customer}&gt;" if from_company and not standalone else f"&lt;{COMPANY_ADDRESS}&gt;",
+                "folderId": FOLDER_ID,
+                "ccAddress": "Not Provided",
+                "hasAttachment": "0",
+                "size": str(rng.randint(2000, 90000)),
+                "sender": COMPANY_ADDRESS if from_company else customer,
+                "receivedTime": str(received),
+                "fromAddress": COMPANY_ADDRESS if from_company else customer,
+                "status": "1",
+                "threadCount": "0",
+                "threadId": "" if standalone else f"54120000{thread:08d}",
+                "tagIds": [],
+                "fromName": "Deep Cleaning" if from_company else customer_name,
+            }
+            body = _build_body(text, html_size, style, previous, previous_body, rng)
+            messages.append(message)
+            contents[message["messageId"]] = body
+            previous, previous_body = message, body
+
+    if max_messages is not None:
+        messages = messages[:max_messages]
+    messages.sort(key=lambda message: -int(message["receivedTime"]))
+    return SyntheticInbox(messages, {message["messageId"]: contents[message["messageId"]] for message in messages})
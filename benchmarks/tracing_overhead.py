@@ -0,0 +1,194 @@
+"""
+Benchmark: cost and validity of webhook traces (app/utils/tracing.py)
+
+Runs ZohoMailHandler.process_emails under a root span, as the /zoho-mails/
+route does, over a synthetic mailbox of --threads threads served by
+fake_zoho.py without latency, with the LLM calls simulated as instant, as
+benchmarks/logging_overhead.py does. Each round runs one webhook traced and
+one with the trace sampled out, in every --modes pipeline mode, and it
+reports the median wall time of both, the spans per trace and the size of the
+exported files. The difference is usually below the run to run noise, so it
+also times opening and closing one span inside and outside a trace.
+
+Every written trace file is then checked: one root span, every other span's
+parent present and enclosing it, and in the Chrome format spans on the same
+lane either nested or apart, so viewers draw them as a call tree. Exits with
+status 1 if a check fails.
+
+Open the files with chrome://tracing or https://ui.perfetto.dev (chrome), or
+any OTLP/JSON consumer (otlp).
+
+Usage:
+    python benchmarks/tracing_overhead.py --threads 50 --rounds 5
+    python benchmarks/tracing_overhead.py --format otlp --keep traces/
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import BackgroundServer
+from fake_zoho import FakeZoho
+from synthetic_inbox import generate_inbox
+from logging_overhead import CHILD_ENVIRONMENT, build_handler
+
+# Slack for the clock reads of a child span and its parent, in microseconds
+TOLERANCE_US = 50
+
+def spans_of(document, export_format: str):
+    """(span_id, parent_id, start_us, end_us, lane) of every span in an exported trace"""
+    if export_format == "chrome":
+        return [
+            (event["args"]["span_id"], event["args"]["parent_id"], event["ts"], event["ts"] + event["dur"], event["tid"])
+            for event in document["traceEvents"] if event["ph"] == "X"
+        ]
+    spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    return [
+        (span["spanId"], span.get("parentSpanId"), int(span["startTimeUnixNano"]) / 1000,
+         int(span["endTimeUnixNano"]) / 1000, None)
+        for span in spans
+    ]
+
+def check_trace(path: str, export_format: str) -> list:
+    with open(path, encoding="utf-8") as trace_file:
+        spans = spans_of(json.load(trace_file), export_format)
+    problems = []
+    by_id = {span[0]: span for span in spans}
+    roots = [span for span in spans if span[1] is None]
+    if len(roots) != 1:
+        problems.append(f"{path}: {len(roots)} root spans")
+    for span_id, parent_id, start, end, _ in spans:
+        if parent_id is None:
+            continue
+        parent = by_id.get(parent_id)
+        if parent is None:
+            problems.append(f"{path}: parent of {span_id} missing")
+        elif start < parent[2] - TOLERANCE_US or end > parent[3] + TOLERANCE_US:
+            problems.append(f"{path}: span {span_id} outside its parent")
+    lanes = {}
+    for span in sorted(spans, key=lambda span: (span[2], -span[3])):
+        if span[4] is None:
+            continue
+        stack = lanes.setdefault(span[4], [])
+        while stack and stack[-1][3] <= span[2] + TOLERANCE_US:
+            stack.pop()
+        if stack and span[3] > stack[-1][3] + TOLERANCE_US:
+            problems.append(f"{path}: span {span[0]} overlaps {stack[-1][0]} on lane {span[4]}")
+        stack.append(span)
+    return problems
+
+def span_cost() -> tuple:
+    """Median seconds of one span inside a trace and outside of any"""
+    from app.utils.tracing import Trace, span, _current_span
+
+    def one_span():
+        with span("zoho get_email", endpoint="get_email"):
+            pass
+
+    def per_call(calls=20000):
+        batches = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(calls):
+                one_span()
+            batches.append((time.perf_counter() - started) / calls)
+        return statistics.median(batches)
+
+    token = _current_span.set(Trace(10 ** 6).open("benchmark", None, {}))
+    try:
+        inside = per_call()
+    finally:
+        _current_span.reset(token)
+    return inside, per_call()
+
+async def run_rounds(args, state_dir):
+    from app.utils.tracing import get_tracer, start_trace
+    tracer = get_tracer()
+    samples = {(mode, traced): [] for mode in args.modes for traced in (True, False)}
+    index = 0
+    for round_index in range(args.warmup + args.rounds):
+        for mode in args.modes:
+            # Alternate which goes first, so neither always runs right after the other
+            for traced in ((True, False) if round_index % 2 else (False, True)):
+                handler = build_handler(state_dir, index)
+                handler.pipeline_config = dict(handler.pipeline_config, pipeline_mode=mode)
+                index += 1
+                tracer.sample_rate = 1.0 if traced else 0.0
+                started = time.perf_counter()
+                with start_trace("POST /zoho-mails/", source="benchmark", mode=mode):
+                    await handler.process_emails(limit=args.limit)
+                if round_index >= args.warmup:
+                    samples[(mode, traced)].append(time.perf_counter() - started)
+                handler.close()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50, help="threads in the synthetic mailbox")
+    parser.add_argument("--rounds", type=int, default=5, help="measured webhooks per mode, traced and not")
+    parser.add_argument("--warmup", type=int, default=1, help="rounds run before measuring")
+    parser.add_argument("--modes", default="barrier,streaming", help="comma separated pipeline modes")
+    parser.add_argument("--format", choices=("chrome", "otlp"), default="chrome", help="trace file format")
+    parser.add_argument("--keep", help="directory to keep the trace files in (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    args.modes = args.modes.split(",")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        trace_dir = args.keep or os.path.join(work_dir, "traces")
+        os.environ.update(CHILD_ENVIRONMENT)
+        os.environ.update({"TRACING_ENABLED": "true", "TRACING_DIR": trace_dir, "TRACING_FORMAT": args.format,
+                           "TRACING_MAX_FILES": "100000"})
+        from app.utils.logger import setup_logging
+        from app.utils.tracing import close_tracer, get_tracer
+        setup_logging("CRITICAL")
+
+        fake = FakeZoho(generate_inbox(args.threads, seed=args.seed), {"default": "fixed:0"}, seed=args.seed)
+        with BackgroundServer(fake) as server:
+            os.environ["ZOHO_MAIL_BASE_URL"] = server.base_url
+            os.environ["ZOHO_ACCOUNTS_BASE_URL"] = server.base_url
+            args.limit = len(fake.inbox.messages)
+            samples = asyncio.run(run_rounds(args, work_dir))
+        stats = get_tracer().stats()
+        close_tracer()
+        inside, outside = span_cost()
+
+        paths = sorted(glob.glob(os.path.join(trace_dir, "trace-*.json")))
+        span_counts = []
+        problems = []
+        for path in paths:
+            with open(path, encoding="utf-8") as trace_file:
+                span_counts.append(len(spans_of(json.load(trace_file), args.format)))
+            problems.extend(check_trace(path, args.format))
+        size_kb = statistics.median(os.path.getsize(path) for path in paths) / 1024 if paths else 0.0
+
+    print(f"{args.threads} threads, {args.rounds} rounds, {args.format} traces: {len(paths)} written, "
+          f"{stats['dropped']} dropped, median {statistics.median(span_counts) if span_counts else 0:.0f} spans "
+          f"and {size_kb:.1f} KB per trace")
+    print(f"one span: {inside * 1e6:.1f} us in a trace, {outside * 1e6:.1f} us outside, about "
+          f"{inside * statistics.median(span_counts or [0]) * 1000:.2f} ms per traced webhook")
+    print(f"{'mode':<10} {'traced ms':>10} {'untraced ms':>12} {'+ms':>7}")
+    for mode in args.modes:
+        traced = statistics.median(samples[(mode, True)]) * 1000
+        untraced = statistics.median(samples[(mode, False)]) * 1000
+        print(f"{mode:<10} {traced:10.1f} {untraced:12.1f} {traced - untraced:+7.1f}")
+
+    expected = (args.warmup + args.rounds) * len(args.modes)
+    if len(paths) != expected:
+        problems.append(f"{len(paths)} trace files written, expected {expected}")
+    for problem in problems[:5]:
+        print(f"FAILED: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
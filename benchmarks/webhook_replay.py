@@ -0,0 +1,155 @@
+"""
+Replay captured webhooks against a running instance
+
+Reads the gzip JSONL files written with WEBHOOK_CAPTURE_ENABLED=true
+(app/utils/webhook_capture.py), in arrival order, and posts each raw payload
+to the same path on --url. At --speed 1 the requests keep their original
+spacing; at --speed N the gaps are N times shorter; at --speed max they are
+sent as fast as --concurrency allows. Requests are sent on schedule whether or
+not earlier ones have returned, as production traffic would be.
+
+Reports the latency percentiles per source (live-chat, zoho-mails), the
+status codes, and, unless --speed is max, how late requests left compared to
+their schedule, which shows when the client itself could not keep up.
+
+Exits with status 1 if a request failed or returned a non-2xx status.
+
+Usage:
+    python benchmarks/webhook_replay.py data/webhook_capture --url http://127.0.0.1:8000 --speed 1
+    python benchmarks/webhook_replay.py capture.jsonl.gz --speed 10 --source live-chat
+    python benchmarks/webhook_replay.py data/webhook_capture --speed max --concurrency 20
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_server import percentile
+
+def capture_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl.gz"))))
+        else:
+            files.append(path)
+    return files
+
+def read_capture(path: str) -> List[Dict[str, Any]]:
+    """The records of one file; a file still open by the app ends without a gzip trailer"""
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as capture_file:
+            for line in capture_file:
+                if line.strip():
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # The last line of a truncated file
+                        pass
+    except (EOFError, zlib.error):
+        pass
+    return records
+
+def record_body(record: Dict[str, Any]) -> bytes:
+    if "body_b64" in record:
+        return base64.b64decode(record["body_b64"])
+    return record["body"].encode("utf-8")
+
+async def replay(records, args) -> Dict[str, Any]:
+    results = {"latencies": defaultdict(list), "statuses": Counter(), "errors": [], "lateness": []}
+    speed = None if args.speed == "max" else float(args.speed)
+    semaphore = asyncio.Semaphore(args.concurrency) if speed is None else None
+    first_ts = records[0]["ts"]
+
+    async def send(session, record, scheduled):
+        if semaphore is not None:
+            await semaphore.acquire()
+        else:
+            results["lateness"].append(max(0.0, time.perf_counter() - scheduled))
+        started = time.perf_counter()
+        try:
+            async with session.post(args.url.rstrip("/") + record["path"], data=record_body(record),
+                                    headers={"Content-Type": "application/json"}) as response:
+                await response.read()
+                results["statuses"][response.status] += 1
+                if not 200 <= response.status < 300:
+                    results["errors"].append(f"{record['path']}: HTTP {response.status}")
+        except Exception as e:
+            results["statuses"]["error"] += 1
+            results["errors"].append(f"{record['path']}: {e!r}")
+        finally:
+            results["latencies"][record.get("source", record["path"])].append(time.perf_counter() - started)
+            if semaphore is not None:
+                semaphore.release()
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+        tasks = []
+        for record in records:
+            scheduled = started + ((record["ts"] - first_ts) / speed if speed else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(session, record, scheduled)))
+        await asyncio.gather(*tasks)
+    results["elapsed"] = time.perf_counter() - started
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="capture files or directories of them")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the instance to replay against")
+    parser.add_argument("--speed", default="1", help="1 for real time, N for N times faster, or max")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at --speed max")
+    parser.add_argument("--source", action="append", help="only replay this source (repeatable)")
+    parser.add_argument("--limit", type=int, help="replay at most this many webhooks")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds before a request is abandoned")
+    args = parser.parse_args()
+    if args.speed != "max" and float(args.speed) <= 0:
+        parser.error("--speed must be positive or max")
+
+    records = [record for path in capture_files(args.paths) for record in read_capture(path)]
+    if args.source:
+        records = [record for record in records if record.get("source") in args.source]
+    records.sort(key=lambda record: record["ts"])
+    records = records[:args.limit] if args.limit else records
+    if not records:
+        print("No captured webhooks to replay")
+        sys.exit(1)
+
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"Replaying {len(records)} webhooks captured over {span:.1f}s to {args.url} at speed {args.speed}")
+    results = asyncio.run(replay(records, args))
+
+    sent = sum(results["statuses"].values())
+    print(f"Sent {sent} in {results['elapsed']:.1f}s ({sent / results['elapsed']:.2f} req/s), "
+          f"statuses {dict(results['statuses'])}")
+    for source, latencies in sorted(results["latencies"].items()):
+        print(f"  {source}: {len(latencies)} requests, p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+              f"max {max(latencies) * 1000:.0f} ms")
+    lateness = results["lateness"]
+    if lateness:
+        print(f"  send lateness: p50 {percentile(lateness, 0.5) * 1000:.1f} ms, "
+              f"p99 {percentile(lateness, 0.99) * 1000:.1f} ms, max {max(lateness) * 1000:.1f} ms")
+
+    for error in results["errors"][:5]:
+        print(f"FAILED: {error}")
+    sys.exit(1 if results["errors"] else 0)
+
+if __name__ == "__main__":
+    main()
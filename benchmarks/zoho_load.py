@@ -0,0 +1,176 @@
+"""
+Load test: the real Zoho pipeline against the local fake Zoho API
+
+Starts fake_zoho.py in-process with a seeded mailbox, points ZohoEmailHandler
+and ZohoAuthManager at it through ZOHO_MAIL_BASE_URL / ZOHO_ACCOUNTS_BASE_URL,
+and runs ZohoMailHandler.process_emails over the whole mailbox in each
+--modes pipeline mode. OpenAI is simulated with a jittered --llm-latency
+per classification (three times that per response); with --agents the real
+Zoho agents run instead, against fake_openai.py with --openai-latency, or
+with --cassette against responses recorded in an LLM cassette
+(app/utils/llm_cassette.py). The run state is kept in a temporary
+directory, and every mode starts from an empty one.
+
+For each mode it reports the threads and drafts per second, the client's
+Zoho API call counts, the requests the fake served per endpoint with their
+latency percentiles and status codes, and the seconds spent in each step.
+Barrier mode reports the wall time of each step; streaming mode reports
+the time the stage's workers were busy, summed over threads.
+
+Exits with status 1 if a run fails, if the fake did not receive every draft
+the handler reported as created, or (without injected faults) if the modes
+created different numbers of drafts.
+
+Usage:
+    python benchmarks/zoho_load.py --threads 200 --latency lognormal:0.15:0.5 --llm-latency 0.5
+    python benchmarks/zoho_load.py --threads 500 --throttle-rate 0.05 --modes streaming
+    python benchmarks/zoho_load.py --threads 100 --cassette zoho.jsonl --cassette-mode record
+    python benchmarks/zoho_load.py --threads 100 --cassette zoho.jsonl --cassette-latency zero
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# Make the project root importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_openai import FakeOpenAI, offline_agent_environment
+from fake_server import BackgroundServer, print_stats
+from fake_zoho import add_fake_arguments, build_fake
+
+os.environ.setdefault("ZOHO_ACCOUNT_ID", "5412000000001001")
+os.environ.setdefault("ZOHO_PRECLASSIFIER_ENABLED", "false")
+# Any values do; the fake only checks that a refresh token is sent
+os.environ.setdefault("ZOHO_CLIENT_ID", "load-test")
+os.environ.setdefault("ZOHO_CLIENT_SECRET", "load-test")
+os.environ.setdefault("ZOHO_REFRESH_TOKEN", "load-test")
+
+async def run_mode(mode, args, state_dir):
+    # Imported here, after main() has pointed the configuration at the fakes
+    from app.api.services.zoho.api import ZohoEmailHandler
+    from app.api.services.zoho.content_cache import EmailContentCache
+    from app.api.services.zoho.handler import ZohoMailHandler
+    from app.api.services.zoho.state_store import EmailStateStore, RESPONDED, SPAM
+    from app.utils.logger import setup_logging
+
+    # Only the first call configures logging, so every mode logs the same way
+    setup_logging(None if args.verbose else "CRITICAL")
+    handler = ZohoMailHandler()
+    # A client of its own, so drafts remembered from an earlier mode are not skipped as duplicates
+    handler.email_handler = ZohoEmailHandler()
+    handler.content_cache = EmailContentCache(os.path.join(state_dir, f"{mode}_cache.db"))
+    handler.state_store = EmailStateStore(os.path.join(state_dir, f"{mode}_state.db"))
+    handler.responded_emails = handler.state_store.view(RESPONDED)
+    handler.spam_emails = handler.state_store.view(SPAM)
+    handler.pipeline_config = dict(handler.pipeline_config, pipeline_mode=mode)
+    if not args.agents:
+        simulate_llm(handler, args)
+    try:
+        return await handler.process_emails(limit=args.limit)
+    finally:
+        handler.close()
+
+def simulate_llm(handler, args):
+    """Replace the agent calls with sleeps, jittered with the same seed in every mode"""
+    rng = random.Random(args.seed)
+
+    async def classify_email(email, content):
+        await asyncio.sleep(args.llm_latency * rng.uniform(0.5, 1.5))
+        return {"is_cleaning_related": True, "needs_response": True, "reason": "simulated"}
+
+    async def create_draft_response(latest_email, thread, thread_id, create_draft=True):
+        await asyncio.sleep(args.llm_latency * 3 * rng.uniform(0.5, 1.5))
+        return {"response": "<p>Thanks for getting in touch, here is your quote.</p>"}
+
+    handler.classify_email = classify_email
+    handler.create_draft_response = create_draft_response
+
+def report(mode, result, fake, fake_openai):
+    drafts = sum(1 for r in result.get("results", []) if r.get("result", {}).get("draft_created"))
+    seconds = result.get("total_seconds") or 0
+    print(f"{mode}:")
+    if "error" in result:
+        print(f"  FAILED: {result['error']}")
+        return drafts
+    print(f"  {result['total_threads']} threads, {result['customer_last_emails']} waiting for a reply, "
+          f"{drafts} drafts in {seconds:.2f}s")
+    if seconds:
+        first_draft = result["first_draft_seconds"]
+        print(f"  {result['total_threads'] / seconds:.1f} threads/s, {drafts / seconds:.1f} drafts/s, "
+              f"first draft after {'n/a' if first_draft is None else f'{first_draft}s'}")
+    print(f"  client API calls: {sum(result['api_calls'].values())} {result['api_calls']}")
+    print(f"  step seconds: {result.get('stage_seconds')}")
+    print("  fake Zoho:")
+    print_stats(fake)
+    print(f"  {len(fake.drafts)} drafts received")
+    if fake_openai.requests:
+        print("  fake OpenAI:")
+        print_stats(fake_openai)
+    return drafts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fake_arguments(parser)
+    parser.add_argument("--limit", type=int, help="emails fetched in step 1 (default: the whole mailbox)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per simulated classification (without --agents)")
+    parser.add_argument("--modes", default="barrier,streaming", help="comma separated pipeline modes")
+    parser.add_argument("--agents", action="store_true", help="run the real Zoho agents instead of simulating them")
+    parser.add_argument("--openai-latency", default="lognormal:1.0:0.4", help="latency of the fake OpenAI (--agents)")
+    parser.add_argument("--cassette", help="LLM cassette file to record to or replay from (implies --agents)")
+    parser.add_argument("--cassette-mode", choices=("record", "replay"), default="replay")
+    parser.add_argument("--cassette-latency", choices=("recorded", "zero"), default="recorded",
+                        help="wait for the recorded model latency on replay, or not at all")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args()
+
+    fake = build_fake(args)
+    fake_openai = FakeOpenAI({"default": args.openai_latency}, seed=args.seed)
+    args.agents = args.agents or bool(args.cassette)
+    args.limit = args.limit or len(fake.inbox.messages)
+    print(f"Mailbox: {len(fake.inbox.messages)} messages, {args.threads} threads; "
+          f"fetching {args.limit} in step 1")
+
+    failures = 0
+    drafts_by_mode = {}
+    with BackgroundServer(fake, fake_openai) as server, tempfile.TemporaryDirectory() as state_dir:
+        os.environ["ZOHO_MAIL_BASE_URL"] = server.base_url
+        os.environ["ZOHO_ACCOUNTS_BASE_URL"] = server.base_url
+        if args.agents:
+            os.environ.update(offline_agent_environment(f"{server.base_url}/v1", state_dir))
+        if args.cassette:
+            os.environ.update({
+                "LLM_CASSETTE_MODE": args.cassette_mode,
+                "LLM_CASSETTE_PATH": args.cassette,
+                "LLM_CASSETTE_REPLAY_LATENCY": args.cassette_latency,
+            })
+        for mode in args.modes.split(","):
+            fake.reset_stats()
+            fake_openai.reset_stats()
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                result = asyncio.run(run_mode(mode, args, state_dir))
+            drafts = report(mode, result, fake, fake_openai)
+            drafts_by_mode[mode] = drafts
+            if "error" in result:
+                failures += 1
+            elif fake.requests["create_draft"] and len(fake.drafts) != drafts:
+                print(f"  MISMATCH: the fake received {len(fake.drafts)} drafts, the handler reported {drafts}")
+                failures += 1
+
+    if args.cassette:
+        from app.utils.llm_cassette import get_llm_cassette
+        print(f"LLM cassette: {get_llm_cassette().stats()}")
+
+    if not args.error_rate and not args.throttle_rate and len(set(drafts_by_mode.values())) > 1:
+        print(f"MISMATCH: the modes created different numbers of drafts: {drafts_by_mode}")
+        failures += 1
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,44 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+import logging
+from typing import Optional
+from contextlib import asynccontextmanager
 from fastapi import FastAPI # type: ignore
+from fastapi.responses import PlainTextResponse # type: ignore
 import uvicorn # type: ignore
 
+from app.utils.logger import setup_logging
+
+# Before the app's modules log anything
+setup_logging()
+logger = logging.getLogger("app.main")
+
+from app.api.services.zoho.handler import get_mail_handler, close_mail_handler
+from app.utils.config import get_server_config
+from app.utils.metrics import get_metrics
+from app.utils.process_pool import shutdown_process_pool
+from app.utils.webhook_capture import close_webhook_capture
+from app.utils.tracing import close_tracer
+from app.utils.llm_usage import get_llm_usage, close_llm_usage
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the Zoho mail handler once, so its state and caches live for the whole process
+    try:
+        get_mail_handler()
+    except ValueError as e:
+        # Zoho is not configured; the live chat endpoints still work
+        logger.warning("Zoho mail handler not started: %s", e)
+    yield
+    close_mail_handler()
+    shutdown_process_pool()
+    close_webhook_capture()
+    close_tracer()
+    close_llm_usage()
+
 # Initialize FastAPI app
-app = FastAPI(title="Live Chat API")
+app = FastAPI(title="Live Chat API", lifespan=lifespan)
 
 # Import and include the live chat router
 from app.api.webhooks.live_chat import router as live_chat_router
@@ -24,6 +57,27 @@ app.include_router(zoho_mails_router)
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/llm-usage")
+async def llm_usage(group_by: str = "conversation", agent: Optional[str] = None, subject: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None, order_by: str = "cost_usd",
+                    limit: int = 50):
+    """
+    Tokens and estimated cost of the agent runs, by conversation, thread, agent, day or model
+    since and until are UTC days (YYYY-MM-DD); subject is a Chatwoot conversation or Zoho thread ID
+    """
+    try:
+        summary = get_llm_usage().summary(group_by, agent=agent, subject=subject, since=since, until=until,
+                                          order_by=order_by, limit=limit)
+        return {"status": "success", **summary}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+if get_server_config()['metrics_enabled']:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Pipeline, API and agent metrics in the Prometheus text exposition format"""
+        return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # For direct script execution
 if __name__ == "__main__":
     # You can also run this with: